@@ -0,0 +1,83 @@
+# chess_batch.py - Batch analysis of many positions on a process pool of warm engines
+import atexit
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterator, List, Optional
+
+from chess_engine import FastChessEngine, worker_process_context
+
+# Engine of the current worker process, kept between positions so its TT stays warm
+_engine: Optional[FastChessEngine] = None
+
+
+def _init_worker():
+    global _engine
+    _engine = FastChessEngine()
+
+
+def _analyze_in_worker(fen: str, depth: int, options: Dict) -> Dict:
+    try:
+        return _engine.analyze_position(fen, depth, **options)
+    except Exception as e:
+        return {"status": "error", "error": str(e)}
+
+
+class BatchAnalyzer:
+    """Process pool analyzing lists of positions with one long-lived engine per worker
+
+    Positions are spread over the workers and results come back in input
+    order as soon as each one (and every position before it) is done.
+    """
+
+    # Positions handed to a worker at once, amortizes the inter-process round trip
+    CHUNK_SIZE = 4
+
+    def __init__(self, workers: Optional[int] = None):
+        self.workers = workers or int(os.environ.get("BATCH_WORKERS", os.cpu_count() or 1))
+        self._context = worker_process_context()
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def start(self):
+        """Start the worker processes now instead of on the first batch"""
+        # A forking pool starts all its workers with the first task
+        self._get_executor().submit(os.getpid).result()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=self._context,
+                                                     initializer=_init_worker)
+            return self._executor
+
+    def analyze(self, fens: List[str], depth: int, **options) -> Iterator[Dict]:
+        """Yield analyze_position results for `fens` in input order
+
+        `options` are passed to FastChessEngine.analyze_position for every
+        position (movetime, nodes and deadline apply per position, a deadline
+        being an absolute time shared by the whole batch).
+        """
+        executor = self._get_executor()
+        try:
+            yield from executor.map(_analyze_in_worker, fens, [depth] * len(fens), [options] * len(fens),
+                                    chunksize=self.CHUNK_SIZE)
+        except BrokenProcessPool:
+            # A worker died, start a fresh pool for the next batch
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+
+    def close(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+                self._executor = None
+
+
+# Global batch analyzer used by the server
+batch_analyzer = BatchAnalyzer()
+atexit.register(batch_analyzer.close)
@@ -0,0 +1,840 @@
+# chess_benchmark.py - Engine benchmarks
+#
+# Usage: python chess_benchmark.py <benchmark> [--depth N]
+import argparse
+import hashlib
+import os
+import random
+import struct
+import tempfile
+import time
+
+from typing import Optional
+
+import chess
+import chess.polyglot
+
+import chess_bitbase
+import chess_book
+import chess_eval_batch
+import chess_nnue
+import chess_see
+import chess_zobrist
+from chess_smp import LazySMP
+from chess_batch import BatchAnalyzer
+from chess_game import analyze_game
+from chess_engine import EnginePool, FastChessEngine, TEST_POSITIONS, PRUNING_OPTIONS, EVAL_BACKENDS
+from chess_ponder import Ponderer
+from chess_position import SearchBoard
+
+# Ruy Lopez main line, used to step through consecutive positions of a game
+GAME_MOVES = "e2e4 e7e5 g1f3 b8c6 f1b5 a7a6 b5a4 g8f6 e1g1 f8e7 f1e1 b7b5 a4b3 d7d6 c2c3 e8g8 h2h3 c6a5 b3c2 c7c5".split()
+
+
+def _run_suite(engine_factory, positions, depth=None):
+    """Analyze every position on a fresh engine and return per-position stats"""
+    rows = []
+    for fen, default_depth in positions:
+        engine = engine_factory()
+        engine.opening_book = None  # Measure the search, not book lookups
+        start = time.time()
+        result = engine.analyze_position(fen, depth or default_depth)
+        elapsed = time.time() - start
+        info = result.get('searchInfo', {})
+        rows.append({
+            'fen': fen,
+            'time': elapsed,
+            'nodes': info.get('totalNodes', 0),
+            'depth': info.get('depth', 0),
+            'qNodeShare': info.get('qNodeShare', 0),
+            'bestMove': result['bestMoves'][0]['move'] if result.get('bestMoves') else None,
+        })
+    return rows
+
+
+def _print_comparison(title, baseline_name, baseline, candidate_name, candidate):
+    """Print NPS for two runs of the same suite side by side"""
+    print(title)
+    print("=" * 72)
+    print(f"{'Position':<10}{baseline_name + ' NPS':>18}{candidate_name + ' NPS':>18}{'Speedup':>12}")
+    total = {baseline_name: [0, 0.0], candidate_name: [0, 0.0]}
+    for i, (old, new) in enumerate(zip(baseline, candidate), 1):
+        old_nps = old['nodes'] / max(old['time'], 1e-9)
+        new_nps = new['nodes'] / max(new['time'], 1e-9)
+        speedup = new_nps / old_nps if old_nps else 0
+        print(f"{i:<10}{int(old_nps):>18,}{int(new_nps):>18,}{speedup:>11.2f}x")
+        for name, row in ((baseline_name, old), (candidate_name, new)):
+            total[name][0] += row['nodes']
+            total[name][1] += row['time']
+    old_nps = total[baseline_name][0] / max(total[baseline_name][1], 1e-9)
+    new_nps = total[candidate_name][0] / max(total[candidate_name][1], 1e-9)
+    print("-" * 72)
+    print(f"{'Total':<10}{int(old_nps):>18,}{int(new_nps):>18,}{new_nps / old_nps if old_nps else 0:>11.2f}x")
+
+
+class _FenHashEngine(FastChessEngine):
+    """Engine that keys positions by md5-of-FEN, as the search did before Zobrist keys"""
+
+    def _make_move(self, board: chess.Board, move: chess.Move):
+        super()._make_move(board, move)
+        self._key = int(hashlib.md5(board.fen()[:60].encode()).hexdigest()[:16], 16)
+
+
+class _LegalMobilityEngine(FastChessEngine):
+    """Engine with the previous mobility term: two full legal move generations per call"""
+
+    def _evaluate_mobility_enhanced(self, board: chess.Board) -> float:
+        weights = {chess.QUEEN: 4, chess.ROOK: 2, chess.BISHOP: 1, chess.KNIGHT: 1}
+        current_mobility = sum(weights.get(board.piece_type_at(move.from_square), 0.5) for move in board.legal_moves)
+        board.turn = not board.turn
+        opponent_mobility = sum(weights.get(board.piece_type_at(move.from_square), 0.5) for move in board.legal_moves)
+        board.turn = not board.turn
+        mobility_diff = current_mobility - opponent_mobility
+        # The old term was side-to-move relative, report it white relative like the new one
+        return mobility_diff * 2 if board.turn else -mobility_diff * 2
+
+
+def _legacy_see(engine, board, move):
+    """The previous SEE: push the capture and assume one recapture by the cheapest defender"""
+    captured = board.piece_at(move.to_square)
+    attacker = board.piece_at(move.from_square)
+    if not captured or not attacker:
+        return 0
+
+    gain = engine.piece_values[captured.piece_type]
+    board.push(move)
+    defenders = board.attackers(not attacker.color, move.to_square)
+    if defenders:
+        gain -= engine.piece_values[attacker.piece_type]
+        gain += min(engine.piece_values[board.piece_at(sq).piece_type] for sq in defenders)
+    board.pop()
+    return gain
+
+
+class _EagerOrderingEngine(FastChessEngine):
+    """Engine with the previous move ordering: every move scored up front, with SEE,
+    a push/pop check test and a scan of the killers of all plies"""
+
+    def _staged_moves(self, board: chess.Board, ply: int, tt_move: Optional[chess.Move] = None):
+        moves = list(board.legal_moves)
+
+        def move_score(move):
+            score = 0
+
+            # Hash move gets highest priority
+            if tt_move == move:
+                return 10000
+
+            # Captures with enhanced SEE
+            if board.is_capture(move):
+                see_score = _legacy_see(self, board, move)
+                if see_score >= 0:
+                    captured_piece = board.piece_at(move.to_square)
+                    attacking_piece = board.piece_at(move.from_square)
+                    if captured_piece and attacking_piece:
+                        mvv_lva = (self.piece_values[captured_piece.piece_type] * 10 -
+                                 self.piece_values[attacking_piece.piece_type])
+                        score += 8000 + mvv_lva + see_score
+                else:
+                    score += 2000 + see_score  # Bad captures still considered
+
+            # Promotions
+            if move.promotion:
+                score += 7000 + self.piece_values.get(move.promotion, 0)
+
+            # Checks
+            board.push(move)
+            if board.is_check():
+                score += 5000
+            board.pop()
+
+            # Killer moves
+            for ply_killers in self.killer_moves:
+                if move in ply_killers:
+                    score += 4000 - ply_killers.index(move) * 100
+                    break
+
+            # Castling
+            if board.is_castling(move):
+                score += 1000
+
+            # History heuristic
+            move_key = (move.from_square, move.to_square)
+            score += self.history_table.get(move_key, 0) // 10
+
+            # Piece development (early game)
+            piece = board.piece_at(move.from_square)
+            if piece and piece.piece_type in [chess.KNIGHT, chess.BISHOP]:
+                if move.from_square in [chess.B1, chess.G1, chess.B8, chess.G8]:  # Starting squares
+                    score += 50
+
+            return score
+
+        return sorted(moves, key=move_score, reverse=True)
+
+
+class _FullQuiescenceEngine(FastChessEngine):
+    """Engine with the previous quiescence search: captures, checks and promotions
+    filtered from all legal moves, sorted with a push/pop per move, fixed depth 4"""
+
+    def _quiescence_search_enhanced(self, board: chess.Board, alpha: float, beta: float,
+                                    qply: int = 0, ply: int = 0) -> float:
+        self.nodes_searched += 1
+        self.qnodes_searched += 1
+        if self.nodes_searched >= self._next_check:
+            self._check_limits()
+
+        stand_pat = self._evaluate_position_enhanced(board)
+        if stand_pat >= beta:
+            return beta
+        if stand_pat > alpha:
+            alpha = stand_pat
+        if qply >= 4:
+            return stand_pat
+
+        def tactical_value(move):
+            value = 0
+            if board.is_capture(move):
+                captured = board.piece_at(move.to_square)
+                value += self.piece_values[captured.piece_type] if captured else 0
+            if move.promotion:
+                value += self.piece_values.get(move.promotion, 0)
+            board.push(move)
+            if board.is_check():
+                value += 100
+            if board.is_checkmate():
+                value += 10000
+            board.pop()
+            return value
+
+        tactical_moves = [move for move in board.legal_moves
+                          if board.is_capture(move) or board.gives_check(move) or move.promotion]
+        tactical_moves.sort(key=tactical_value, reverse=True)
+
+        for move in tactical_moves:
+            if board.is_capture(move) and _legacy_see(self, board, move) < -50:
+                continue
+            self._make_move(board, move)
+            score = -self._quiescence_search_enhanced(board, -beta, -alpha, qply + 1, ply + 1)
+            self._unmake_move(board)
+            if score >= beta:
+                return beta
+            if score > alpha:
+                alpha = score
+        return alpha
+
+
+def _random_positions(count, rng):
+    """Positions sampled from random playouts"""
+    positions = []
+    while len(positions) < count:
+        board = chess.Board()
+        for _ in range(rng.randint(4, 120)):
+            moves = list(board.legal_moves)
+            if not moves:
+                break
+            board.push(rng.choice(moves))
+        if not board.is_game_over():
+            positions.append(chess.Board(board.fen()))
+    return positions
+
+
+def _evals_per_second(engine, boards, repeat=3):
+    start = time.time()
+    for _ in range(repeat):
+        for board in boards:
+            engine._set_search_root(board)
+            engine._evaluate_position_enhanced(board)
+    return len(boards) * repeat / (time.time() - start)
+
+
+def bench_eval_batch(args):
+    """Throughput of the NumPy batch static eval vs the scalar terms (tests/test_eval_batch.py checks the scores)"""
+    boards = _random_positions(args.games * 20, random.Random(args.seed))
+    fens = [board.fen() for board in boards]
+    evaluator = chess_eval_batch.BatchEvaluator()
+
+    start = time.time()
+    for board in boards:
+        evaluator.static_eval(board)
+    scalar_time = time.time() - start
+    start = time.time()
+    evaluator.evaluate(boards)
+    batch_time = time.time() - start
+    start = time.time()
+    for fen in fens:
+        evaluator.static_eval(chess.Board(fen))
+    scalar_fen_time = time.time() - start
+    start = time.time()
+    evaluator.evaluate_fens(fens)
+    fen_time = time.time() - start
+
+    print(f"Static evaluation of {len(boards):,} random positions")
+    print("=" * 72)
+    print(f"{'Scalar terms:':<28}{int(len(boards) / scalar_time):>10,} positions/s")
+    print(f"{'NumPy batch:':<28}{int(len(boards) / batch_time):>10,} positions/s   ({scalar_time / batch_time:.2f}x)")
+    print(f"{'Scalar from FENs:':<28}{int(len(boards) / scalar_fen_time):>10,} positions/s")
+    print(f"{'NumPy batch from FENs:':<28}{int(len(boards) / fen_time):>10,} positions/s"
+          f"   ({scalar_fen_time / fen_time:.2f}x)")
+
+
+def bench_mobility(args):
+    """Evals per second and score drift of attack-bitboard mobility vs legal-move mobility"""
+    boards = _random_positions(args.games * 4, random.Random(args.seed))
+    old_engine, new_engine = _LegalMobilityEngine(), FastChessEngine()
+
+    old_eps = _evals_per_second(old_engine, boards)
+    new_eps = _evals_per_second(new_engine, boards)
+
+    drift = [abs(new_engine._evaluate_mobility_enhanced(board) - old_engine._evaluate_mobility_enhanced(board))
+             for board in boards]
+    drift.sort()
+
+    print(f"Mobility: legal move generation vs attack bitboards ({len(boards):,} random positions)")
+    print("=" * 72)
+    print(f"Legal-move eval/s:      {int(old_eps):>10,}")
+    print(f"Attack-bitboard eval/s: {int(new_eps):>10,}   ({new_eps / old_eps:.2f}x)")
+    print(f"Mobility term drift (cp): mean {sum(drift) / len(drift):.1f}, "
+          f"median {drift[len(drift) // 2]:.1f}, p95 {drift[int(len(drift) * 0.95)]:.1f}, max {drift[-1]:.1f}")
+
+
+def bench_zobrist(args):
+    """NPS of incremental Zobrist keys versus md5-of-FEN keys"""
+    baseline = _run_suite(_FenHashEngine, TEST_POSITIONS, args.depth)
+    candidate = _run_suite(FastChessEngine, TEST_POSITIONS, args.depth)
+    _print_comparison("Position keys: md5(FEN) vs incremental Zobrist", "md5", baseline, "zobrist", candidate)
+
+
+def _game_positions():
+    board = chess.Board()
+    fens = []
+    for uci in GAME_MOVES:
+        board.push_uci(uci)
+        fens.append(board.fen())
+    return fens
+
+
+def bench_pool(args):
+    """Stepping through a game with a fresh engine per position vs one pooled (warm) engine"""
+    depth = args.depth
+    fens = _game_positions()
+    warm_engine = FastChessEngine()
+    warm_engine.opening_book = None
+
+    print(f"Engine pool: cold vs warm analysis of {len(fens)} consecutive positions at depth {depth}")
+    print("=" * 72)
+    print(f"{'Ply':<6}{'Cold ms':>12}{'Warm ms':>12}{'Cold nodes':>14}{'Warm nodes':>14}")
+    totals = [0, 0, 0, 0]
+    for ply, fen in enumerate(fens, 1):
+        cold = _run_suite(FastChessEngine, [(fen, depth)])[0]
+        start = time.time()
+        result = warm_engine.analyze_position(fen, depth)
+        warm_time = time.time() - start
+        warm_nodes = result['searchInfo']['totalNodes']
+        print(f"{ply:<6}{int(cold['time'] * 1000):>12,}{int(warm_time * 1000):>12,}{cold['nodes']:>14,}{warm_nodes:>14,}")
+        for i, value in enumerate((cold['time'], warm_time, cold['nodes'], warm_nodes)):
+            totals[i] += value
+    print("-" * 72)
+    print(f"{'Total':<6}{int(totals[0] * 1000):>12,}{int(totals[1] * 1000):>12,}{totals[2]:>14,}{totals[3]:>14,}")
+    print(f"Warm speedup: {totals[0] / max(totals[1], 1e-9):.2f}x time, {totals[2] / max(totals[3], 1):.2f}x nodes")
+
+
+def bench_ponder(args):
+    """Latency of the requests of a game with and without pondering while the user thinks"""
+    # The game: the engine at --depth against a user played by the engine 2 plies shallower
+    board = chess.Board()
+    fens = []
+    while len(fens) < 10 and not board.is_game_over():
+        for depth in (args.depth, max(1, args.depth - 2)):
+            if board.is_game_over():
+                break
+            if depth == args.depth:
+                fens.append(board.fen())
+            engine = FastChessEngine()
+            engine.opening_book = None
+            result = engine.analyze_position(board.fen(), depth, multipv=1, movetime=600000)
+            board.push_uci(result['bestMoves'][0]['move'])
+    think_time = args.movetime / 1000
+
+    print(f"Pondering: {len(fens)} requests at depth {args.depth}, {args.movetime} ms to think between them")
+    print("=" * 72)
+    latencies = {}
+    for pondering in (False, True):
+        pool = EnginePool(size=1)
+        with pool.checkout() as engine:
+            engine.opening_book = None  # Measure the search, not book lookups
+        ponderer = Ponderer(pool, movetime_ms=args.movetime)
+        latencies[pondering] = []
+        for fen in fens:
+            start = time.time()
+            result = ponderer.take(fen, args.depth) if pondering else None
+            if result is None:
+                with pool.checkout() as engine:
+                    result = engine.analyze_position(fen, args.depth, movetime=600000)
+            latencies[pondering].append(time.time() - start)
+            if pondering:
+                ponderer.start(fen, result, args.depth)
+            time.sleep(think_time)
+        ponderer.stop()
+        stats = ponderer.stats()
+
+    print(f"{'Request':<10}{'No ponder ms':>16}{'Ponder ms':>14}")
+    for i, (plain, pondered) in enumerate(zip(latencies[False], latencies[True]), 1):
+        print(f"{i:<10}{int(plain * 1000):>16,}{int(pondered * 1000):>14,}")
+    print("-" * 72)
+    plain, pondered = sum(latencies[False]), sum(latencies[True])
+    print(f"{'Total':<10}{int(plain * 1000):>16,}{int(pondered * 1000):>14,}")
+    print(f"Ponder hits: {stats['hits']}/{stats['requests']} ({stats['hitRate']:.0%}) answered from the pondered search, "
+          f"{stats['predicted']} predicted")
+    print(f"Latency saved: {int((plain - pondered) * 1000):,} ms ({plain / max(pondered, 1e-9):.2f}x)")
+
+
+def bench_game(args):
+    """Whole-game analysis on one engine in reverse order vs a fresh engine per ply"""
+    board = chess.Board()
+    pgn_moves = []
+    for uci in GAME_MOVES:
+        move = chess.Move.from_uci(uci)
+        pgn_moves.append((f"{board.fullmove_number}. " if board.turn else "") + board.san(move))
+        board.push(move)
+    fens = [chess.Board().fen()] + _game_positions()
+
+    # The same searches as analyze_game: best move, then the played move if it differs
+    start = time.time()
+    cold_nodes = 0
+    for fen, uci in zip(fens, GAME_MOVES):
+        result = FastChessEngine().analyze_position(fen, args.depth, multipv=1, book=False, movetime=600000)
+        cold_nodes += result['searchInfo']['totalNodes']
+        if result['bestMoves'][0]['move'] != uci:
+            result = FastChessEngine().analyze_position(fen, result['depth'], multipv=1, book=False, movetime=600000,
+                                                        searchmoves=[chess.Move.from_uci(uci)])
+            cold_nodes += result['searchInfo']['totalNodes']
+    cold_time = time.time() - start
+
+    start = time.time()
+    result = list(analyze_game(FastChessEngine(), " ".join(pgn_moves), args.depth, movetime=600000))[-1]
+    game_time = time.time() - start
+
+    print(f"Game analysis of {len(GAME_MOVES)} plies at depth {args.depth}")
+    print("=" * 72)
+    print(f"{'Fresh engine per ply:':<32}{int(cold_time * 1000):>10,} ms{cold_nodes:>12,} nodes")
+    print(f"{'One engine, last ply first:':<32}{int(game_time * 1000):>10,} ms"
+          f"{result['searchInfo']['totalNodes']:>12,} nodes   ({cold_time / game_time:.2f}x)")
+    print("=" * 72)
+    for ply in result['plies']:
+        print(f"{ply['ply']:>4} {ply['san']:<8}{ply['evaluation']:>+7.2f}  best {ply['bestMoveSan']:<8}"
+              f"loss {ply['centipawnLoss']!s:>5}  depth {ply['depth']}  {ply['classification'] or ''}")
+
+
+def bench_multipv(args):
+    """Root cost of exact scores for the best K lines vs for every root move"""
+    print(f"MultiPV root search at depth {args.depth}")
+    print("=" * 72)
+    print(f"{'Position':<10}{'K':>6}{'Nodes':>12}{'Time ms':>12}{'Re-searches':>14}")
+    for i, (fen, _) in enumerate(TEST_POSITIONS, 1):
+        num_moves = chess.Board(fen).legal_moves.count()
+        for multipv in (1, 3, num_moves):
+            engine = FastChessEngine()
+            engine.opening_book = None
+            result = engine.analyze_position(fen, args.depth, multipv=multipv, movetime=600000)
+            info = result['searchInfo']
+            label = str(multipv) if multipv < num_moves else f"all({multipv})"
+            print(f"{i:<10}{label:>6}{info['totalNodes']:>12,}{info['totalTime']:>12,}{info['aspirationResearches']:>14}")
+
+
+def _random_walk(engine, board, plies, rng):
+    """Yield after each make/unmake of a random playout through engine._make_move"""
+    for _ in range(plies):
+        moves = list(board.legal_moves)
+        if not moves:
+            break
+        # Occasionally step back to exercise unmake
+        if engine._state_stack and rng.random() < 0.15:
+            engine._unmake_move(board)
+        else:
+            engine._make_move(board, rng.choice(moves))
+        yield
+
+
+def _timed_evals(engine, boards, repeat=20):
+    """Evaluations per second, each board set as search root outside the timing"""
+    elapsed = 0.0
+    for board in boards:
+        engine._set_search_root(board)
+        start = time.time()
+        for _ in range(repeat):
+            engine._evaluate_position_enhanced(board)
+        elapsed += time.time() - start
+    return len(boards) * repeat / elapsed
+
+
+def bench_nnue(args):
+    """NNUE evals/s, make/unmake and time to depth vs the classical evaluation (tests/test_nnue.py checks the values)"""
+    engine = FastChessEngine()
+    engine.opening_book = None
+    engine._set_eval_backend("nnue")
+    network = engine._nnue.network
+    print(f"NNUE network: {network.path or 'bootstrap (in memory)'}, "
+          f"{chess_nnue.FEATURES:,} x {network.hidden} -> {network.l1_size} -> 1")
+
+    # Static evaluation and make/unmake speed
+    boards = [SearchBoard(board.fen()) for board in _random_positions(args.positions * 5, random.Random(args.seed))]
+    classical = FastChessEngine()
+    classical_eps = _timed_evals(classical, boards)
+    nnue_eps = _timed_evals(engine, boards)
+    walk_times = []
+    for candidate in (classical, engine):
+        walk_rng = random.Random(args.seed)
+        start, steps = time.time(), 0
+        for _ in range(max(1, args.games // 5)):
+            board = SearchBoard()
+            candidate._set_search_root(board)
+            steps += sum(1 for _ in _random_walk(candidate, board, 200, walk_rng))
+        walk_times.append((time.time() - start) / steps * 1e6)
+
+    print("=" * 72)
+    print(f"{'Classical eval/s:':<28}{int(classical_eps):>10,}")
+    print(f"{'NNUE eval/s:':<28}{int(nnue_eps):>10,}   ({nnue_eps / classical_eps:.2f}x)")
+    print(f"{'Classical make/unmake:':<28}{walk_times[0]:>10.1f} us")
+    print(f"{'NNUE make/unmake:':<28}{walk_times[1]:>10.1f} us")
+
+    # Time to depth, each backend on its own cold engine
+    book = FastChessEngine().opening_book
+    fens = [fen for fen, _ in TEST_POSITIONS if not book.entries(chess.Board(fen))]
+    print("=" * 72)
+    print(f"Time to depth {args.depth} on {len(fens)} positions")
+    print(f"{'Backend':<12}{'Time ms':>12}{'Nodes':>12}{'NPS':>12}")
+    baseline = None
+    for backend in EVAL_BACKENDS:
+        search_engine = FastChessEngine()
+        search_engine.opening_book = None
+        elapsed, nodes = 0.0, 0
+        for fen in fens:
+            result = search_engine.analyze_position(fen, args.depth, movetime=600000, eval_backend=backend)
+            elapsed += result['searchInfo']['totalTime'] / 1000
+            nodes += result['searchInfo']['totalNodes']
+        baseline = baseline or elapsed
+        print(f"{backend:<12}{int(elapsed * 1000):>12,}{nodes:>12,}{int(nodes / elapsed):>12,}"
+              f"   ({baseline / elapsed:.2f}x)")
+
+
+def bench_pruning(args):
+    """Depth reached in a fixed time with every selective search technique switched off in turn"""
+    configs = [("all on", {}), ("all off", {name: False for name in PRUNING_OPTIONS})]
+    configs += [(f"no {name}", {name: False}) for name in PRUNING_OPTIONS]
+
+    print(f"Selective search: depth reached in {args.movetime} ms per position ({len(TEST_POSITIONS)} positions)")
+    print("=" * 72)
+    print(f"{'Config':<22}{'Avg depth':>11}{'Depth/s':>10}{'Nodes':>12}{'NPS':>10}  Best moves")
+    for label, pruning in configs:
+        depths, nodes, elapsed, best = [], 0, 0.0, []
+        for fen, _ in TEST_POSITIONS:
+            engine = FastChessEngine()
+            engine.opening_book = None
+            start = time.time()
+            result = engine.analyze_position(fen, 12, movetime=args.movetime, pruning=pruning)
+            elapsed += time.time() - start
+            depths.append(result['searchInfo']['depth'])
+            nodes += result['searchInfo']['totalNodes']
+            best.append(result['bestMoves'][0]['move'])
+        print(f"{label:<22}{sum(depths) / len(depths):>11.2f}{sum(depths) / max(elapsed, 1e-9):>10.2f}"
+              f"{nodes:>12,}{int(nodes / max(elapsed, 1e-9)):>10,}  {' '.join(best)}")
+
+
+def bench_batch(args):
+    """Positions per second of the batch process pool vs one position at a time on a pooled engine"""
+    fens = [board.fen() for board in _random_positions(args.positions, random.Random(args.seed))]
+    print(f"Batch analysis of {len(fens)} random positions at depth {args.depth}, {os.cpu_count()} CPUs")
+    print("=" * 72)
+
+    # What a client calling /analyze once per position gets
+    pool = EnginePool(size=1)
+    start = time.time()
+    for fen in fens:
+        with pool.checkout() as engine:
+            engine.analyze_position(fen, args.depth, multipv=1, movetime=600000)
+    sequential = time.time() - start
+
+    batch = BatchAnalyzer()
+    try:
+        start = time.time()
+        results = list(batch.analyze(fens, args.depth, multipv=1, movetime=600000))
+        batched = time.time() - start
+    finally:
+        batch.close()
+    errors = sum(1 for result in results if result.get('status') != 'success')
+
+    print(f"{'Sequential:':<24}{len(fens) / sequential:>8.2f} positions/s")
+    print(f"{f'Batch ({batch.workers} workers):':<24}{len(fens) / batched:>8.2f} positions/s"
+          f"   ({sequential / batched:.2f}x, {errors} errors)")
+
+
+def bench_smp(args):
+    """Time to depth of lazy SMP with 1, 2, 4 and 8 worker processes"""
+    book = FastChessEngine().opening_book
+    positions = [fen for fen, _ in TEST_POSITIONS if not book.entries(chess.Board(fen))]
+    smp = LazySMP(max_workers=8)
+    print(f"Lazy SMP: time to depth {args.depth} on {len(positions)} positions, {os.cpu_count()} CPUs")
+    print("=" * 72)
+    print(f"{'Workers':<10}{'Time ms':>12}{'Speedup':>10}{'Nodes':>12}{'NPS':>12}  Worker depths")
+    try:
+        baseline = None
+        for threads in (1, 2, 4, 8):
+            elapsed, nodes, depths = 0.0, 0, []
+            for fen in positions:
+                smp.clear()  # Every run starts from an empty table
+                start = time.time()
+                result = smp.analyze(fen, args.depth, threads, movetime=600000)
+                elapsed += time.time() - start
+                nodes += result['searchInfo']['totalNodes']
+                depths.append(result['searchInfo']['workerDepths'])
+            baseline = baseline or elapsed
+            print(f"{threads:<10}{int(elapsed * 1000):>12,}{baseline / elapsed:>9.2f}x{nodes:>12,}"
+                  f"{int(nodes / elapsed):>12,}  {depths[0]}")
+    finally:
+        smp.close()
+
+
+def bench_qsearch(args):
+    """Nodes, quiescence share and time of the previous vs the capture-only quiescence search"""
+    baseline = _run_suite(_FullQuiescenceEngine, TEST_POSITIONS, args.depth)
+    candidate = _run_suite(FastChessEngine, TEST_POSITIONS, args.depth)
+    print(f"Quiescence search: captures+checks at every ply vs capture-only at depth {args.depth}")
+    print("=" * 72)
+    print(f"{'Position':<10}{'Old nodes':>12}{'New nodes':>12}{'Old q%':>8}{'New q%':>8}"
+          f"{'Old ms':>10}{'New ms':>10}{'Speedup':>10}")
+    for i, (old, new) in enumerate(zip(baseline, candidate), 1):
+        print(f"{i:<10}{old['nodes']:>12,}{new['nodes']:>12,}{old['qNodeShare']:>8.0%}{new['qNodeShare']:>8.0%}"
+              f"{int(old['time'] * 1000):>10,}{int(new['time'] * 1000):>10,}{old['time'] / max(new['time'], 1e-9):>9.2f}x")
+        if old['bestMove'] != new['bestMove']:
+            print(f"{'':<10}best move changed: {old['bestMove']} -> {new['bestMove']}")
+    old_time = sum(row['time'] for row in baseline)
+    new_time = sum(row['time'] for row in candidate)
+    print("-" * 72)
+    print(f"{'Total':<10}{sum(r['nodes'] for r in baseline):>12,}{sum(r['nodes'] for r in candidate):>12,}"
+          f"{'':>16}{int(old_time * 1000):>10,}{int(new_time * 1000):>10,}{old_time / max(new_time, 1e-9):>9.2f}x")
+
+
+def bench_ordering(args):
+    """Nodes and time of the staged move picker vs eager move scoring"""
+    baseline = _run_suite(_EagerOrderingEngine, TEST_POSITIONS, args.depth)
+    candidate = _run_suite(FastChessEngine, TEST_POSITIONS, args.depth)
+    print(f"Move ordering: eager scoring vs staged picker at depth {args.depth}")
+    print("=" * 72)
+    print(f"{'Position':<10}{'Eager nodes':>14}{'Staged nodes':>14}{'Eager ms':>12}{'Staged ms':>12}{'Speedup':>10}")
+    for i, (old, new) in enumerate(zip(baseline, candidate), 1):
+        print(f"{i:<10}{old['nodes']:>14,}{new['nodes']:>14,}{int(old['time'] * 1000):>12,}"
+              f"{int(new['time'] * 1000):>12,}{old['time'] / max(new['time'], 1e-9):>9.2f}x")
+    old_time = sum(row['time'] for row in baseline)
+    new_time = sum(row['time'] for row in candidate)
+    print("-" * 72)
+    print(f"{'Total':<10}{sum(r['nodes'] for r in baseline):>14,}{sum(r['nodes'] for r in candidate):>14,}"
+          f"{int(old_time * 1000):>12,}{int(new_time * 1000):>12,}{old_time / max(new_time, 1e-9):>9.2f}x")
+
+
+def _polyglot_move(board, move):
+    """Raw Polyglot encoding of `move`, castling is written as king takes rook"""
+    to_square = move.to_square
+    if board.is_castling(move):
+        to_square = chess.square(7 if chess.square_file(move.to_square) > 4 else 0, chess.square_rank(move.to_square))
+    promotion = move.promotion - 1 if move.promotion else 0
+    return to_square | (move.from_square << 6) | (promotion << 12)
+
+
+def bench_book(args):
+    """Lazy open and lookup rate of a memory-mapped Polyglot book (tests/test_book.py checks the lookups)"""
+    rng = random.Random(args.seed)
+    boards = _random_positions(args.games * 4, rng)
+    seen = set()
+    entries = []
+    for board in boards:
+        key = chess.polyglot.zobrist_hash(board)
+        if key in seen:
+            continue
+        seen.add(key)
+        moves = rng.sample(list(board.legal_moves), min(4, board.legal_moves.count()))
+        entries += [(key, _polyglot_move(board, move), rng.randint(1, 1000)) for move in moves]
+    # Filler entries so the file has the size of a large book
+    entries += [(rng.getrandbits(64), rng.getrandbits(12), 1) for _ in range(1_000_000)]
+    entries.sort()
+
+    with tempfile.NamedTemporaryFile(suffix=".bin", delete=False) as f:
+        for key, raw_move, weight in entries:
+            f.write(struct.pack(">QHHI", key, raw_move, weight, 0))
+        path = f.name
+
+    try:
+        start = time.time()
+        book = chess_book.PolyglotBook(path)
+        created = time.time() - start
+        start = time.time()
+        book.entries(boards[0])
+        first = time.time() - start
+
+        # Different move counters, the lookups go through the transposition
+        boards = [chess.Board(board.fen().rsplit(" ", 2)[0] + " 37 81") for board in boards]
+        start = time.time()
+        for board in boards:
+            book.entries(board)
+        lookups = len(boards) / (time.time() - start)
+        book.close()
+
+        print(f"Polyglot book: {len(entries):,} entries ({os.path.getsize(path) / 2 ** 20:.1f} MB), "
+              f"{len(boards):,} positions with changed move counters")
+        print("=" * 72)
+        print(f"{'Create (lazy):':<24}{created * 1e6:>10.0f} us")
+        print(f"{'First lookup (mmap):':<24}{first * 1e6:>10.0f} us")
+        print(f"{'Lookups/s:':<24}{int(lookups):>10,}")
+    finally:
+        os.unlink(path)
+
+
+def bench_bitbase(args):
+    """Generate the bitbases and time the engine with and without them (tests/test_bitbase.py checks the probes)"""
+    with tempfile.TemporaryDirectory() as directory:
+        solved = {}
+        for name in chess_bitbase.ENDGAMES:
+            start = time.time()
+            solved[name] = chess_bitbase.generate(name, solved)
+            chess_bitbase.save(name, *solved[name], directory)
+            print(f"{name + ':':<8}generated in {time.time() - start:6.1f}s, "
+                  f"{chess_bitbase.table_bytes(name):>10,} bytes")
+        bitbases = chess_bitbase.Bitbases(directory)
+
+        print()
+        print(f"{'Position':<44}{'Bitbases':>10}{'ms':>8}{'Eval':>8}{'Depth':>7}")
+        for fen in ("k7/8/K7/P7/8/8/8/8 w - - 0 1", "8/8/8/8/2k5/8/2P5/2K5 b - - 0 1",
+                    "8/8/3k4/8/8/8/3K4/3RR3 b - - 0 1"):
+            for use in (False, True):
+                engine = FastChessEngine()
+                engine.bitbases = bitbases if use else None
+                start = time.time()
+                result = engine.analyze_position(fen, 20, movetime=args.movetime)
+                print(f"{fen:<44}{'on' if use else 'off':>10}{int((time.time() - start) * 1000):>8,}"
+                      f"{result['evaluation']['value']:>8}{result['depth']:>7}")
+
+
+def bench_see(args):
+    """Speed of the bitboard SEE vs the previous push/pop SEE on random captures (tests/test_see.py checks the values)"""
+    engine = FastChessEngine()
+    boards = _random_positions(args.games * 4, random.Random(args.seed))
+    captures = [(board, move) for board in boards for move in board.legal_moves if board.is_capture(move)]
+    print(f"SEE on {len(captures):,} random captures")
+    print("=" * 72)
+
+    timings = []
+    for name, func in (("push/pop SEE", lambda b, m: _legacy_see(engine, b, m)),
+                       ("bitboard see", engine.see),
+                       ("bitboard see_ge", lambda b, m: engine.see_ge(b, m, 0))):
+        start = time.time()
+        for board, move in captures:
+            func(board, move)
+        timings.append((name, len(captures) / (time.time() - start)))
+    for name, rate in timings:
+        print(f"{name + ' calls/s:':<24}{int(rate):>10,}   ({rate / timings[0][1]:.2f}x)")
+
+
+class _PushPopEngine(FastChessEngine):
+    """Engine with the previous move application and terminal checks: board.push()/pop()
+    and a full is_game_over() at every node, checkmate and stalemate tests in the evaluation"""
+
+    def _set_search_root(self, board: chess.Board):
+        super()._set_search_root(board)
+        self._null_stack = []
+
+    def _make_move(self, board: chess.Board, move: chess.Move):
+        self._state_stack.append((self._key, self._pawn_key, self._eval))
+        self._null_stack.append(board.plies_from_null)
+        self._eval = self._eval_after_move(board, move)
+        self._pawn_key ^= chess_zobrist.pawn_delta(board, move)
+        self._key = chess_zobrist.push(board, move, self._key)
+        board.plies_from_null = board.plies_from_null + 1 if move else 0
+
+    def _unmake_move(self, board: chess.Board):
+        board.pop()
+        board.plies_from_null = self._null_stack.pop()
+        self._key, self._pawn_key, self._eval = self._state_stack.pop()
+
+    def _is_repetition(self, board: chess.Board) -> bool:
+        return (board.is_game_over() and not board.is_checkmate()) or super()._is_repetition(board)
+
+    def _evaluate_position_enhanced(self, board: chess.Board) -> float:
+        if board.is_checkmate():
+            return -9999 if board.turn else 9999
+        if board.is_stalemate():
+            return 0
+        return super()._evaluate_position_enhanced(board)
+
+
+# (FEN, depth, node count) from the standard perft suite
+PERFT_POSITIONS = [
+    (chess.STARTING_FEN, 4, 197281),
+    ("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1", 3, 97862),
+    ("8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", 5, 674624),
+    ("r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1", 4, 422333),
+    ("rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8", 3, 62379),
+]
+
+
+def _perft(board, depth, make, unmake):
+    """Leaf count of the move tree, the last ply counted without playing it"""
+    if depth == 1:
+        return board.legal_moves.count()
+    nodes = 0
+    for move in board.legal_moves:
+        make(move)
+        nodes += _perft(board, depth - 1, make, unmake)
+        unmake()
+    return nodes
+
+
+def bench_perft(args):
+    """Perft speed of SearchBoard.make/unmake vs push/pop, and search NPS (tests/test_position.py checks the counts)"""
+    print(f"{'Position':<10}{'Depth':>6}{'Nodes':>10}{'push/pop':>12}{'make':>12}{'Speedup':>10}")
+    for i, (fen, depth, expected) in enumerate(PERFT_POSITIONS, 1):
+        timings = []
+        for board in (chess.Board(fen), SearchBoard(fen)):
+            make, unmake = (board.make, board.unmake) if isinstance(board, SearchBoard) else (board.push, board.pop)
+            start = time.time()
+            _perft(board, depth, make, unmake)
+            timings.append(time.time() - start)
+        print(f"{i:<10}{depth:>6}{expected:>10,}{timings[0]:>11.2f}s{timings[1]:>11.2f}s{timings[0] / timings[1]:>9.2f}x")
+
+    baseline = _run_suite(_PushPopEngine, TEST_POSITIONS, args.depth)
+    candidate = _run_suite(FastChessEngine, TEST_POSITIONS, args.depth)
+    print()
+    _print_comparison("Search: push/pop + is_game_over vs make/unmake + cheap terminal checks",
+                      "push/pop", baseline, "make", candidate)
+
+
+BENCHMARKS = {
+    'batch': bench_batch,
+    'bitbase': bench_bitbase,
+    'book': bench_book,
+    'ordering': bench_ordering,
+    'mobility': bench_mobility,
+    'nnue': bench_nnue,
+    'eval-batch': bench_eval_batch,
+    'game': bench_game,
+    'multipv': bench_multipv,
+    'perft': bench_perft,
+    'ponder': bench_ponder,
+    'pool': bench_pool,
+    'pruning': bench_pruning,
+    'qsearch': bench_qsearch,
+    'see': bench_see,
+    'smp': bench_smp,
+    'zobrist': bench_zobrist,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="FastChessEngine benchmarks")
+    parser.add_argument('benchmark', choices=sorted(BENCHMARKS))
+    parser.add_argument('--depth', type=int, default=4, help="Search depth for every position (0 = test defaults)")
+    parser.add_argument('--games', type=int, default=500, help="Random games for the differential checks")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--positions', type=int, default=40, help="Random positions for throughput benchmarks")
+    parser.add_argument('--movetime', type=int, default=2000, help="Time per position in ms for timed benchmarks")
+    args = parser.parse_args()
+    BENCHMARKS[args.benchmark](args)
@@ -0,0 +1,317 @@
+# chess_bitbase.py - Win/draw/loss bitbases for small endgames
+#
+# A bitbase has one bit per position and side to move: "white to move wins"
+# and "black to move loses", with the stronger side always normalized to
+# white. Positions are indexed by the squares of the white king, the black
+# king and the white pieces in table order, 64 ** pieces positions each.
+#
+# Generate them once with `python chess_bitbase.py` (needs NumPy); probing
+# only reads the files.
+import os
+import sys
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import chess
+
+# name -> (white pieces besides the king, tables its promotions lead to)
+ENDGAMES: Dict[str, Tuple[Tuple[int, ...], Tuple[str, ...]]] = {
+    "KQK": ((chess.QUEEN,), ()),
+    "KRK": ((chess.ROOK,), ()),
+    "KPK": ((chess.PAWN,), ("KQK", "KRK")),
+    "KBNK": ((chess.BISHOP, chess.KNIGHT), ()),
+}
+
+# Largest number of pieces on the board, kings included, that a table covers
+MAX_PIECES = max(len(pieces) for pieces, _ in ENDGAMES.values()) + 2
+
+DEFAULT_DIRECTORY = os.environ.get("BITBASE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "bitbases"))
+
+KING_STEPS = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+KNIGHT_STEPS = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
+DIAGONAL_RAYS = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+ORTHOGONAL_RAYS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+SLIDER_RAYS = {
+    chess.BISHOP: DIAGONAL_RAYS,
+    chess.ROOK: ORTHOGONAL_RAYS,
+    chess.QUEEN: DIAGONAL_RAYS + ORTHOGONAL_RAYS,
+}
+
+
+def _signature(pieces) -> Tuple[int, ...]:
+    return tuple(sorted(pieces, reverse=True))
+
+
+# Material signature of the stronger side -> table name
+SIGNATURES = {_signature(pieces): name for name, (pieces, _) in ENDGAMES.items()}
+
+
+def table_bytes(name: str) -> int:
+    """Size of a bitbase file: two bits per position"""
+    return 2 * 64 ** (len(ENDGAMES[name][0]) + 2) // 8
+
+
+# ---------------------------------------------------------------------------
+# Generation (retrograde analysis on NumPy arrays)
+# ---------------------------------------------------------------------------
+
+def _square_tables(np):
+    """64x64 attack tables and the 64x64x64 "strictly between" table"""
+    king = np.zeros((64, 64), bool)
+    knight = np.zeros((64, 64), bool)
+    pawn = np.zeros((64, 64), bool)  # White pawn on s attacks t
+    diagonal = np.zeros((64, 64), bool)
+    orthogonal = np.zeros((64, 64), bool)
+    between = np.zeros((64, 64, 64), bool)
+    for s in chess.SQUARES:
+        king[s] = [bool(chess.BB_KING_ATTACKS[s] & chess.BB_SQUARES[t]) for t in chess.SQUARES]
+        knight[s] = [bool(chess.BB_KNIGHT_ATTACKS[s] & chess.BB_SQUARES[t]) for t in chess.SQUARES]
+        pawn[s] = [bool(chess.BB_PAWN_ATTACKS[chess.WHITE][s] & chess.BB_SQUARES[t]) for t in chess.SQUARES]
+        for t in chess.SQUARES:
+            if s == t or not chess.BB_RAYS[s][t]:
+                continue
+            same_line = chess.square_rank(s) == chess.square_rank(t) or chess.square_file(s) == chess.square_file(t)
+            (orthogonal if same_line else diagonal)[s, t] = True
+            for x in chess.scan_forward(chess.between(s, t)):
+                between[s, t, x] = True
+    return king, knight, pawn, diagonal, orthogonal, between
+
+
+def _shift(np, array, axis: int, ranks: int, files: int):
+    """Value of `array` with the piece on `axis` moved by (ranks, files), False off the board"""
+    out = np.zeros_like(array)
+    src = [slice(None)] * array.ndim
+    dst = [slice(None)] * array.ndim
+    for dim, step in ((2 * axis, ranks), (2 * axis + 1, files)):
+        src[dim] = slice(max(step, 0), 8 + min(step, 0))
+        dst[dim] = slice(max(-step, 0), 8 + min(-step, 0))
+    out[tuple(dst)] = array[tuple(src)]
+    return out
+
+
+def generate(name: str, tables: Optional[Dict[str, tuple]] = None, verbose: bool = False):
+    """Solve one endgame, returns flat boolean arrays (white to move wins, black to move loses)
+
+    `tables` holds already solved endgames that promotions lead to.
+    """
+    import numpy as np
+
+    pieces, promotions = ENDGAMES[name]
+    tables = tables or {}
+    for promoted in promotions:
+        if promoted not in tables:
+            tables[promoted] = generate(promoted, tables, verbose)
+
+    axes = 2 + len(pieces)
+    flat_shape = (64,) * axes
+    board_shape = (8, 8) * axes
+    king, knight, pawn, diagonal, orthogonal, between = _square_tables(np)
+    sq = [np.arange(64).reshape([64 if i == axis else 1 for i in range(axes)]) for axis in range(axes)]
+    wk, bk = sq[0], sq[1]
+    types = (chess.KING, chess.KING) + pieces
+
+    def attacks(axis, target, blockers):
+        """Piece on `axis` attacks `target`, with the pieces on the `blockers` axes in the way"""
+        piece_type, source = types[axis], sq[axis]
+        if piece_type == chess.KING:
+            return king[source, target]
+        if piece_type == chess.KNIGHT:
+            return knight[source, target]
+        if piece_type == chess.PAWN:
+            return pawn[source, target]
+        line = {chess.BISHOP: diagonal, chess.ROOK: orthogonal}.get(piece_type)
+        mask = line[source, target] if line is not None else diagonal[source, target] | orthogonal[source, target]
+        for blocker in blockers:
+            mask = mask & ~between[source, target, sq[blocker]]
+        return mask
+
+    white_axes = [0] + list(range(2, axes))
+    occupied_by_other = [np.zeros(flat_shape, bool) for _ in range(axes)]
+    for i in range(axes):
+        for j in range(i + 1, axes):
+            same = np.broadcast_to(sq[i] == sq[j], flat_shape)
+            occupied_by_other[i] |= same
+            occupied_by_other[j] |= same
+    valid = ~np.logical_or.reduce(occupied_by_other) & ~king[wk, bk]
+    for axis in range(2, axes):
+        if types[axis] == chess.PAWN:
+            rank = sq[axis] // 8
+            valid &= (rank > 0) & (rank < 7)
+
+    attacked_bk = np.broadcast_to(king[wk, bk], flat_shape).copy()
+    for axis in range(2, axes):
+        attacked_bk |= attacks(axis, bk, [a for a in white_axes if a != axis])
+    valid_white = valid & ~attacked_bk
+    in_check = valid & attacked_bk
+
+    # The black king taking an undefended piece always leads to a draw
+    can_capture = np.zeros(flat_shape, bool)
+    for axis in range(2, axes):
+        defended = np.broadcast_to(king[wk, sq[axis]], flat_shape).copy()
+        for other in range(2, axes):
+            if other != axis:
+                defended |= attacks(other, sq[axis], [a for a in white_axes if a not in (axis, other)])
+        can_capture |= king[bk, sq[axis]] & ~defended
+    can_capture &= valid
+
+    def king_moves(array, axis):
+        result = np.zeros_like(array)
+        for step in KING_STEPS:
+            result |= _shift(np, array, axis, *step)
+        return result
+
+    valid_white = valid_white.reshape(board_shape)
+    valid = valid.reshape(board_shape)
+    in_check = in_check.reshape(board_shape)
+    can_capture = can_capture.reshape(board_shape)
+    empty = [(~occupied).reshape(board_shape) for occupied in occupied_by_other]
+    has_move = king_moves(valid_white, 1) | can_capture
+    ranks = [np.arange(8).reshape([8 if d == 2 * axis else 1 for d in range(2 * axes)]) for axis in range(axes)]
+    promoted_lost = [tables[promoted][1].reshape(board_shape) for promoted in promotions]
+
+    white_wins = np.zeros(board_shape, bool)
+    black_lost = valid & in_check & ~has_move  # Checkmates
+    iteration = 0
+    while True:
+        iteration += 1
+        start = time.time()
+
+        # White to move wins if some move reaches a lost position for black
+        reach = king_moves(black_lost, 0)
+        for axis in range(2, axes):
+            piece_type = types[axis]
+            if piece_type == chess.KNIGHT:
+                for step in KNIGHT_STEPS:
+                    reach |= _shift(np, black_lost, axis, *step)
+            elif piece_type == chess.PAWN:
+                rank = ranks[axis]
+                reach |= _shift(np, black_lost, axis, 1, 0) & (rank < 6)
+                reach |= _shift(np, empty[axis], axis, 1, 0) & _shift(np, black_lost, axis, 2, 0) & (rank == 1)
+                for lost in promoted_lost:
+                    reach |= _shift(np, lost, axis, 1, 0) & (rank == 6)
+            else:
+                for ray in SLIDER_RAYS[piece_type]:
+                    clear = np.ones(board_shape, bool)
+                    for distance in range(1, 8):
+                        step = (ray[0] * distance, ray[1] * distance)
+                        reach |= clear & _shift(np, black_lost, axis, *step)
+                        clear &= _shift(np, empty[axis], axis, *step)
+        white_wins = valid_white & reach
+
+        # Black to move loses if every move reaches a won position for white
+        escapes = king_moves(valid_white & ~white_wins, 1) | can_capture
+        new_lost = valid & (in_check | has_move) & ~escapes
+        if verbose:
+            print(f"  {name} iteration {iteration}: {int(white_wins.sum()):,} wins, "
+                  f"{int(new_lost.sum()):,} losses ({time.time() - start:.1f}s)")
+        if (new_lost == black_lost).all():
+            break
+        black_lost = new_lost
+
+    return white_wins.reshape(-1), black_lost.reshape(-1)
+
+
+def save(name: str, white_wins, black_lost, directory: str = DEFAULT_DIRECTORY):
+    import numpy as np
+
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{name}.bb")
+    with open(path + ".tmp", "wb") as f:
+        f.write(np.packbits(np.concatenate([white_wins, black_lost])).tobytes())
+    os.replace(path + ".tmp", path)
+    return path
+
+
+# ---------------------------------------------------------------------------
+# Probing
+# ---------------------------------------------------------------------------
+
+class Bitbases:
+    """Probes the bitbase files of a directory, each loaded on first use"""
+
+    def __init__(self, directory: str = DEFAULT_DIRECTORY):
+        self.directory = directory
+        self._tables: Dict[str, Optional[bytes]] = {}
+        self._lock = threading.Lock()
+
+    def _table(self, name: str) -> Optional[bytes]:
+        if name not in self._tables:
+            with self._lock:
+                if name not in self._tables:
+                    self._tables[name] = self._load(name)
+        return self._tables[name]
+
+    def _load(self, name: str) -> Optional[bytes]:
+        path = os.path.join(self.directory, f"{name}.bb")
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        if len(data) != table_bytes(name):
+            print(f"Ignoring bitbase {path}: {len(data)} bytes, expected {table_bytes(name)}")
+            return None
+        return data
+
+    def available(self) -> Dict[str, bool]:
+        return {name: self._table(name) is not None for name in ENDGAMES}
+
+    def probe(self, board: chess.Board) -> Optional[int]:
+        """1 if the side to move wins, 0 for a draw, -1 if it loses, None if no table covers the position"""
+        if chess.popcount(board.occupied) > MAX_PIECES or board.castling_rights:
+            return None
+        for strong in (chess.WHITE, chess.BLACK):
+            weak_pieces = board.occupied_co[not strong]
+            if weak_pieces == weak_pieces & board.kings:
+                break
+        else:
+            return None
+
+        strong_pieces = board.occupied_co[strong] & ~board.kings
+        pieces = [board.piece_type_at(square) for square in chess.scan_forward(strong_pieces)]
+        name = SIGNATURES.get(_signature(pieces))
+        if name is None:
+            return None
+        data = self._table(name)
+        if data is None:
+            return None
+
+        # Mirror ranks when black is the stronger side so it plays as white
+        flip = 0 if strong == chess.WHITE else 56
+        index = board.king(strong) ^ flip
+        index = index * 64 + (board.king(not strong) ^ flip)
+        for piece_type in ENDGAMES[name][0]:
+            index = index * 64 + (chess.lsb(board.pieces_mask(piece_type, strong)) ^ flip)
+
+        if board.turn == strong:
+            return 1 if data[index >> 3] >> (7 - (index & 7)) & 1 else 0
+        index += len(data) * 4  # Second half: black to move loses
+        return -1 if data[index >> 3] >> (7 - (index & 7)) & 1 else 0
+
+
+_default_bitbases = None
+_default_lock = threading.Lock()
+
+
+def default_bitbases() -> Bitbases:
+    """Bitbases shared by all engines of the process, from BITBASE_DIR or ./bitbases"""
+    global _default_bitbases
+    with _default_lock:
+        if _default_bitbases is None:
+            _default_bitbases = Bitbases()
+        return _default_bitbases
+
+
+if __name__ == "__main__":
+    # Usage: python chess_bitbase.py [KQK KRK KPK KBNK]
+    names = sys.argv[1:] or list(ENDGAMES)
+    solved = {}
+    for name in names:
+        if name not in ENDGAMES:
+            raise SystemExit(f"Unknown endgame {name}, expected one of {', '.join(ENDGAMES)}")
+        start = time.time()
+        solved[name] = generate(name, solved, verbose=True)
+        path = save(name, *solved[name])
+        print(f"{name}: {int(solved[name][0].sum()):,} white wins, {int(solved[name][1].sum()):,} black losses, "
+              f"written to {path} ({time.time() - start:.1f}s)")
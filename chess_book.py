@@ -0,0 +1,126 @@
+# chess_book.py - Opening books looked up by Polyglot Zobrist key
+#
+# Keys ignore the move counters and include en passant only when a capture
+# is possible, so transpositions find the same book moves.
+import os
+import random
+import threading
+from typing import Dict, List, NamedTuple, Optional
+
+import chess
+import chess.polyglot
+
+# Path of a Polyglot .bin book; without it the small built-in book is used
+BOOK_PATH_ENV = "OPENING_BOOK"
+
+# Lines of the built-in book: FEN -> [(move, weight), ...]
+BUILTIN_LINES = {
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1": [("e2e4", 1)],
+    "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1": [("e7e5", 1)],
+    "rnbqkbnr/pppppppp/8/8/3P4/8/PPP1PPPP/RNBQKBNR b KQkq - 0 1": [("d7d5", 1)],
+    "rnbqkbnr/ppp1pppp/8/3p4/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2": [("e4d5", 1)],
+    "rnbqkbnr/pppp1ppp/8/4p3/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2": [("g1f3", 1)],
+    "r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3": [("f1b5", 1)],
+    "rnbqkb1r/pppp1ppp/5n2/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 4 3": [("d2d3", 1)],
+}
+
+
+class BookMove(NamedTuple):
+    move: chess.Move
+    weight: int
+
+
+class PolyglotBook:
+    """Polyglot .bin book, memory-mapped on the first lookup
+
+    Entries are sorted by key in the file, so a lookup is a binary search
+    that only touches a few pages of the mapping; opening the book costs
+    nothing until then, whatever its size.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._reader: Optional[chess.polyglot.MemoryMappedReader] = None
+        self._lock = threading.Lock()
+
+    def _get_reader(self) -> chess.polyglot.MemoryMappedReader:
+        if self._reader is None:
+            with self._lock:
+                if self._reader is None:
+                    self._reader = chess.polyglot.open_reader(self.path)
+        return self._reader
+
+    def entries(self, board: chess.Board) -> List[BookMove]:
+        """Legal book moves of `board`, highest weight first"""
+        found = [BookMove(entry.move, entry.weight) for entry in self._get_reader().find_all(board)]
+        return sorted(found, key=lambda entry: -entry.weight)
+
+    def __len__(self) -> int:
+        return len(self._get_reader())
+
+    def close(self):
+        with self._lock:
+            if self._reader is not None:
+                self._reader.close()
+                self._reader = None
+
+
+class BuiltinBook:
+    """A few opening lines kept in memory, keyed like a Polyglot book"""
+
+    def __init__(self, lines: Dict[str, list] = BUILTIN_LINES):
+        self._entries: Dict[int, List[BookMove]] = {}
+        for fen, moves in lines.items():
+            board = chess.Board(fen)
+            self._entries[chess.polyglot.zobrist_hash(board)] = sorted(
+                (BookMove(chess.Move.from_uci(uci), weight) for uci, weight in moves), key=lambda entry: -entry.weight)
+
+    def entries(self, board: chess.Board) -> List[BookMove]:
+        return [entry for entry in self._entries.get(chess.polyglot.zobrist_hash(board), [])
+                if board.is_legal(entry.move)]
+
+    def __len__(self) -> int:
+        return sum(len(moves) for moves in self._entries.values())
+
+    def close(self):
+        pass
+
+
+def weighted_choice(entries: List[BookMove], rng: Optional[random.Random] = None) -> BookMove:
+    """Pick a book move with probability proportional to its weight"""
+    return (rng or random).choices(entries, weights=[entry.weight for entry in entries])[0]
+
+
+_default_book = None
+_default_lock = threading.Lock()
+
+
+def check_book_file(path: str):
+    """Raise ValueError unless `path` can be a Polyglot book: a readable file of 16-byte entries"""
+    try:
+        size = os.path.getsize(path)
+        with open(path, "rb"):
+            pass
+    except OSError as e:
+        raise ValueError(f"Cannot open opening book {path}: {e.strerror or e}")
+    if size == 0 or size % 16:
+        raise ValueError(f"{path} is not a Polyglot book ({size} bytes, expected a multiple of 16)")
+
+
+def default_book():
+    """Book shared by all engines of the process, the file from OPENING_BOOK if it is set
+
+    A missing or malformed file is reported once and the built-in book is used instead.
+    """
+    global _default_book
+    with _default_lock:
+        if _default_book is None:
+            path = os.environ.get(BOOK_PATH_ENV)
+            _default_book = BuiltinBook()
+            if path:
+                try:
+                    check_book_file(path)
+                    _default_book = PolyglotBook(path)
+                except ValueError as e:
+                    print(f"Ignoring {BOOK_PATH_ENV}: {e}")
+        return _default_book
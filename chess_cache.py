@@ -0,0 +1,151 @@
+# chess_cache.py - Analysis results by position, kept at the deepest depth seen
+#
+# An in-memory LRU answers repeated requests without a search; an optional
+# durable store (the analysis_cache table through chess_db) shares results
+# between server processes and keeps them across restarts.
+import json
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import chess
+
+from chess_engine import FastChessEngine
+
+# Stored results made by an older engine are ignored, bump this when a
+# change to the search or evaluation makes them stale
+ANALYSIS_CACHE_VERSION = 1
+
+
+def cache_key(fen: str) -> Optional[str]:
+    """FEN without the move counters, en passant only when it is legal; None for an invalid FEN"""
+    try:
+        return chess.Board(fen).epd()
+    except ValueError:
+        return None
+
+
+def _covers(depth: int, multipv: int, known_depth: int, known_multipv: int) -> bool:
+    """True if a result of depth/multipv answers everything the known one does, and more"""
+    return depth >= known_depth and multipv >= known_multipv and (depth, multipv) != (known_depth, known_multipv)
+
+
+class AnalysisCache:
+    """Deepest analyze_position result per position
+
+    get() answers any request whose depth and multipv are covered by the
+    stored result, which can be deeper than asked for. A new result only
+    replaces the stored one when it is at least as deep with at least as
+    many lines, so no request the stored result covers turns into a miss.
+    The durable store
+    must provide get_cached_analysis(key, version) returning a dict with
+    depth, multipv and result (or None) and save_cached_analysis(key,
+    version, depth, multipv, result_json); store errors only count as misses.
+    """
+
+    def __init__(self, capacity: int = 10000, store=None):
+        self.capacity = capacity
+        self.store = store
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (depth, multipv, result json)
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.store_hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.store_errors = 0
+
+    def _remember(self, key: str, depth: int, multipv: int, result_json: str) -> bool:
+        """Keep the entry if it covers the known one, True if it was kept"""
+        with self._lock:
+            current = self._entries.get(key)
+            if current is not None and not _covers(depth, multipv, current[0], current[1]):
+                self._entries.move_to_end(key)
+                return False
+            self._entries[key] = (depth, multipv, result_json)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+            return True
+
+    @staticmethod
+    def _serve(entry: tuple, multipv: int) -> Dict:
+        result = json.loads(entry[2])
+        result["bestMoves"] = result["bestMoves"][:multipv]
+        result["searchInfo"].update(source="analysis_cache", cacheHit=True, multiPV=multipv)
+        return result
+
+    def get(self, fen: str, depth: int, multipv: int = 3) -> Optional[Dict]:
+        """Stored result searched to at least `depth` with at least `multipv` lines, else None"""
+        key = cache_key(fen)
+        if key is None:
+            return None
+        depth = min(depth, FastChessEngine.MAX_DEPTH)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] >= depth and entry[1] >= multipv:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return self._serve(entry, multipv)
+
+        if self.store is not None:
+            try:
+                row = self.store.get_cached_analysis(key, ANALYSIS_CACHE_VERSION)
+            except Exception as e:
+                print(f"Analysis cache store read failed: {e}")
+                row = None
+                with self._lock:
+                    self.store_errors += 1
+            if row is not None:
+                entry = (row["depth"], row["multipv"], json.dumps(row["result"]))
+                self._remember(key, *entry)
+                if entry[0] >= depth and entry[1] >= multipv:
+                    with self._lock:
+                        self.store_hits += 1
+                    return self._serve(entry, multipv)
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, fen: str, result: Dict):
+        """Store a search result if it covers what is known for the position"""
+        key = cache_key(fen)
+        depth = result.get("depth", 0)
+        # Book answers and errors have no bestMoves, depth 0 means nothing was searched
+        if key is None or result.get("status") != "success" or "bestMoves" not in result or depth <= 0:
+            return
+        multipv = len(result["bestMoves"])
+        result_json = json.dumps(result)
+        if not self._remember(key, depth, multipv, result_json):
+            return
+
+        with self._lock:
+            self.writes += 1
+        if self.store is not None:
+            try:
+                self.store.save_cached_analysis(key, ANALYSIS_CACHE_VERSION, depth, multipv, result_json)
+            except Exception as e:
+                print(f"Analysis cache store write failed: {e}")
+                with self._lock:
+                    self.store_errors += 1
+
+    def clear(self):
+        """Forget the in-memory entries, the durable store is left as it is"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.memory_hits + self.store_hits + self.misses
+            return {
+                "size": len(self._entries),
+                "capacity": self.capacity,
+                "durable": self.store is not None,
+                "memoryHits": self.memory_hits,
+                "storeHits": self.store_hits,
+                "misses": self.misses,
+                "hitRate": round((self.memory_hits + self.store_hits) / lookups, 3) if lookups else 0.0,
+                "writes": self.writes,
+                "storeErrors": self.store_errors,
+            }
@@ -1,18 +1,39 @@
 import psycopg2
 from psycopg2.extras import RealDictCursor
+from psycopg2.pool import ThreadedConnectionPool
+from contextlib import contextmanager
 import json
+import os
+import threading
 
 class ChessDatabase:
-    def __init__(self):
-        self.connection = psycopg2.connect(
+    def __init__(self, pool_size=8):
+        # Flask serves requests on threads and a psycopg2 connection holds one
+        # transaction at a time, so every call borrows its own connection
+        self.pool = ThreadedConnectionPool(
+            1, pool_size,
             host="localhost",
             database="chess_coach",
             user="postgres",
             password="zirconOrder",
         )
+        # The pool raises instead of waiting when all connections are out
+        self._available = threading.BoundedSemaphore(pool_size)
+
+    @contextmanager
+    def transaction(self):
+        """A pooled connection, committed when the block ends and rolled back if it raises"""
+        with self._available:
+            connection = self.pool.getconn()
+            try:
+                with connection:
+                    yield connection
+            finally:
+                self.pool.putconn(connection, close=bool(connection.closed))
+
     def get_game_by_id(self, game_id):
         """Get specific game by ID"""
-        with self.connection.cursor(cursor_factory=RealDictCursor) as cursor:
+        with self.transaction() as connection, connection.cursor(cursor_factory=RealDictCursor) as cursor:
             cursor.execute("""
                 SELECT id, pgn, final_fen, game_name, created_at
                 FROM games
@@ -22,35 +43,32 @@ class ChessDatabase:
 
     def delete_game(self, game_id):
         """Delete specific game"""
-        with self.connection.cursor() as cursor:
+        with self.transaction() as connection, connection.cursor() as cursor:
             cursor.execute("DELETE FROM games WHERE id = %s", (game_id,))
-            self.connection.commit()
             return cursor.rowcount > 0
 
     def delete_move(self, move_id):
         """Delete specific move"""
-        with self.connection.cursor() as cursor:
+        with self.transaction() as connection, connection.cursor() as cursor:
             cursor.execute("DELETE FROM moves WHERE id = %s", (move_id,))
-            self.connection.commit()
             return cursor.rowcount > 0
 
     
     def save_game(self, pgn, final_fen, game_name=None):
         """Save complete game to database"""
-        with self.connection.cursor() as cursor:
+        with self.transaction() as connection, connection.cursor() as cursor:
             cursor.execute("""
                 INSERT INTO games (pgn, final_fen, game_name)
                 VALUES (%s, %s, %s)
                 RETURNING id
             """, (pgn, final_fen, game_name))
-            self.connection.commit()
             return cursor.fetchone()[0]
     
     def save_move(self, fen, move_notation, analysis_data):
         """Save bookmarked move with analysis"""
         tags = analysis_data.get('tags', [])
         
-        with self.connection.cursor() as cursor:
+        with self.transaction() as connection, connection.cursor() as cursor:
             cursor.execute("""
                 INSERT INTO moves (fen, move_notation, position_assessment, 
                                  best_move_1, best_move_2, best_move_3,
@@ -67,12 +85,11 @@ class ChessDatabase:
                 analysis_data.get('strategic_advice'),
                 tags
             ))
-            self.connection.commit()
             return cursor.fetchone()[0]
     
     def get_games(self, limit=50, offset=0):
         """Get games list with pagination"""
-        with self.connection.cursor(cursor_factory=RealDictCursor) as cursor:
+        with self.transaction() as connection, connection.cursor(cursor_factory=RealDictCursor) as cursor:
             cursor.execute("""
                 SELECT id, game_name, final_fen, created_at
                 FROM games
@@ -82,7 +99,7 @@ class ChessDatabase:
             return cursor.fetchall()
     
     def search_moves(self, search_query, limit=50, offset=0):
-        with self.connection.cursor(cursor_factory=RealDictCursor) as cursor:
+        with self.transaction() as connection, connection.cursor(cursor_factory=RealDictCursor) as cursor:
             if not search_query or not search_query.strip():
                 cursor.execute("""
                     SELECT * FROM moves
@@ -112,7 +129,7 @@ class ChessDatabase:
     
     def get_all_moves(self, limit=50, offset=0):
         """Get all moves with pagination"""
-        with self.connection.cursor(cursor_factory=RealDictCursor) as cursor:
+        with self.transaction() as connection, connection.cursor(cursor_factory=RealDictCursor) as cursor:
             cursor.execute("""
                 SELECT * FROM moves
                 ORDER BY created_at DESC
@@ -120,5 +137,35 @@ class ChessDatabase:
             """, (limit, offset))
             return cursor.fetchall()
 
+    def get_cached_analysis(self, fen_key, version):
+        """Stored engine analysis of a position (FEN without move counters)"""
+        with self.transaction() as connection, connection.cursor(cursor_factory=RealDictCursor) as cursor:
+            cursor.execute("""
+                SELECT depth, multipv, result
+                FROM analysis_cache
+                WHERE fen_key = %s AND engine_version = %s
+            """, (fen_key, version))
+            return cursor.fetchone()
+
+    def save_cached_analysis(self, fen_key, version, depth, multipv, result_json):
+        """Store an engine analysis over an older engine version's, or over one of the same
+        version that is no deeper with no more lines; never over a newer version's"""
+        with self.transaction() as connection, connection.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO analysis_cache (fen_key, engine_version, depth, multipv, result)
+                VALUES (%s, %s, %s, %s, %s)
+                ON CONFLICT (fen_key) DO UPDATE
+                SET engine_version = EXCLUDED.engine_version,
+                    depth = EXCLUDED.depth,
+                    multipv = EXCLUDED.multipv,
+                    result = EXCLUDED.result,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE analysis_cache.engine_version < EXCLUDED.engine_version
+                   OR (analysis_cache.engine_version = EXCLUDED.engine_version
+                       AND EXCLUDED.depth >= analysis_cache.depth
+                       AND EXCLUDED.multipv >= analysis_cache.multipv
+                       AND (EXCLUDED.depth, EXCLUDED.multipv) <> (analysis_cache.depth, analysis_cache.multipv))
+            """, (fen_key, version, depth, multipv, result_json))
+
 # Add to your existing ChessCoach class
-chess_db = ChessDatabase()
+chess_db = ChessDatabase(int(os.environ.get("DB_POOL_SIZE", 8)))
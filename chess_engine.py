@@ -6,11 +6,41 @@ from flask import request, jsonify,Flask
 import chess
 import time
 import json
-import hashlib
-from typing import List, Tuple, Dict, Optional
+import math
+import multiprocessing
+import queue
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import Callable, List, Tuple, Dict, Optional
 from dataclasses import dataclass
+
+import chess_bitbase
+import chess_book
+import chess_nnue
+import chess_position
+import chess_see
+import chess_zobrist
+from chess_tt import TranspositionTable, BYTES_PER_ENTRY, EXACT, LOWER, UPPER, MATE_THRESHOLD, BITBASE_WIN_SCORE
+from chess_pawns import PawnHashTable
 # Add this import at the top with other imports
 
+# LMR_REDUCTIONS[depth][moves_searched]: plies to reduce a late quiet move by
+LMR_REDUCTIONS = [
+    [int(0.75 + math.log(depth) * math.log(moves) / 2.25) if depth and moves else 0 for moves in range(64)]
+    for depth in range(64)
+]
+
+# Selective search techniques, each can be switched off per request
+PRUNING_OPTIONS = ("nullMove", "reverseFutility", "futility", "lateMovePruning", "lmr")
+
+# Static evaluations a search can use, chosen per request
+EVAL_BACKENDS = ("classical", "nnue")
+
+
+class SearchAborted(Exception):
+    """Raised inside the search when the time or node budget runs out"""
+
 
 @dataclass
 class MoveResult:
@@ -19,7 +49,34 @@ class MoveResult:
     pv: List[str]
 
 class FastChessEngine:
-    def __init__(self):
+    # Default time budget when a request sets no limits
+    DEFAULT_MOVETIME_MS = 5000
+    # Deepest iteration a search runs, whatever depth is requested
+    MAX_DEPTH = 12
+    # Evaluation reported for book moves, in centipawns
+    BOOK_EVAL_CP = 15
+    # Score of a bitbase win, above any evaluation but below mate scores
+    # (defined with the TT, which stores it relative to the node)
+    BITBASE_WIN_SCORE = BITBASE_WIN_SCORE
+    # Nodes between two budget checks inside the search
+    LIMIT_CHECK_INTERVAL = 64
+    # Half width of the root aspiration window in centipawns
+    ASPIRATION_WINDOW = 50
+    # Quiescence search: maximum plies, safety margin for delta pruning and
+    # the SEE below which a capture is not tried
+    QSEARCH_MAX_PLY = 8
+    DELTA_MARGIN = 200
+    QSEARCH_SEE_THRESHOLD = -50
+    # Selective search: null move needs this depth, reverse futility and
+    # futility work near the leaves with margins per remaining ply, late move
+    # pruning skips quiet moves after LMP_COUNTS[depth] of them were searched
+    NULL_MOVE_MIN_DEPTH = 3
+    REVERSE_FUTILITY_DEPTH = 3
+    REVERSE_FUTILITY_MARGIN = 120
+    FUTILITY_MARGINS = (0, 150, 300)
+    LMP_COUNTS = (0, 6, 10, 16)
+
+    def __init__(self, tt_size_mb: int = 16, tt_buffer=None):
         # Enhanced piece values
         self.piece_values = {
             chess.PAWN: 100, chess.KNIGHT: 320, chess.BISHOP: 330,
@@ -104,89 +161,239 @@ class FastChessEngine:
             -50,-30,-30,-30,-30,-30,-30,-50
         ]
 
-        # Search optimization tables
-        self.transposition_table = {}
+        # Signed (white positive) piece-square values for the incremental evaluation
+        self._init_eval_tables()
+
+        # Search optimization tables; a table in a shared buffer is cleared by its owner
+        self.transposition_table = TranspositionTable(tt_size_mb, tt_buffer)
+        self._shared_tt = tt_buffer is not None
         self.killer_moves = [[] for _ in range(64)]
         self.history_table = {}
+        self.pawn_table = PawnHashTable()
+
+        # Triangular PV table: row `ply` holds the best line found from that
+        # ply in entries ply .. _pv_length[ply] - 1, copied up from row ply + 1
+        self._pv_table = [[None] * 64 for _ in range(64)]
+        self._pv_length = [0] * 64
+
+        # Zobrist keys (full and pawns only) of the current search position
+        self._key = 0
+        self._pawn_key = 0
+
+        # Incremental material/PST state of the current search position:
+        # (non-king material, non-king piece count, material + PST, king middlegame PST, king endgame PST)
+        self._eval = (0, 0, 0, 0, 0)
+
+        # (key, pawn key, eval state) saved by _make_move for _unmake_move
+        self._state_stack = []
+
+        # Evaluation backend of the last search, see _set_eval_backend; with
+        # "nnue" _accumulators follows the search line like _state_stack
+        self.eval_backend = "classical"
+        self._accumulators = None
+        self._nnue = None
 
         # Search statistics
         self.nodes_searched = 0
+        self.qnodes_searched = 0  # Part of nodes_searched spent in quiescence search
         self.tt_hits = 0
         self.beta_cutoffs = 0
-
-        # Enhanced opening book
-        self.opening_book = {
-            "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1": "e2e4",
-            "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1": "e7e5",
-            "rnbqkbnr/pppppppp/8/8/3P4/8/PPP1PPPP/RNBQKBNR b KQkq - 0 1": "d7d5",
-            "rnbqkbnr/ppp1pppp/8/3p4/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2": "e4d5",
-            "rnbqkbnr/pppp1ppp/8/4p3/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2": "g1f3",
-            "r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3": "f1b5",
-            "rnbqkb1r/pppp1ppp/5n2/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 4 3": "d2d3"
-        }
-
-    def analyze_position(self, fen: str, depth: int = 6) -> Dict:
-        
+        self.aspiration_researches = 0
+        self.searches_completed = 0  # Searches run on this instance, 0 means a cold TT
+        self.last_search_info = None
+
+        # Root move order and exact line scores from the previous iteration
+        self._root_moves = []
+        self._root_scores = []
+
+        # Selective search switches, see _set_pruning
+        self._set_pruning(None)
+        self.null_move_cutoffs = 0
+        self.pruned_moves = 0
+
+        # An Event that stops the search when set from another thread or
+        # process (cancellation, lazy SMP), and (size, phase) to skip
+        # iterations in lazy SMP helper workers
+        self.stop_event = None
+        self.depth_skip = None
+
+        # Search budget, see _set_limits
+        self._stop_time = None
+        self._node_limit = None
+        self._next_check = 0
+        self._abort_allowed = False
+
+        # Opening book, a Polyglot file when OPENING_BOOK is set (None disables it)
+        self.opening_book = chess_book.default_book()
+
+        # Endgame bitbases (None disables them); the search probes them unless
+        # the root is already in a table, and _root_filter then holds the root
+        # moves that keep its result
+        self.bitbases = chess_bitbase.default_bitbases()
+        self._probe_bitbases = False
+        self._root_filter = None
+        self.bitbase_hits = 0
+
+    def analyze_position(self, fen: str, depth: int = 6, movetime: Optional[int] = None,
+                         nodes: Optional[int] = None, deadline: Optional[float] = None,
+                         multipv: int = 3, pruning: Optional[Dict[str, bool]] = None,
+                         book: bool = True, on_depth: Optional[Callable[[Dict], None]] = None,
+                         eval_backend: str = "classical", searchmoves: Optional[List[chess.Move]] = None) -> Dict:
+        """Iterative deepening analysis of `fen`
+
+        Args:
+            fen: FEN string of position
+            depth: Maximum search depth
+            movetime: Time budget in milliseconds
+            nodes: Node budget
+            deadline: Absolute stop time as a time.time() timestamp
+            multipv: Number of best lines to return with exact scores
+            pruning: Selective search switches by name (see PRUNING_OPTIONS),
+                all enabled unless set to False
+            book: Answer from the opening book when the position is in it
+            on_depth: Called after every completed iteration with that
+                depth's evaluation, bestMoves and node/time counts
+            eval_backend: Static evaluation of the search (see EVAL_BACKENDS),
+                "nnue" needs NumPy
+            searchmoves: Search only these root moves (as UCI searchmoves),
+                raises ValueError if none of them is legal
+
+        The search stops as soon as any budget runs out, even in the middle
+        of an iteration, and returns the result of the last completed depth.
+        Without any limit the default movetime applies. An illegal position
+        (see chess.Board.status) gives a status error without a search.
+        """
         try:
-            board = chess.Board(fen)
+            board = chess_position.SearchBoard(fen)
+            # The move generator and search assume one king each and a legal
+            # check state, anything else could crash or loop in the search
+            status = board.status()
+            if status != chess.STATUS_VALID:
+                problems = ", ".join(flag.name.lower().replace("_", " ") for flag in chess.Status if flag & status)
+                raise ValueError(f"Invalid position: {problems}")
             start_time = time.time()
+            multipv = max(1, int(multipv))
+            self._set_limits(start_time, movetime, nodes, deadline)
+            self._set_pruning(pruning)
+            self._set_eval_backend(eval_backend)
 
             # Reset search statistics
             self.nodes_searched = 0
+            self.qnodes_searched = 0
             self.tt_hits = 0
             self.beta_cutoffs = 0
-            self.transposition_table.clear()
+            self.aspiration_researches = 0
+            self.null_move_cutoffs = 0
+            self.pruned_moves = 0
+            self.bitbase_hits = 0
+            self._root_moves = []
+            self._root_scores = []
+            self.last_search_info = None
+            warm_start = self.searches_completed > 0
+
+            # Keep the TT and history from earlier searches, they stay useful
+            # for nearby positions. Old TT entries are replaced first.
+            self.transposition_table.new_search()
             self.killer_moves = [[] for _ in range(64)]
+            for move_key in self.history_table:
+                self.history_table[move_key] //= 2
+            self.pawn_table.reset_stats()
+            self._set_search_root(board)
 
             # Check opening book first
-            if fen in self.opening_book:
-                book_move = self.opening_book[fen]
-                return {
-                    "status": "success",
-                    "evaluation": 0.15,
-                    "depth": 0,
-                    "best_moves": [{
-                        "move": book_move,
-                        "eval_score": 0.15,
-                        "principal_variation": [book_move],
-                        "type": "book"
-                    }],
-                    "search_info": {
-                        "time_ms": int((time.time() - start_time) * 1000),
-                        "nodes": 0,
-                        "nps": 0,
-                        "source": "opening_book"
-                    }
-                }
+            book_moves = []
+            if book and searchmoves is None and self.opening_book is not None:
+                try:
+                    book_moves = self.opening_book.entries(board)
+                except (OSError, ValueError) as e:
+                    # The book file went away or is damaged, search without it
+                    print(f"Opening book lookup failed: {e}")
+            if book_moves:
+                return self._book_result(board, book_moves, multipv, start_time)
+
+            # A drawn bitbase position needs no search; in a won one only
+            # winning moves are searched, the evaluation finds the progress.
+            # searchmoves restricts both, the search covers them if none keeps the result
+            if searchmoves is not None:
+                searchmoves = {move for move in searchmoves if board.is_legal(move)}
+                if not searchmoves:
+                    raise ValueError("searchmoves contains no legal move")
+            root_wdl = self.bitbases.probe(board) if self.bitbases is not None else None
+            self._probe_bitbases = self.bitbases is not None and root_wdl is None
+            self._root_filter = None
+            if root_wdl is not None:
+                move_wdls = [(move, wdl) for move, wdl in self._bitbase_move_results(board)
+                             if searchmoves is None or move in searchmoves]
+                keeping = [move for move, wdl in move_wdls if wdl == root_wdl]
+                if root_wdl == 0 and keeping:
+                    return self._bitbase_draw_result(board, keeping, multipv, start_time)
+                if root_wdl == 1 and keeping:
+                    self._root_filter = set(keeping)
+            if searchmoves is not None and self._root_filter is None:
+                self._root_filter = searchmoves
 
             # Iterative deepening search with time management
             best_moves = []
             final_eval = 0
-            max_depth = min(depth, 12)  # Cap depth for performance
+            max_depth = min(depth, self.MAX_DEPTH)  # Cap depth for performance
+
+            completed_depth = 0
+            aborted = False
 
             for current_depth in range(1, max_depth + 1):
+                # Lazy SMP helpers leave some intermediate depths to other workers
+                if self.depth_skip and 1 < current_depth < max_depth:
+                    size, phase = self.depth_skip
+                    if ((current_depth + phase) // size) % 2:
+                        continue
+
+                # Depth 1 always completes so there is a move to return
+                self._abort_allowed = current_depth > 1
                 try:
-                    eval_score, moves = self._search_root(board, current_depth)
+                    eval_score, moves = self._search_root(board, current_depth, multipv)
                     best_moves = moves
                     final_eval = eval_score
+                    completed_depth = current_depth
+
+                    if on_depth is not None:
+                        on_depth({
+                            "status": "success",
+                            "evaluation": self._format_evaluation(eval_score),
+                            "depth": current_depth,
+                            "bestMoves": self._format_best_moves(board, moves[:multipv], current_depth),
+                            "searchInfo": {
+                                "totalTime": int((time.time() - start_time) * 1000),
+                                "totalNodes": self.nodes_searched,
+                                "depth": current_depth,
+                                "source": "engine_search"
+                            }
+                        })
 
                     # Early termination for forced mate
                     if abs(eval_score) > 5000:
                         break
 
-                    # Time limit check (max 5 seconds per position)
-                    if time.time() - start_time > 5.0:
+                    # Don't start an iteration that is unlikely to finish
+                    if self._budget_nearly_spent(start_time):
                         break
 
+                except SearchAborted:
+                    # Take back the moves of the interrupted search
+                    while self._state_stack:
+                        self._unmake_move(board)
+                    aborted = True
+                    break
                 except Exception as e:
                     if current_depth == 1:
                         raise e
                     break
 
+            self._abort_allowed = False
             search_time = time.time() - start_time
 
-            # Ensure we have at least 3 moves or pad with available moves
-            while len(best_moves) < 3 and len(best_moves) < len(list(board.legal_moves)):
+            # Ensure we have at least 3 moves or pad with available moves,
+            # except for moves a bitbase showed to be worse
+            while self._root_filter is None and len(best_moves) < 3 and len(best_moves) < len(list(board.legal_moves)):
                 remaining_moves = [str(move) for move in board.legal_moves
                                  if str(move) not in [m.move for m in best_moves]]
                 if remaining_moves:
@@ -198,39 +405,44 @@ class FastChessEngine:
                 else:
                     break
 
-            return {
+            search_info = {
+                "totalTime": int(search_time * 1000),
+                "totalNodes": self.nodes_searched,
+                "nodesPerSecond": int(self.nodes_searched / (search_time + 0.001)),
+                "depth": completed_depth,
+                "aborted": aborted,
+                "ttHits": self.tt_hits,
+                "ttHitRate": round(self.transposition_table.hit_rate(), 3),
+                "ttUsage": round(self.transposition_table.usage(), 3),
+                "ttSizeMb": self.transposition_table.size_mb,
+                "ttBytesPerEntry": BYTES_PER_ENTRY,
+                "pawnHashHitRate": round(self.pawn_table.hit_rate(), 3),
+                "betaCutoffs": self.beta_cutoffs,
+                "qNodes": self.qnodes_searched,
+                "qNodeShare": round(self.qnodes_searched / max(self.nodes_searched, 1), 3),
+                "nullMoveCutoffs": self.null_move_cutoffs,
+                "prunedMoves": self.pruned_moves,
+                "bitbaseHits": self.bitbase_hits,
+                "pruning": dict(self._pruning),
+                "evalBackend": self.eval_backend,
+                "multiPV": multipv,
+                "aspirationResearches": self.aspiration_researches,
+                "warmStart": warm_start,
+                "source": "engine_search"
+            }
+            self.searches_completed += 1
+            self.last_search_info = search_info
+
+            result = {
                 "status": "success",
-                "evaluation": {
-                    "value": round(final_eval / 100, 2),
-                    "type": "cp",
-                    "display": f"+{round(final_eval / 100, 2)}" if final_eval >= 0 else f"{round(final_eval / 100, 2)}"
-                },
-                "depth": current_depth,
-                "bestMoves": [  # Changed from "best_moves"
-                    {
-                        "move": move.move,
-                        "san": self._move_to_san(board, move.move), 
-                        "eval_score": round(move.eval_score / 100, 2),
-                        "evaluationRaw": round(move.eval_score / 100, 2),
-                        "evaluation": f"+{round(move.eval_score / 100, 2)}" if move.eval_score >= 0 else f"{round(move.eval_score / 100, 2)}",
-                        "principal_variation": move.pv,
-                        "principalVariation": move.pv,  # Frontend expects this name
-                        "depth": current_depth,
-                        "nodes": self.nodes_searched,
-                        "type": "search"
-                    }
-                    for move in best_moves[:3]
-                ],
-                "searchInfo": {  # Changed from "search_info"
-                    "totalTime": int(search_time * 1000),     # Changed from "time_ms"
-                    "totalNodes": self.nodes_searched,        # Changed from "nodes"
-                    "nodesPerSecond": int(self.nodes_searched / (search_time + 0.001)),  # Changed from "nps"
-                    "depth": current_depth,
-                    "ttHits": self.tt_hits,
-                    "betaCutoffs": self.beta_cutoffs,
-                    "source": "engine_search"
-                }
+                "evaluation": self._format_evaluation(final_eval),
+                "depth": completed_depth,
+                "bestMoves": self._format_best_moves(board, best_moves[:multipv], completed_depth),  # Changed from "best_moves"
+                "searchInfo": search_info  # Changed from "search_info"
             }
+            if root_wdl is not None:
+                result["wdl"] = root_wdl
+            return result
 
 
         except Exception as e:
@@ -241,43 +453,260 @@ class FastChessEngine:
                 "best_moves": []
             }
 
-    def _search_root(self, board: chess.Board, depth: int) -> Tuple[float, List[MoveResult]]:
-        """Root search with comprehensive move analysis"""
+    def _book_result(self, board: chess.Board, book_moves: List[chess_book.BookMove],
+                     multipv: int, start_time: float) -> Dict:
+        """Analysis result made of book moves, a weighted random pick first"""
+        chosen = chess_book.weighted_choice(book_moves)
+        ordered = [chosen] + [entry for entry in book_moves if entry is not chosen]
+        total_weight = sum(entry.weight for entry in book_moves)
+        best_moves = []
+        for entry in ordered[:multipv]:
+            uci = entry.move.uci()
+            best_moves.append({
+                "move": uci,
+                "san": board.san(entry.move),
+                "eval_score": self.BOOK_EVAL_CP / 100,
+                "evaluationRaw": self.BOOK_EVAL_CP / 100,
+                "evaluation": f"+{self.BOOK_EVAL_CP / 100}",
+                "principal_variation": [uci],
+                "principalVariation": [uci],
+                "depth": 0,
+                "nodes": 0,
+                "weight": entry.weight,
+                "share": round(entry.weight / total_weight, 3),
+                "type": "book"
+            })
+        return {
+            "status": "success",
+            "evaluation": self._format_evaluation(self.BOOK_EVAL_CP),
+            "depth": 0,
+            "bestMoves": best_moves,
+            "searchInfo": {
+                "totalTime": int((time.time() - start_time) * 1000),
+                "totalNodes": 0,
+                "nodesPerSecond": 0,
+                "depth": 0,
+                "bookMoves": len(book_moves),
+                "source": "opening_book"
+            }
+        }
+
+    def _bitbase_move_results(self, board: chess.Board) -> List[Tuple[chess.Move, int]]:
+        """(move, win/draw/loss for the mover) of every legal move of a bitbase position"""
+        results = []
+        for move in board.legal_moves:
+            board.push(move)
+            if board.is_checkmate():
+                wdl = 1
+            elif board.is_game_over():
+                wdl = 0
+            else:
+                # Captures and promotions stay inside the tables or end in a draw
+                wdl = -(self.bitbases.probe(board) or 0)
+            board.pop()
+            results.append((move, wdl))
+        return results
+
+    def _bitbase_draw_result(self, board: chess.Board, moves: List[chess.Move],
+                             multipv: int, start_time: float) -> Dict:
+        """Analysis result of a drawn bitbase position, listing moves that hold the draw"""
+        lines = [MoveResult(move=move.uci(), eval_score=0, pv=[move.uci()]) for move in moves[:multipv]]
+        return {
+            "status": "success",
+            "evaluation": self._format_evaluation(0),
+            "depth": 0,
+            "wdl": 0,
+            "bestMoves": self._format_best_moves(board, lines, 0),
+            "searchInfo": {
+                "totalTime": int((time.time() - start_time) * 1000),
+                "totalNodes": 0,
+                "nodesPerSecond": 0,
+                "depth": 0,
+                "source": "bitbase"
+            }
+        }
+
+    @staticmethod
+    def _format_evaluation(score: float) -> Dict:
+        value = round(score / 100, 2)
+        return {"value": value, "type": "cp", "display": f"+{value}" if score >= 0 else f"{value}"}
+
+    def _format_best_moves(self, board: chess.Board, moves: List[MoveResult], depth: int) -> List[Dict]:
+        """bestMoves entries of an analysis result"""
+        return [
+            {
+                "move": move.move,
+                "san": self._move_to_san(board, move.move),
+                "eval_score": round(move.eval_score / 100, 2),
+                "evaluationRaw": round(move.eval_score / 100, 2),
+                "evaluation": f"+{round(move.eval_score / 100, 2)}" if move.eval_score >= 0 else f"{round(move.eval_score / 100, 2)}",
+                "principal_variation": move.pv,
+                "principalVariation": move.pv,  # Frontend expects this name
+                "depth": depth,
+                "nodes": self.nodes_searched,
+                "type": "search"
+            }
+            for move in moves
+        ]
+
+    def _set_limits(self, start_time: float, movetime: Optional[int], nodes: Optional[int],
+                    deadline: Optional[float]):
+        """Turn the request limits into an absolute stop time and node limit"""
+        if movetime is None and nodes is None and deadline is None:
+            movetime = self.DEFAULT_MOVETIME_MS
+
+        stop_times = []
+        if movetime is not None:
+            stop_times.append(start_time + movetime / 1000)
+        if deadline is not None:
+            stop_times.append(deadline)
+
+        self._stop_time = min(stop_times) if stop_times else None
+        self._node_limit = nodes
+        self._next_check = self.LIMIT_CHECK_INTERVAL
+        self._abort_allowed = False
+
+    def _set_pruning(self, pruning: Optional[Dict[str, bool]]):
+        """Enable every selective search technique except those set to False"""
+        self._pruning = {name: bool((pruning or {}).get(name, True)) for name in PRUNING_OPTIONS}
+        self._null_move = self._pruning["nullMove"]
+        self._reverse_futility = self._pruning["reverseFutility"]
+        self._futility = self._pruning["futility"]
+        self._late_move_pruning = self._pruning["lateMovePruning"]
+        self._lmr = self._pruning["lmr"]
+
+    def _set_eval_backend(self, name: str):
+        """Evaluate with the classical terms or the NNUE network
+
+        TT scores of the other evaluation would mix into the search, so
+        switching clears the TT and the next search starts cold. A shared
+        TT is left alone: other workers are searching in it, and LazySMP
+        clears it once before the search.
+        """
+        if name not in EVAL_BACKENDS:
+            raise ValueError(f"unknown evaluation backend {name}, expected one of {', '.join(EVAL_BACKENDS)}")
+        if name == "nnue" and self._accumulators is None:
+            self._accumulators = chess_nnue.AccumulatorStack(chess_nnue.default_network(self))
+        if name != self.eval_backend:
+            if not self._shared_tt:
+                self.transposition_table.clear()
+            self.searches_completed = 0
+            self.eval_backend = name
+        self._nnue = self._accumulators if name == "nnue" else None
+
+    def _check_limits(self):
+        """Called every LIMIT_CHECK_INTERVAL nodes, aborts the search once the budget is spent"""
+        self._next_check = self.nodes_searched + self.LIMIT_CHECK_INTERVAL
+        if self._node_limit is not None:
+            self._next_check = min(self._next_check, self._node_limit)
+
+        if not self._abort_allowed:
+            return
+        if self._node_limit is not None and self.nodes_searched >= self._node_limit:
+            raise SearchAborted()
+        if self._stop_time is not None and time.time() >= self._stop_time:
+            raise SearchAborted()
+        if self.stop_event is not None and self.stop_event.is_set():
+            raise SearchAborted()
+
+    def _budget_nearly_spent(self, start_time: float) -> bool:
+        """True when more than half of the remaining budget is used up"""
+        if self._node_limit is not None and self.nodes_searched * 2 >= self._node_limit:
+            return True
+        if self._stop_time is not None:
+            now = time.time()
+            return now - start_time >= (self._stop_time - start_time) / 2
+        return False
+
+    def _search_root(self, board: chess.Board, depth: int, multipv: int = 3) -> Tuple[float, List[MoveResult]]:
+        """MultiPV root search with aspiration windows
+
+        The best `multipv` moves get exact scores and a principal variation,
+        the remaining moves only get upper bounds. The window is centred on
+        the previous iteration's best and K-th best scores and widened on a
+        fail high or fail low.
+        """
         legal_moves = list(board.legal_moves)
         if not legal_moves:
             if board.is_checkmate():
-                return -9999 if board.turn else 9999, []
+                return -9999, []
             return 0, []
 
-        # Advanced move ordering
-        ordered_moves = self._order_moves_advanced(board, legal_moves)
-        move_results = []
-        alpha = -10000
-        beta = 10000
+        # Previous iteration's results order the moves, otherwise use the heuristics
+        if self._root_moves:
+            ordered_moves = [move for move in self._root_moves if move in legal_moves]
+        else:
+            tt_entry = self.transposition_table.probe(self._key)
+            ordered_moves = list(self._staged_moves(board, 0, tt_entry[0] if tt_entry else None))
+        if self._root_filter is not None:
+            ordered_moves = [move for move in ordered_moves if move in self._root_filter]
+
+        multipv = max(1, min(multipv, len(ordered_moves)))
+        alpha, beta = -10000, 10000
+        if self._root_scores and abs(self._root_scores[0]) < 5000:
+            alpha = self._root_scores[min(multipv, len(self._root_scores)) - 1] - self.ASPIRATION_WINDOW
+            beta = self._root_scores[0] + self.ASPIRATION_WINDOW
+
+        while True:
+            lines, others, failed_high = self._search_root_window(board, depth, ordered_moves, multipv, alpha, beta)
+            if failed_high and beta < 10000:
+                beta = 10000
+            elif len(lines) < multipv and alpha > -10000:
+                alpha = -10000
+            else:
+                break
+            self.aspiration_researches += 1
 
-        for move in ordered_moves:
-            board.push(move)
+        others.sort(key=lambda x: x.eval_score, reverse=True)
+        move_results = lines + others
+        self._root_moves = [chess.Move.from_uci(result.move) for result in move_results]
+        self._root_scores = [result.eval_score for result in lines]
 
-            # Search this move
-            eval_score = -self._negamax(board, depth - 1, -beta, -alpha, 1)
+        return move_results[0].eval_score, move_results
 
-            # Get principal variation
-            pv = self._extract_pv_enhanced(board, move, depth - 1)
+    def _search_root_window(self, board: chess.Board, depth: int, ordered_moves: List[chess.Move],
+                            multipv: int, alpha: float, beta: float) -> Tuple[List[MoveResult], List[MoveResult], bool]:
+        """Search all root moves, keeping exact scores for the best `multipv` of them
 
-            move_results.append(MoveResult(
-                move=str(move),
-                eval_score=eval_score,
-                pv=pv
-            ))
+        A move only needs an exact score if it beats the current K-th best
+        line, so every other move is searched with a null window at that
+        threshold. Returns (lines, others, failed_high).
+        """
+        lines = []   # Exact scores, best first
+        others = []  # Upper bounds
 
-            board.pop()
-            alpha = max(alpha, eval_score)
+        for move in ordered_moves:
+            threshold = lines[-1].eval_score if len(lines) == multipv else alpha
 
-        # Sort results by evaluation score
-        move_results.sort(key=lambda x: x.eval_score, reverse=board.turn)
+            self._make_move(board, move)
+            if not lines:
+                score = -self._negamax(board, depth - 1, -beta, -threshold, 1)
+            else:
+                score = -self._negamax(board, depth - 1, -threshold - 1, -threshold, 1)
+                if threshold < score < beta:
+                    score = -self._negamax(board, depth - 1, -beta, -threshold, 1)
+            self._unmake_move(board)
+
+            # Only a move that beat the threshold was searched with an open
+            # window, its reply line is still in row 1 of the PV table
+            pv = [str(move)]
+            if score > threshold:
+                pv += [str(reply) for reply in self._pv_table[1][1:self._pv_length[1]]]
+            result = MoveResult(move=str(move), eval_score=score, pv=pv)
+            if score >= beta:
+                lines.insert(0, result)
+                return lines, others, True
+
+            if score > threshold:
+                lines.append(result)
+                lines.sort(key=lambda x: x.eval_score, reverse=True)
+                if len(lines) > multipv:
+                    others.append(lines.pop())
+            else:
+                others.append(result)
+
+        return lines, others, False
 
-        best_eval = move_results[0].eval_score if move_results else 0
-        return best_eval, move_results
     def _move_to_san(self, board: chess.Board, uci_move: str) -> str:
         """Convert UCI move to SAN notation"""
         try:
@@ -289,45 +718,99 @@ class FastChessEngine:
     def _negamax(self, board: chess.Board, depth: int, alpha: float, beta: float, ply: int) -> float:
         """Enhanced negamax with all optimizations"""
         self.nodes_searched += 1
+        if self.nodes_searched >= self._next_check:
+            self._check_limits()
+        self._pv_length[ply] = ply
 
-        # Terminal conditions
-        if board.is_game_over():
-            if board.is_checkmate():
-                return -9999 + ply
+        # Draws found without generating moves; mate and stalemate show up
+        # as an empty move list below
+        if board.halfmove_clock >= 100 and not board.is_checkmate():
+            return 0
+        if self._is_repetition(board):
             return 0
+        if not (board.pawns | board.rooks | board.queens) and board.is_insufficient_material():
+            return 0
+
+        # Exact result from the endgame bitbases, sooner wins score higher
+        if self._probe_bitbases and chess.popcount(board.occupied) <= chess_bitbase.MAX_PIECES:
+            wdl = self.bitbases.probe(board)
+            if wdl is not None:
+                self.bitbase_hits += 1
+                return wdl * (self.BITBASE_WIN_SCORE - ply)
 
         # Depth limit with enhanced quiescence
         if depth <= 0:
-            return self._quiescence_search_enhanced(board, alpha, beta, 4)
-
-        # Transposition table lookup
-        pos_hash = self._position_hash(board)
-        if pos_hash in self.transposition_table:
-            tt_entry = self.transposition_table[pos_hash]
-            if tt_entry['depth'] >= depth:
+            return self._quiescence_search_enhanced(board, alpha, beta, 0, ply)
+
+        # Transposition table lookup, only trusting bounds that cut this window.
+        # PV nodes search on so that their line reaches the PV table.
+        alpha_orig = alpha
+        pos_hash = self._key
+        pv_node = beta - alpha > 1
+        tt_move = None
+        tt_entry = self.transposition_table.probe(pos_hash, ply)
+        if tt_entry:
+            tt_move, tt_score, tt_depth, tt_bound = tt_entry
+            if not pv_node and tt_depth >= depth and (tt_bound == EXACT or
+                                                      (tt_bound == LOWER and tt_score >= beta) or
+                                                      (tt_bound == UPPER and tt_score <= alpha)):
                 self.tt_hits += 1
-                return tt_entry['score']
-
-        legal_moves = list(board.legal_moves)
-        if not legal_moves:
-            return 0
-
-        # Enhanced move ordering
-        ordered_moves = self._order_moves_advanced(board, legal_moves)
+                return tt_score
+
+        in_check = board.is_check()
+        futile = False
+
+        if not pv_node and not in_check:
+            static_eval = self._evaluate_position_enhanced(board)
+
+            # Reverse futility: far enough above beta that a shallow search won't drop below it
+            if (self._reverse_futility and depth <= self.REVERSE_FUTILITY_DEPTH and abs(beta) < MATE_THRESHOLD and
+                    static_eval - self.REVERSE_FUTILITY_MARGIN * depth >= beta):
+                return static_eval
+
+            # Null move: give the opponent a free move, if we still beat beta the node is cut.
+            # Not in pawn endings (zugzwang) and never twice in a row.
+            if (self._null_move and depth >= self.NULL_MOVE_MIN_DEPTH and static_eval >= beta and
+                    abs(beta) < MATE_THRESHOLD and board.plies_from_null > 0 and
+                    board.occupied_co[board.turn] & ~(board.pawns | board.kings)):
+                reduction = 3 if depth >= 6 else 2
+                self._make_move(board, chess.Move.null())
+                score = -self._negamax(board, depth - 1 - reduction, -beta, -beta + 1, ply + 1)
+                self._unmake_move(board)
+                if score >= beta:
+                    self.null_move_cutoffs += 1
+                    return beta
+
+            # Futility: quiet moves can't bring the score up to alpha at frontier nodes
+            futile = (self._futility and depth < len(self.FUTILITY_MARGINS) and abs(alpha) < MATE_THRESHOLD and
+                      static_eval + self.FUTILITY_MARGINS[depth] <= alpha)
+
+        late_move_limit = (self.LMP_COUNTS[depth] if self._late_move_pruning and not pv_node and not in_check and
+                           depth < len(self.LMP_COUNTS) else None)
 
         best_score = -10000
         best_move = None
         moves_searched = 0
+        quiets_searched = 0
+
+        # Moves are generated stage by stage as the search asks for them
+        for move in self._staged_moves(board, ply, tt_move):
+            is_quiet = not move.promotion and not board.is_capture(move)
+            self._make_move(board, move)
+            gives_check = board.is_check()
+
+            if is_quiet and not gives_check and moves_searched and (
+                    futile or (late_move_limit is not None and quiets_searched >= late_move_limit)):
+                self._unmake_move(board)
+                self.pruned_moves += 1
+                continue
 
-        for move in ordered_moves:
-            board.push(move)
-
-            # Late move reduction with conditions
+            # Late move reduction from the depth/move number table, less in PV nodes
             reduction = 0
-            if (moves_searched > 3 and depth > 2 and
-                not board.is_capture(move) and not board.is_check() and
-                not move.promotion):
-                reduction = 1
+            if (self._lmr and moves_searched > 2 and depth > 2 and is_quiet and
+                    not gives_check and not in_check):
+                reduction = LMR_REDUCTIONS[min(depth, 63)][min(moves_searched, 63)] - pv_node
+                reduction = max(0, min(reduction, depth - 2))
 
             # Principal variation search
             if moves_searched == 0:
@@ -336,44 +819,81 @@ class FastChessEngine:
             else:
                 # Search with null window first
                 score = -self._negamax(board, depth - 1 - reduction, -alpha - 1, -alpha, ply + 1)
+                # A reduced move that beats alpha is verified at full depth
+                if reduction and score > alpha:
+                    score = -self._negamax(board, depth - 1, -alpha - 1, -alpha, ply + 1)
                 # Re-search if it beats alpha
                 if score > alpha and score < beta:
                     score = -self._negamax(board, depth - 1, -beta, -alpha, ply + 1)
 
-            board.pop()
+            self._unmake_move(board)
+            if is_quiet:
+                quiets_searched += 1
             moves_searched += 1
 
             if score > best_score:
                 best_score = score
                 best_move = move
 
+            if pv_node and score > alpha:
+                self._update_pv(ply, move)
             alpha = max(alpha, score)
 
             # Alpha-beta cutoff
             if alpha >= beta:
                 self.beta_cutoffs += 1
-                # Store killer move
-                if len(self.killer_moves[ply]) < 2:
-                    if move not in self.killer_moves[ply]:
-                        self.killer_moves[ply].append(move)
-
-                # Update history table
-                move_key = (move.from_square, move.to_square)
-                self.history_table[move_key] = self.history_table.get(move_key, 0) + depth * depth
+                if is_quiet:
+                    # Store killer move, newest first
+                    killers = self.killer_moves[ply]
+                    if move not in killers:
+                        killers.insert(0, move)
+                        del killers[2:]
+
+                    # Update history table
+                    move_key = (move.from_square, move.to_square)
+                    self.history_table[move_key] = self.history_table.get(move_key, 0) + depth * depth
                 break
 
+        if not moves_searched:
+            return -9999 + ply if in_check else 0
+
         # Store in transposition table
-        if len(self.transposition_table) < 200000:
-            self.transposition_table[pos_hash] = {
-                'score': best_score,
-                'depth': depth,
-                'best_move': best_move
-            }
+        if best_score <= alpha_orig:
+            bound = UPPER
+        elif best_score >= beta:
+            bound = LOWER
+        else:
+            bound = EXACT
+        self.transposition_table.store(pos_hash, depth, best_score, bound, best_move, ply)
 
         return best_score
 
-    def _quiescence_search_enhanced(self, board: chess.Board, alpha: float, beta: float, depth: int) -> float:
-        """Enhanced quiescence search with better move selection"""
+    def _quiescence_search_enhanced(self, board: chess.Board, alpha: float, beta: float,
+                                    qply: int = 0, ply: int = 0) -> float:
+        """Search captures and promotions until the position is quiet
+
+        Quiet checking moves are only tried on the first quiescence ply. When
+        in check there is no stand pat and every evasion is searched.
+        """
+        self.nodes_searched += 1
+        self.qnodes_searched += 1
+        if self.nodes_searched >= self._next_check:
+            self._check_limits()
+
+        if board.is_check():
+            moves = self._qsearch_evasions(board)
+            if not moves:
+                return -9999 + ply
+            for move in moves:
+                self._make_move(board, move)
+                score = -self._quiescence_search_enhanced(board, -beta, -alpha, qply + 1, ply + 1)
+                self._unmake_move(board)
+                if score >= beta:
+                    return beta
+                if score > alpha:
+                    alpha = score
+            return alpha
+
         stand_pat = self._evaluate_position_enhanced(board)
 
         if stand_pat >= beta:
@@ -382,27 +902,25 @@ class FastChessEngine:
         if stand_pat > alpha:
             alpha = stand_pat
 
-        if depth <= 0:
+        if qply >= self.QSEARCH_MAX_PLY:
             return stand_pat
 
-        # Get tactical moves (captures, checks, promotions)
-        tactical_moves = []
-        for move in board.legal_moves:
-            if (board.is_capture(move) or board.gives_check(move) or
-                move.promotion):
-                tactical_moves.append(move)
-
-        # Order tactical moves by value
-        tactical_moves.sort(key=lambda m: self._tactical_move_value(board, m), reverse=True)
+        # Delta pruning: not even winning a queen would raise alpha (unless a pawn can promote)
+        promoting = board.pawns & board.occupied_co[board.turn] & (chess.BB_RANK_7 if board.turn else chess.BB_RANK_2)
+        if not promoting and stand_pat + self.piece_values[chess.QUEEN] + self.DELTA_MARGIN < alpha:
+            return alpha
 
-        for move in tactical_moves:
-            # Skip bad captures
-            if board.is_capture(move) and self._see_capture_enhanced(board, move) < -50:
+        for gain, move in self._qsearch_moves(board, qply == 0):
+            # Delta pruning per move: the capture can't bring the score near alpha
+            if gain and stand_pat + gain + self.DELTA_MARGIN <= alpha:
+                continue
+            # Skip moves that lose material in the exchange on the target square
+            if not self.see_ge(board, move, self.QSEARCH_SEE_THRESHOLD):
                 continue
 
-            board.push(move)
-            score = -self._quiescence_search_enhanced(board, -beta, -alpha, depth - 1)
-            board.pop()
+            self._make_move(board, move)
+            score = -self._quiescence_search_enhanced(board, -beta, -alpha, qply + 1, ply + 1)
+            self._unmake_move(board)
 
             if score >= beta:
                 return beta
@@ -412,14 +930,107 @@ class FastChessEngine:
 
         return alpha
 
+    def _qsearch_moves(self, board: chess.Board, with_checks: bool) -> List[Tuple[int, chess.Move]]:
+        """Captures and queen promotions as (material gain, move), best MVV-LVA first,
+        followed by quiet direct checks with a gain of 0 if `with_checks`"""
+        piece_values = self.piece_values
+        scored = []
+        for move in board.generate_legal_captures():
+            if move.promotion and move.promotion != chess.QUEEN:
+                continue
+            victim = board.piece_type_at(move.to_square) or chess.PAWN  # None for en passant
+            gain = piece_values[victim]
+            if move.promotion:
+                gain += piece_values[chess.QUEEN] - piece_values[chess.PAWN]
+            order = gain * 10 - piece_values[board.piece_type_at(move.from_square)]
+            scored.append((order, gain, move))
+
+        empty = ~board.occupied & chess.BB_ALL
+        for move in board.generate_legal_moves(board.pawns, empty & chess.BB_BACKRANKS):
+            if move.promotion == chess.QUEEN:
+                gain = piece_values[chess.QUEEN] - piece_values[chess.PAWN]
+                scored.append((gain * 10, gain, move))
+
+        scored.sort(key=lambda item: item[0], reverse=True)
+        moves = [(gain, move) for _, gain, move in scored]
+
+        if with_checks:
+            check_squares = self._check_squares(board)
+            for move in board.generate_legal_moves(chess.BB_ALL, empty):
+                piece_type = board.piece_type_at(move.from_square)
+                if not move.promotion and check_squares[piece_type] & chess.BB_SQUARES[move.to_square]:
+                    moves.append((0, move))
+
+        return moves
+
+    def _qsearch_evasions(self, board: chess.Board) -> List[chess.Move]:
+        """All legal moves out of check, captures first"""
+        piece_values = self.piece_values
+        evasions = []
+        for move in board.generate_legal_moves():
+            victim = board.piece_type_at(move.to_square)
+            score = piece_values[victim] * 10 - piece_values[board.piece_type_at(move.from_square)] if victim else -10000
+            evasions.append((score, move))
+        evasions.sort(key=lambda item: item[0], reverse=True)
+        return [move for _, move in evasions]
+
+    def _check_squares(self, board: chess.Board) -> List[int]:
+        """Squares from which each piece type of the side to move would attack the enemy king"""
+        king = board.king(not board.turn)
+        if king is None:
+            return [0] * 7
+        occupied = board.occupied
+        diagonal = self._diagonal_attacks(king, occupied)
+        orthogonal = self._orthogonal_attacks(king, occupied)
+        return [0,
+                chess.BB_PAWN_ATTACKS[not board.turn][king],
+                chess.BB_KNIGHT_ATTACKS[king],
+                diagonal,
+                orthogonal,
+                diagonal | orthogonal,
+                0]
+
     def _evaluate_position_enhanced(self, board: chess.Board) -> float:
-        """Comprehensive position evaluation with game phase detection"""
-        if board.is_checkmate():
-            return -9999 if board.turn else 9999
+        """Comprehensive position evaluation with game phase detection
 
-        if board.is_stalemate() or board.is_insufficient_material():
+        Only called for positions that are not in check; the search scores
+        mates and stalemates itself.
+        """
+        if not (board.pawns | board.rooks | board.queens) and board.is_insufficient_material():
             return 0
 
+        if self._nnue is not None:
+            return self._nnue.evaluate(board.turn)
+
+        # Material, PST and game phase come from the incremental state
+        total_material, piece_count, score, king_mg, king_eg = self._eval
+
+        # Game phase detection
+        is_endgame = total_material < 1800 or piece_count < 12
+        score += king_eg if is_endgame else king_mg
+
+        # Enhanced mobility evaluation
+        score += self._evaluate_mobility_enhanced(board)
+
+        # Pawn structure evaluation
+        score += self._evaluate_pawn_structure_enhanced(board)
+
+        # King safety evaluation
+        score += self._evaluate_king_safety_enhanced(board, is_endgame)
+
+        # Bishop pair bonus
+        score += self._evaluate_bishop_pair(board)
+
+        # Rook on open files
+        score += self._evaluate_rook_placement(board)
+
+        return score if board.turn else -score
+
+    def _evaluate_material_pst_full(self, board: chess.Board) -> Tuple[float, bool]:
+        """Material + PST score and endgame flag computed from scratch
+
+        Reference for the incremental state kept by _make_move/_unmake_move.
+        """
         score = 0
         total_material = 0
 
@@ -447,22 +1058,84 @@ class FastChessEngine:
                 else:
                     score -= total_value
 
-        # Enhanced mobility evaluation
-        score += self._evaluate_mobility_enhanced(board)
+        return score, is_endgame
 
-        # Pawn structure evaluation
-        score += self._evaluate_pawn_structure_enhanced(board)
+    def _init_eval_tables(self):
+        """Precompute signed value + PST per [color][piece_type][square]"""
+        pst_tables = {
+            chess.PAWN: self.pst_pawn, chess.KNIGHT: self.pst_knight, chess.BISHOP: self.pst_bishop,
+            chess.ROOK: self.pst_rook, chess.QUEEN: self.pst_queen,
+        }
+        self._psq = [[None] * 7, [None] * 7]
+        self._king_mg = [None, None]
+        self._king_eg = [None, None]
+        for color in chess.COLORS:
+            sign = 1 if color else -1
+            for piece_type, table in pst_tables.items():
+                self._psq[color][piece_type] = [
+                    sign * (self.piece_values[piece_type] + table[square if color else 63 - square])
+                    for square in chess.SQUARES
+                ]
+            self._king_mg[color] = [sign * self.pst_king_middlegame[square if color else 63 - square] for square in chess.SQUARES]
+            self._king_eg[color] = [sign * self.pst_king_endgame[square if color else 63 - square] for square in chess.SQUARES]
+
+    def _eval_state(self, board: chess.Board) -> Tuple[int, int, int, int, int]:
+        """Build the incremental evaluation state of `board` from scratch"""
+        material = piece_count = psq = 0
+        for color in chess.COLORS:
+            for piece_type in (chess.PAWN, chess.KNIGHT, chess.BISHOP, chess.ROOK, chess.QUEEN):
+                table = self._psq[color][piece_type]
+                for square in board.pieces(piece_type, color):
+                    material += self.piece_values[piece_type]
+                    piece_count += 1
+                    psq += table[square]
+
+        king_mg = king_eg = 0
+        for color in chess.COLORS:
+            king_square = board.king(color)
+            if king_square is not None:
+                king_mg += self._king_mg[color][king_square]
+                king_eg += self._king_eg[color][king_square]
 
-        # King safety evaluation
-        score += self._evaluate_king_safety_enhanced(board, is_endgame)
+        return material, piece_count, psq, king_mg, king_eg
 
-        # Bishop pair bonus
-        score += self._evaluate_bishop_pair(board)
+    def _eval_after_move(self, board: chess.Board, move: chess.Move) -> Tuple[int, int, int, int, int]:
+        """Incremental evaluation state after `move` (board before the move)"""
+        material, piece_count, psq, king_mg, king_eg = self._eval
+        if not move:
+            return self._eval
 
-        # Rook on open files
-        score += self._evaluate_rook_placement(board)
+        color = board.turn
+        own = self._psq[color]
+        from_square, to_square = move.from_square, move.to_square
+        piece_type = board.piece_type_at(from_square)
 
-        return score if board.turn else -score
+        if piece_type == chess.KING:
+            if board.is_castling(move):
+                king_to, rook_from, rook_to = chess_zobrist.castling_squares(board, move)
+                return (material, piece_count, psq + own[chess.ROOK][rook_to] - own[chess.ROOK][rook_from],
+                        king_mg + self._king_mg[color][king_to] - self._king_mg[color][from_square],
+                        king_eg + self._king_eg[color][king_to] - self._king_eg[color][from_square])
+            king_mg += self._king_mg[color][to_square] - self._king_mg[color][from_square]
+            king_eg += self._king_eg[color][to_square] - self._king_eg[color][from_square]
+        elif move.promotion:
+            psq += own[move.promotion][to_square] - own[chess.PAWN][from_square]
+            material += self.piece_values[move.promotion] - self.piece_values[chess.PAWN]
+        else:
+            psq += own[piece_type][to_square] - own[piece_type][from_square]
+
+        captured_type = board.piece_type_at(to_square)
+        if captured_type:
+            psq -= self._psq[not color][captured_type][to_square]
+            material -= self.piece_values[captured_type]
+            piece_count -= 1
+        elif piece_type == chess.PAWN and to_square == board.ep_square:
+            captured_square = chess.square(chess.square_file(to_square), chess.square_rank(from_square))
+            psq -= self._psq[not color][chess.PAWN][captured_square]
+            material -= self.piece_values[chess.PAWN]
+            piece_count -= 1
+
+        return material, piece_count, psq, king_mg, king_eg
 
     def _get_pst_bonus(self, piece, square, is_endgame):
         """Get piece-square table bonus with game phase consideration"""
@@ -484,135 +1157,62 @@ class FastChessEngine:
         return 0
 
     def _evaluate_mobility_enhanced(self, board: chess.Board) -> float:
-        """Enhanced mobility evaluation with piece-specific weights"""
-        current_mobility = 0
-
-        # Weight different piece types differently
-        for move in board.legal_moves:
-            piece = board.piece_at(move.from_square)
-            if piece:
-                if piece.piece_type == chess.QUEEN:
-                    current_mobility += 4
-                elif piece.piece_type == chess.ROOK:
-                    current_mobility += 2
-                elif piece.piece_type in [chess.BISHOP, chess.KNIGHT]:
-                    current_mobility += 1
-                else:
-                    current_mobility += 0.5
-
-        # Opponent mobility
-        board.turn = not board.turn
-        opponent_mobility = 0
-        for move in board.legal_moves:
-            piece = board.piece_at(move.from_square)
-            if piece:
-                if piece.piece_type == chess.QUEEN:
-                    opponent_mobility += 4
-                elif piece.piece_type == chess.ROOK:
-                    opponent_mobility += 2
-                elif piece.piece_type in [chess.BISHOP, chess.KNIGHT]:
-                    opponent_mobility += 1
-                else:
-                    opponent_mobility += 0.5
-
-        board.turn = not board.turn
-
-        mobility_diff = current_mobility - opponent_mobility
+        """Mobility from pseudo-legal attack bitboards with piece-specific weights"""
+        mobility_diff = self._side_mobility(board, chess.WHITE) - self._side_mobility(board, chess.BLACK)
         return mobility_diff * 2
 
-    def _evaluate_pawn_structure_enhanced(self, board: chess.Board) -> float:
-        """FIXED: Comprehensive pawn structure evaluation"""
-        score = 0
-
-        # Get piece sets as bitboards
-        white_pawns = board.pieces(chess.PAWN, chess.WHITE)
-        black_pawns = board.pieces(chess.PAWN, chess.BLACK)
-
-        # Convert bitboards to lists of squares for safe iteration
-        white_pawn_squares = list(white_pawns)
-        black_pawn_squares = list(black_pawns)
-
-        # Doubled pawns
-        for file in range(8):
-            file_mask = chess.BB_FILES[file]
-
-            # Count pawns on each file using proper bitboard operations
-            white_file_pawns = bin(white_pawns & file_mask).count('1')
-            black_file_pawns = bin(black_pawns & file_mask).count('1')
-
-            if white_file_pawns > 1:
-                score -= (white_file_pawns - 1) * 30
-            if black_file_pawns > 1:
-                score += (black_file_pawns - 1) * 30
-
-        # Isolated pawns - check each pawn individually
-        for square in white_pawn_squares:
-            file = chess.square_file(square)
-            has_support = False
-
-            # Check adjacent files for supporting pawns
-            if file > 0:
-                if white_pawns & chess.BB_FILES[file - 1]:
-                    has_support = True
-            if file < 7:
-                if white_pawns & chess.BB_FILES[file + 1]:
-                    has_support = True
-
-            if not has_support:
-                score -= 25
-
-        for square in black_pawn_squares:
-            file = chess.square_file(square)
-            has_support = False
-
-            # Check adjacent files for supporting pawns
-            if file > 0:
-                if black_pawns & chess.BB_FILES[file - 1]:
-                    has_support = True
-            if file < 7:
-                if black_pawns & chess.BB_FILES[file + 1]:
-                    has_support = True
-
-            if not has_support:
-                score += 25
-
-        # Passed pawns - simplified but correct implementation
-        for square in white_pawn_squares:
-            rank = chess.square_rank(square)
-            file = chess.square_file(square)
-
-            # Check if pawn is passed (no enemy pawns blocking)
-            is_passed = True
-            for enemy_square in black_pawn_squares:
-                enemy_file = chess.square_file(enemy_square)
-                enemy_rank = chess.square_rank(enemy_square)
-
-                # Check if enemy pawn can block or capture
-                if abs(enemy_file - file) <= 1 and enemy_rank > rank:
-                    is_passed = False
-                    break
-
-            if is_passed:
-                score += 20 + (rank - 1) * 10  # More valuable as it advances
-
-        # Similar for black passed pawns
-        for square in black_pawn_squares:
-            rank = chess.square_rank(square)
-            file = chess.square_file(square)
+    def _side_mobility(self, board: chess.Board, color: bool) -> float:
+        """Weighted count of squares reachable by `color`, ignoring pins and checks"""
+        occupied = board.occupied
+        own = board.occupied_co[color]
+        targets = ~own & chess.BB_ALL
+        mobility = 0
+
+        for square in chess.scan_forward(board.knights & own):
+            mobility += chess.popcount(chess.BB_KNIGHT_ATTACKS[square] & targets)
+
+        for square in chess.scan_forward(board.bishops & own):
+            mobility += chess.popcount(self._diagonal_attacks(square, occupied) & targets)
+
+        for square in chess.scan_forward(board.rooks & own):
+            mobility += 2 * chess.popcount(self._orthogonal_attacks(square, occupied) & targets)
+
+        for square in chess.scan_forward(board.queens & own):
+            attacks = self._diagonal_attacks(square, occupied) | self._orthogonal_attacks(square, occupied)
+            mobility += 4 * chess.popcount(attacks & targets)
+
+        # Pawns and the king count half
+        king_square = board.king(color)
+        simple_moves = chess.popcount(chess.BB_KING_ATTACKS[king_square] & targets) if king_square is not None else 0
+
+        pawns = board.pawns & own
+        empty = ~occupied & chess.BB_ALL
+        enemy = board.occupied_co[not color]
+        if color:
+            single = chess.shift_up(pawns) & empty
+            double = chess.shift_up(single & chess.BB_RANK_3) & empty
+            captures = (chess.shift_up_left(pawns) & enemy, chess.shift_up_right(pawns) & enemy)
+        else:
+            single = chess.shift_down(pawns) & empty
+            double = chess.shift_down(single & chess.BB_RANK_6) & empty
+            captures = (chess.shift_down_left(pawns) & enemy, chess.shift_down_right(pawns) & enemy)
+        simple_moves += (chess.popcount(single) + chess.popcount(double) +
+                         chess.popcount(captures[0]) + chess.popcount(captures[1]))
 
-            is_passed = True
-            for enemy_square in white_pawn_squares:
-                enemy_file = chess.square_file(enemy_square)
-                enemy_rank = chess.square_rank(enemy_square)
+        return mobility + simple_moves * 0.5
 
-                if abs(enemy_file - file) <= 1 and enemy_rank < rank:
-                    is_passed = False
-                    break
+    @staticmethod
+    def _diagonal_attacks(square: int, occupied: int) -> int:
+        return chess.BB_DIAG_ATTACKS[square][chess.BB_DIAG_MASKS[square] & occupied]
 
-            if is_passed:
-                score -= 20 + (6 - rank) * 10
+    @staticmethod
+    def _orthogonal_attacks(square: int, occupied: int) -> int:
+        return (chess.BB_RANK_ATTACKS[square][chess.BB_RANK_MASKS[square] & occupied] |
+                chess.BB_FILE_ATTACKS[square][chess.BB_FILE_MASKS[square] & occupied])
 
-        return score
+    def _evaluate_pawn_structure_enhanced(self, board: chess.Board) -> float:
+        """Pawn structure score, usually a pawn hash table lookup"""
+        return self.pawn_table.entry(self._pawn_key, board)[1]
 
     def _evaluate_king_safety_enhanced(self, board: chess.Board, is_endgame: bool) -> float:
         """Enhanced king safety evaluation"""
@@ -624,8 +1224,9 @@ class FastChessEngine:
         for color in [chess.WHITE, chess.BLACK]:
             king_square = board.king(color)
             if king_square is not None:
-                # Pawn shield evaluation
-                shield_score = self._evaluate_pawn_shield(board, king_square, color)
+                # Pawn shield evaluation, cached with the pawn structure
+                shield_score = self.pawn_table.shield(self.pawn_table.entry(self._pawn_key, board),
+                                                      board, king_square, color)
 
                 # King exposure penalty
                 attackers = len(board.attackers(not color, king_square))
@@ -643,30 +1244,6 @@ class FastChessEngine:
 
         return score
 
-    def _evaluate_pawn_shield(self, board: chess.Board, king_square: int, color: bool) -> int:
-        """Evaluate pawn shield in front of king"""
-        shield_score = 0
-        king_file = chess.square_file(king_square)
-        king_rank = chess.square_rank(king_square)
-
-        # Check pawns in front of king
-        for file_offset in [-1, 0, 1]:
-            file = king_file + file_offset
-            if 0 <= file <= 7:
-                for rank_offset in [1, 2]:
-                    if color:  # White king
-                        rank = king_rank + rank_offset
-                    else:  # Black king
-                        rank = king_rank - rank_offset
-
-                    if 0 <= rank <= 7:
-                        square = chess.square(file, rank)
-                        piece = board.piece_at(square)
-                        if piece and piece.piece_type == chess.PAWN and piece.color == color:
-                            shield_score += 10 if rank_offset == 1 else 5
-
-        return shield_score
-
     def _count_king_zone_attacks(self, board: chess.Board, king_square: int, attacking_color: bool) -> int:
         """Count attacks in king zone"""
         attacks = 0
@@ -722,153 +1299,298 @@ class FastChessEngine:
 
         return score
 
-    def _order_moves_advanced(self, board: chess.Board, moves: List[chess.Move]) -> List[chess.Move]:
-        """Advanced move ordering with multiple heuristics"""
-        def move_score(move):
-            score = 0
-
-            # Hash move gets highest priority
-            pos_hash = self._position_hash(board)
-            if pos_hash in self.transposition_table:
-                tt_move = self.transposition_table[pos_hash].get('best_move')
-                if tt_move == move:
-                    return 10000
-
-            # Captures with enhanced SEE
-            if board.is_capture(move):
-                see_score = self._see_capture_enhanced(board, move)
-                if see_score >= 0:
-                    captured_piece = board.piece_at(move.to_square)
-                    attacking_piece = board.piece_at(move.from_square)
-                    if captured_piece and attacking_piece:
-                        mvv_lva = (self.piece_values[captured_piece.piece_type] * 10 -
-                                 self.piece_values[attacking_piece.piece_type])
-                        score += 8000 + mvv_lva + see_score
-                else:
-                    score += 2000 + see_score  # Bad captures still considered
-
-            # Promotions
-            if move.promotion:
-                score += 7000 + self.piece_values.get(move.promotion, 0)
-
-            # Checks
-            board.push(move)
-            if board.is_check():
-                score += 5000
-            board.pop()
-
-            # Killer moves
-            for ply_killers in self.killer_moves:
-                if move in ply_killers:
-                    score += 4000 - ply_killers.index(move) * 100
-                    break
-
-            # Castling
+    def _staged_moves(self, board: chess.Board, ply: int, tt_move: Optional[chess.Move] = None):
+        """Yield legal moves lazily in stages
+
+        TT move, good captures and promotions (MVV-LVA), killers of this ply,
+        quiet moves by history, then losing captures (by SEE). Each stage is
+        only generated and scored once the previous one is exhausted, so a
+        cutoff on an early move skips the rest of the work.
+        """
+        # 1. Hash move
+        if tt_move and board.is_legal(tt_move):
+            yield tt_move
+        else:
+            tt_move = None
+
+        # 2. Captures and promotions
+        piece_values = self.piece_values
+        enemy = board.occupied_co[not board.turn]
+        good_captures = []
+        bad_captures = []
+        ep_mask = chess.BB_SQUARES[board.ep_square] if board.ep_square is not None else 0
+        for move in board.generate_legal_moves(chess.BB_ALL, enemy | ep_mask | chess.BB_BACKRANKS):
+            if move == tt_move:
+                continue
+            victim = board.piece_type_at(move.to_square)
+            if victim is None and not move.promotion:
+                if not board.is_en_passant(move):
+                    continue  # Quiet move to the back rank
+                victim = chess.PAWN
+            attacker = board.piece_type_at(move.from_square)
+            score = piece_values.get(move.promotion, 0) if move.promotion else 0
+            if victim:
+                score += piece_values[victim] * 10 - piece_values[attacker]
+                # Only captures of a cheaper piece can lose material
+                if piece_values[victim] < piece_values[attacker] and not self.see_ge(board, move, 0):
+                    bad_captures.append((self.see(board, move), move))
+                    continue
+            good_captures.append((score, move))
+
+        good_captures.sort(key=lambda item: item[0], reverse=True)
+        for _, move in good_captures:
+            yield move
+
+        # 3. Killer moves of this ply
+        killers = self.killer_moves[ply] if ply < len(self.killer_moves) else []
+        for move in killers:
+            if move != tt_move and not board.is_capture(move) and not move.promotion and board.is_legal(move):
+                yield move
+
+        # 4. Quiet moves ordered by history
+        history = self.history_table
+        quiet_moves = []
+        for move in board.generate_legal_moves(chess.BB_ALL, ~enemy & chess.BB_ALL):
+            if move.promotion or move == tt_move or move in killers or board.is_en_passant(move):
+                continue
+            score = history.get((move.from_square, move.to_square), 0) // 10
             if board.is_castling(move):
                 score += 1000
+            elif move.from_square in (chess.B1, chess.G1, chess.B8, chess.G8) and \
+                    board.piece_type_at(move.from_square) in (chess.KNIGHT, chess.BISHOP):
+                score += 50  # Piece development (early game)
+            quiet_moves.append((score, move))
+
+        quiet_moves.sort(key=lambda item: item[0], reverse=True)
+        for _, move in quiet_moves:
+            yield move
+
+        # 5. Losing captures, least bad first
+        bad_captures.sort(key=lambda item: item[0], reverse=True)
+        for _, move in bad_captures:
+            yield move
+
+    def see(self, board: chess.Board, move: chess.Move) -> int:
+        """Static Exchange Evaluation: material won by the capture sequence started by `move`"""
+        return chess_see.see(board, move, self.piece_values)
+
+    def see_ge(self, board: chess.Board, move: chess.Move, threshold: int = 0) -> bool:
+        """True if the exchange started by `move` wins at least `threshold` centipawns"""
+        return chess_see.see_ge(board, move, threshold, self.piece_values)
+
+    def _update_pv(self, ply: int, move: chess.Move):
+        """Make `move` followed by the line of the next ply the PV of `ply`"""
+        row, child = self._pv_table[ply], self._pv_table[ply + 1]
+        length = max(self._pv_length[ply + 1], ply + 1)
+        row[ply] = move
+        row[ply + 1:length] = child[ply + 1:length]
+        self._pv_length[ply] = length
+
+    def _set_search_root(self, board: chess.Board):
+        """Compute the incremental search state of `board` from scratch"""
+        self._key = chess_zobrist.full_key(board)
+        self._pawn_key = chess_zobrist.pawn_key(board)
+        self._eval = self._eval_state(board)
+        self._state_stack = []
+        if self._nnue is not None:
+            self._nnue.reset(board)
+
+    def _make_move(self, board: chess_position.SearchBoard, move: chess.Move):
+        """Make a move and update the incremental search state"""
+        self._state_stack.append((self._key, self._pawn_key, self._eval))
+        self._eval = self._eval_after_move(board, move)
+        self._pawn_key ^= chess_zobrist.pawn_delta(board, move)
+        if self._nnue is not None:
+            refresh = self._nnue.push(board, move)
+            self._key = chess_zobrist.make(board, move, self._key)
+            if refresh is not None:
+                self._nnue.refresh(board, refresh)
+        else:
+            self._key = chess_zobrist.make(board, move, self._key)
+
+    def _unmake_move(self, board: chess_position.SearchBoard):
+        """Unmake the last move and restore the incremental search state"""
+        board.unmake()
+        self._key, self._pawn_key, self._eval = self._state_stack.pop()
+        if self._nnue is not None:
+            self._nnue.pop()
+
+    def _is_repetition(self, board: chess_position.SearchBoard) -> bool:
+        """True if the position already occurred since the search root
+
+        Only positions with the same side to move, after the last capture or
+        pawn move and after the last null move can repeat, so at most a few
+        keys of the state stack are compared.
+        """
+        stack = self._state_stack
+        limit = min(board.halfmove_clock, board.plies_from_null, len(stack))
+        key = self._key
+        for distance in range(4, limit + 1, 2):
+            if stack[-distance][0] == key:
+                return True
+        return False
+
+
+def worker_process_context():
+    """multiprocessing context of the lazy SMP and batch worker processes
+
+    Fork where available: spawn and forkserver import the main module
+    again in every worker, which for the server means its Flask app and
+    database connection. A fork copies whatever locks other threads hold
+    at that moment, so the server starts both pools (LazySMP.start,
+    BatchAnalyzer.start) before it serves requests; later forks only
+    replace a worker that died.
+    """
+    method = "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+    return multiprocessing.get_context(method)
 
-            # History heuristic
-            move_key = (move.from_square, move.to_square)
-            score += self.history_table.get(move_key, 0) // 10
-
-            # Piece development (early game)
-            piece = board.piece_at(move.from_square)
-            if piece and piece.piece_type in [chess.KNIGHT, chess.BISHOP]:
-                if move.from_square in [chess.B1, chess.G1, chess.B8, chess.G8]:  # Starting squares
-                    score += 50
-
-            return score
-
-        return sorted(moves, key=move_score, reverse=True)
-
-    def _tactical_move_value(self, board: chess.Board, move: chess.Move) -> int:
-        """Enhanced tactical move evaluation"""
-        value = 0
 
-        if board.is_capture(move):
-            captured = board.piece_at(move.to_square)
-            value += self.piece_values[captured.piece_type] if captured else 0
+class EnginePool:
+    """Pool of long-lived engines so searches start with a warm TT
 
-        if move.promotion:
-            value += self.piece_values.get(move.promotion, 0)
+    Idle engines are handed out most-recently-used first, so consecutive
+    requests (e.g. stepping through a game) tend to land on the engine that
+    just searched the neighbouring position.
+    """
 
-        board.push(move)
-        if board.is_check():
-            value += 100
-        if board.is_checkmate():
-            value += 10000
-        board.pop()
+    def __init__(self, size: Optional[int] = None, tt_size_mb: int = 16):
+        self.size = size or int(os.environ.get("ENGINE_POOL_SIZE", os.cpu_count() or 2))
+        self.tt_size_mb = tt_size_mb
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
 
-        return value
+        # Warm vs cold search metrics, keyed by (kind, depth reached) so
+        # that the speedup compares searches of the same depth
+        self._metrics = {}
 
-    def _see_capture_enhanced(self, board: chess.Board, move: chess.Move) -> int:
-        """Enhanced Static Exchange Evaluation"""
-        if not board.is_capture(move):
-            return 0
+    def _acquire(self, timeout: Optional[float]) -> FastChessEngine:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                return FastChessEngine(self.tt_size_mb)
+
+        return self._idle.get(timeout=timeout)
+
+    @contextmanager
+    def checkout(self, timeout: Optional[float] = None, stop_event: Optional[threading.Event] = None):
+        """Borrow an engine for the duration of one request
+
+        Setting `stop_event` stops the engine's search at the next limit check.
+        """
+        with self._lend(self._acquire(timeout), stop_event) as engine:
+            yield engine
+
+    @contextmanager
+    def try_checkout_idle(self, stop_event: Optional[threading.Event] = None):
+        """checkout() of an engine that is idle right now, raises queue.Empty if there is none
+
+        Never creates an engine or waits, for background work that must not
+        take pool capacity from requests.
+        """
+        with self._lend(self._idle.get_nowait(), stop_event) as engine:
+            yield engine
+
+    @contextmanager
+    def _lend(self, engine: FastChessEngine, stop_event: Optional[threading.Event]):
+        engine.stop_event = stop_event
+        try:
+            yield engine
+        finally:
+            engine.stop_event = None
+            self._record(engine.last_search_info)
+            self._idle.put(engine)
+
+    def _record(self, search_info: Optional[Dict]):
+        if not search_info:
+            return
+        key = ("warm" if search_info.get("warmStart") else "cold", search_info["depth"])
+        with self._lock:
+            bucket = self._metrics.setdefault(key, [0, 0, 0])
+            bucket[0] += 1
+            bucket[1] += search_info["totalTime"]
+            bucket[2] += search_info["totalNodes"]
+
+    def stats(self) -> Dict:
+        """Pool size and average cost of cold vs warm searches per depth"""
+        with self._lock:
+            by_depth = {}
+            for (kind, depth), (searches, time_ms, nodes) in sorted(self._metrics.items(), key=lambda item: item[0][1]):
+                by_depth.setdefault(depth, {})[kind] = {
+                    "searches": searches,
+                    "avgTimeMs": round(time_ms / searches, 1),
+                    "avgNodes": round(nodes / searches),
+                }
 
-        captured = board.piece_at(move.to_square)
-        attacker = board.piece_at(move.from_square)
+            # Expected cold time for the warm searches divided by their actual time
+            expected_ms = actual_ms = 0
+            for depth, kinds in by_depth.items():
+                if "cold" in kinds and "warm" in kinds:
+                    expected_ms += kinds["cold"]["avgTimeMs"] * kinds["warm"]["searches"]
+                    actual_ms += kinds["warm"]["avgTimeMs"] * kinds["warm"]["searches"]
 
-        if not captured or not attacker:
-            return 0
+            return {
+                "size": self.size,
+                "created": self._created,
+                "idle": self._idle.qsize(),
+                "ttSizeMb": self.tt_size_mb,
+                "byDepth": by_depth,
+                "warmSpeedup": round(expected_ms / actual_ms, 2) if actual_ms else None,
+            }
 
-        # Simple SEE: material gained - material potentially lost
-        gain = self.piece_values[captured.piece_type]
-
-        # Check if the capturing piece is defended
-        board.push(move)
-        defenders = board.attackers(not attacker.color, move.to_square)
-        if defenders:
-            # Find least valuable defender
-            min_defender_value = min(
-                self.piece_values[board.piece_at(sq).piece_type]
-                for sq in defenders if board.piece_at(sq)
-            )
-
-            gain -= self.piece_values[attacker.piece_type]
-            gain += min_defender_value  # Assume we can recapture
-
-        board.pop()
-        return gain
-
-    def _extract_pv_enhanced(self, board: chess.Board, first_move: chess.Move, depth: int) -> List[str]:
-        """Enhanced principal variation extraction"""
-        pv = [str(first_move)]
-        current_board = board.copy()
-
-        for _ in range(min(depth, 6)):  # Slightly longer PV
-            pos_hash = self._position_hash(current_board)
-            if pos_hash in self.transposition_table:
-                tt_entry = self.transposition_table[pos_hash]
-                best_move = tt_entry.get('best_move')
-                if best_move and best_move in current_board.legal_moves:
-                    pv.append(str(best_move))
-                    current_board.push(best_move)
-                else:
-                    break
-            else:
-                # If no TT entry, try to find a reasonable move
-                legal_moves = list(current_board.legal_moves)
-                if legal_moves:
-                    # Pick the first capture or check, otherwise first move
-                    next_move = None
-                    for move in legal_moves:
-                        if current_board.is_capture(move) or current_board.gives_check(move):
-                            next_move = move
-                            break
-                    if not next_move:
-                        next_move = legal_moves[0]
-
-                    pv.append(str(next_move))
-                    current_board.push(next_move)
-                else:
-                    break
 
-        return pv
+class AnalysisRegistry:
+    """Running analyses by ID, so another request can cancel them"""
 
-    def _position_hash(self, board: chess.Board) -> str:
-        """Optimized position hashing"""
-        return hashlib.md5(board.fen()[:60].encode()).hexdigest()[:16]
+    def __init__(self):
+        self._running: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+        self.cancelled = 0
+
+    def start(self, analysis_id: Optional[str] = None) -> Tuple[str, threading.Event]:
+        """Register an analysis and return (analysis_id, stop_event), raises KeyError if the ID is in use"""
+        analysis_id = str(analysis_id) if analysis_id else uuid.uuid4().hex
+        stop_event = threading.Event()
+        with self._lock:
+            if analysis_id in self._running:
+                raise KeyError(analysis_id)
+            self._running[analysis_id] = stop_event
+        return analysis_id, stop_event
+
+    def finish(self, analysis_id: str, stop_event: Optional[threading.Event] = None):
+        """Unregister an analysis; with `stop_event` only if the ID still belongs to that run
+
+        Safe to call more than once, and a late call can't unregister a
+        newer analysis that reused the ID.
+        """
+        with self._lock:
+            if stop_event is None or self._running.get(analysis_id) is stop_event:
+                self._running.pop(analysis_id, None)
+
+    def cancel(self, analysis_id: str) -> bool:
+        """Stop a running analysis, False if there is none with this ID"""
+        with self._lock:
+            stop_event = self._running.get(analysis_id)
+            if stop_event is None:
+                return False
+            if not stop_event.is_set():
+                self.cancelled += 1
+            stop_event.set()
+            return True
+
+    def running(self) -> List[str]:
+        with self._lock:
+            return list(self._running)
+
+
+# Shared by the Flask server and analyze_chess_position
+engine_pool = EnginePool()
+analysis_registry = AnalysisRegistry()
 
 
 # Main API function
@@ -883,51 +1605,50 @@ def analyze_chess_position(fen: str, depth: int = 6) -> str:
     Returns:
         JSON string with evaluation and top 3 best moves
     """
-    engine = FastChessEngine()
-    result = engine.analyze_position(fen, depth)
+    with engine_pool.checkout() as engine:
+        result = engine.analyze_position(fen, depth)
     return json.dumps(result, indent=2)
 
 
+# Positions used by the performance test and chess_benchmark.py
+TEST_POSITIONS = [
+    ("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1", 8),
+    ("r1bqkb1r/pppp1ppp/2n2n2/4p3/2B1P3/3P1N2/PPP2PPP/RNBQK2R w KQkq - 0 4", 10),
+    ("rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8", 12),
+    ("8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", 10),  # Endgame position
+]
+
+
 # Performance test
 if __name__ == "__main__":
-    test_positions = [
-        ("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1", 8),
-        ("r1bqkb1r/pppp1ppp/2n2n2/4p3/2B1P3/3P1N2/PPP2PPP/RNBQK2R w KQkq - 0 4", 10),
-        ("rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8", 12),
-        ("8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", 10),  # Endgame position
-    ]
-
     print("Enhanced Chess Engine Performance Test")
     print("=" * 55)
 
     total_time = 0
     total_nodes = 0
 
-    for i, (fen, depth) in enumerate(test_positions, 1):
+    for i, (fen, depth) in enumerate(TEST_POSITIONS, 1):
         print(f"\nPosition {i} (Depth {depth}):")
         print(f"FEN: {fen}")
 
-        start = time.time()
         result_json = analyze_chess_position(fen, depth)
-        end = time.time()
-
         result = json.loads(result_json)
 
         if result['status'] == 'success':
-            search_info = result['search_info']
-            time_ms = search_info['time_ms']
-            nodes = search_info['nodes']
-            nps = search_info['nps']
+            search_info = result.get('searchInfo', {})
+            time_ms = search_info.get('totalTime', 0)
+            nodes = search_info.get('totalNodes', 0)
+            nps = search_info.get('nodesPerSecond', 0)
 
             print(f"Time: {time_ms}ms")
             print(f"Nodes: {nodes:,}")
             print(f"NPS: {nps:,}")
             print(f"Evaluation: {result['evaluation']}")
-            print(f"TT Hits: {search_info.get('tt_hits', 0)}")
-            print(f"Beta Cutoffs: {search_info.get('beta_cutoffs', 0)}")
+            print(f"TT Hits: {search_info.get('ttHits', 0)}")
+            print(f"Beta Cutoffs: {search_info.get('betaCutoffs', 0)}")
 
             print("Top 3 moves:")
-            for j, move in enumerate(result['best_moves'], 1):
+            for j, move in enumerate(result.get('bestMoves', result.get('best_moves', [])), 1):
                 pv_str = " ".join(move['principal_variation'][:4])
                 print(f"  {j}. {move['move']} ({move['eval_score']}) - PV: {pv_str}")
 
@@ -0,0 +1,189 @@
+# chess_eval_batch.py - Static evaluation of position batches with NumPy
+#
+# Positions become a (N, 12, 64) array of piece planes and every term is a
+# reduction over it: material + piece-square tables (king table by game
+# phase), doubled/isolated/passed pawns, bishop pair and rooks on open files.
+# Mobility and king safety are left out, this is the cheap score for
+# evaluation graphs and large FEN sets, not the search evaluation.
+#
+# Needs NumPy, imported when the first evaluator is created.
+import threading
+from typing import List, Optional
+
+import chess
+
+from chess_engine import FastChessEngine
+from chess_pawns import pawn_structure_score
+
+# Plane of a piece: 0-5 white pawn..king, 6-11 black pawn..king
+PLANE_PIECES = [(piece_type, color) for color in (chess.WHITE, chess.BLACK) for piece_type in chess.PIECE_TYPES]
+NON_KING_PLANES = [plane for plane, (piece_type, _) in enumerate(PLANE_PIECES) if piece_type != chess.KING]
+
+# Same phase rule as the search: endgame below this non-king material or piece count
+ENDGAME_MATERIAL = 1800
+ENDGAME_PIECES = 12
+
+# FEN placement digits expanded to one "." per empty square
+_EXPAND_EMPTY = str.maketrans({str(count): "." * count for count in range(1, 9)})
+# Plane of each FEN piece letter, 12 for an empty square
+_PLANE_OF_SYMBOL = {chess.Piece(piece_type, color).symbol(): plane
+                    for plane, (piece_type, color) in enumerate(PLANE_PIECES)}
+_PLANE_OF_SYMBOL["."] = 12
+
+
+def piece_planes(boards: List[chess.BaseBoard]):
+    """(N, 12, 64) uint8 array, 1 where the plane's piece stands on the square"""
+    import numpy as np
+
+    # One row of raw bitboards per board, the planes are pairwise ANDs of them
+    bitboards = np.array([(board.pawns, board.knights, board.bishops, board.rooks, board.queens, board.kings,
+                           board.occupied_co[chess.WHITE], board.occupied_co[chess.BLACK]) for board in boards],
+                         dtype="<u8").reshape(len(boards), 8)
+    masks = np.ascontiguousarray((bitboards[:, None, 6:] & bitboards[:, :6, None]).transpose(0, 2, 1))
+    return np.unpackbits(masks.view(np.uint8), axis=2, bitorder="little").reshape(len(boards), 12, 64)
+
+
+def fen_planes(fens: List[str]):
+    """piece_planes() straight from the placement field of FENs, raises ValueError for a bad one
+
+    Skips building boards, which costs far more than the evaluation itself;
+    the other FEN fields don't matter for a static score and aren't checked.
+    """
+    import numpy as np
+
+    codes = np.full(256, -1, np.int8)
+    for symbol, plane in _PLANE_OF_SYMBOL.items():
+        codes[ord(symbol)] = plane
+
+    squares = []
+    for index, fen in enumerate(fens):
+        placement = fen.split(" ", 1)[0]
+        ranks = placement.translate(_EXPAND_EMPTY).split("/")
+        if len(ranks) != 8 or any(len(rank) != 8 for rank in ranks) or "." in placement or not fen.isascii():
+            raise ValueError(f"Invalid FEN at index {index}")
+        squares.append("".join(reversed(ranks)))  # FEN lists rank 8 first
+
+    planes = codes[np.frombuffer("".join(squares).encode("ascii"), np.uint8)].reshape(len(fens), 64)
+    invalid = (planes < 0).any(axis=1)
+    if invalid.any():
+        raise ValueError(f"Invalid FEN at index {int(invalid.argmax())}")
+    return (planes[:, None, :] == np.arange(12, dtype=np.int8)[None, :, None]).view(np.uint8)
+
+
+class BatchEvaluator:
+    """Vectorized static evaluation using the piece values and pst_* tables of an engine
+
+    evaluate() returns white-relative centipawns equal to static_eval() of
+    each position, the scalar reference built from the engine's own terms.
+    """
+
+    def __init__(self, engine: Optional[FastChessEngine] = None):
+        import numpy as np
+
+        self.engine = engine or FastChessEngine(tt_size_mb=1)
+        engine = self.engine
+        self.np = np
+
+        # Columns: signed value + PST of the other pieces, king middlegame and
+        # endgame PST, per plane and square. float32 matrix products run on
+        # BLAS and stay exact far beyond any board total.
+        self.square_tables = np.zeros((12, 64, 3), np.float32)
+        for plane, (piece_type, color) in enumerate(PLANE_PIECES):
+            if piece_type == chess.KING:
+                self.square_tables[plane, :, 1] = engine._king_mg[color]
+                self.square_tables[plane, :, 2] = engine._king_eg[color]
+            else:
+                self.square_tables[plane, :, 0] = engine._psq[color][piece_type]
+        self.square_tables = self.square_tables.reshape(12 * 64, 3)
+        self.values = np.array([engine.piece_values[piece_type] for piece_type, _ in PLANE_PIECES], np.int64)
+
+        # Passed pawn bonus by rank: white 20 + (rank - 1) * 10, black 20 + (6 - rank) * 10
+        ranks = np.arange(8)
+        self.white_passed_bonus = (20 + (ranks - 1) * 10)[:, None]
+        self.black_passed_bonus = (20 + (6 - ranks) * 10)[:, None]
+
+    def evaluate(self, boards: List[chess.BaseBoard]):
+        """White-relative static scores of `boards` as an int64 array"""
+        return self.evaluate_planes(piece_planes(boards))
+
+    def evaluate_fens(self, fens: List[str]):
+        """evaluate() of FENs, raises ValueError for an invalid one"""
+        return self.evaluate_planes(fen_planes(fens))
+
+    def evaluate_planes(self, planes):
+        """Scores of a (N, 12, 64) piece-plane array"""
+        np = self.np
+        if not len(planes):
+            return np.zeros(0, np.int64)
+        counts = planes.sum(axis=2, dtype=np.int64)  # (N, 12) pieces per plane
+
+        # Material + PST, the king table chosen by game phase
+        material = counts[:, NON_KING_PLANES] @ self.values[NON_KING_PLANES]
+        endgame = (material < ENDGAME_MATERIAL) | (counts[:, NON_KING_PLANES].sum(axis=1) < ENDGAME_PIECES)
+        psq, king_mg, king_eg = (planes.reshape(len(planes), -1).astype(np.float32) @ self.square_tables).T
+        score = (psq + np.where(endgame, king_eg, king_mg)).round().astype(np.int64)
+
+        # Pawn structure on (N, rank, file) boards
+        white_pawns = planes[:, 0].reshape(-1, 8, 8).astype(bool)
+        black_pawns = planes[:, 6].reshape(-1, 8, 8).astype(bool)
+        white_files = white_pawns.sum(axis=1, dtype=np.int64)
+        black_files = black_pawns.sum(axis=1, dtype=np.int64)
+        score -= 30 * np.maximum(white_files - 1, 0).sum(axis=1)
+        score += 30 * np.maximum(black_files - 1, 0).sum(axis=1)
+        score -= 25 * (white_files * ~self._adjacent(white_files > 0)).sum(axis=1)
+        score += 25 * (black_files * ~self._adjacent(black_files > 0)).sum(axis=1)
+
+        # Passed pawns: no enemy pawn ahead on the same or an adjacent file
+        black_span = black_pawns | self._adjacent(black_pawns)
+        white_span = white_pawns | self._adjacent(white_pawns)
+        blocked_white = np.zeros_like(white_pawns)
+        blocked_white[:, :-1] = np.logical_or.accumulate(black_span[:, :0:-1], axis=1)[:, ::-1]
+        blocked_black = np.zeros_like(black_pawns)
+        blocked_black[:, 1:] = np.logical_or.accumulate(white_span[:, :-1], axis=1)
+        score += ((white_pawns & ~blocked_white) * self.white_passed_bonus).sum(axis=(1, 2))
+        score -= ((black_pawns & ~blocked_black) * self.black_passed_bonus).sum(axis=(1, 2))
+
+        # Bishop pair
+        score += 30 * (counts[:, 2] >= 2) - 30 * (counts[:, 8] >= 2)
+
+        # Rooks on open (no pawns) and semi-open (no own pawns) files
+        white_rooks = planes[:, 3].reshape(-1, 8, 8).sum(axis=1, dtype=np.int64)
+        black_rooks = planes[:, 9].reshape(-1, 8, 8).sum(axis=1, dtype=np.int64)
+        open_files = (white_files == 0) & (black_files == 0)
+        score += (white_rooks * np.where(open_files, 25, np.where(white_files == 0, 15, 0))).sum(axis=1)
+        score -= (black_rooks * np.where(open_files, 25, np.where(black_files == 0, 15, 0))).sum(axis=1)
+
+        return score
+
+    def _adjacent(self, files):
+        """True on the files next to a True file (last axis is the file)"""
+        np = self.np
+        result = np.zeros_like(files, dtype=bool)
+        result[..., 1:] |= files[..., :-1]
+        result[..., :-1] |= files[..., 1:]
+        return result
+
+    def static_eval(self, board: chess.Board) -> int:
+        """Scalar reference: the same terms from the engine's one-board functions"""
+        engine = self.engine
+        material, piece_count, score, king_mg, king_eg = engine._eval_state(board)
+        endgame = material < ENDGAME_MATERIAL or piece_count < ENDGAME_PIECES
+        score += king_eg if endgame else king_mg
+        score += pawn_structure_score(board.pawns & board.occupied_co[chess.WHITE],
+                                      board.pawns & board.occupied_co[chess.BLACK])
+        score += engine._evaluate_bishop_pair(board)
+        score += engine._evaluate_rook_placement(board)
+        return score
+
+
+_default_evaluator = None
+_default_lock = threading.Lock()
+
+
+def default_evaluator() -> BatchEvaluator:
+    """Evaluator shared by the server, raises ImportError without NumPy"""
+    global _default_evaluator
+    with _default_lock:
+        if _default_evaluator is None:
+            _default_evaluator = BatchEvaluator()
+        return _default_evaluator
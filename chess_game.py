@@ -0,0 +1,194 @@
+# chess_game.py - Whole-game analysis on one engine, last ply first
+#
+# Searching the plies in reverse order lets every position reuse the TT
+# entries left by the search of the position that follows it in the game.
+import io
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import chess
+import chess.pgn
+
+from chess_engine import FastChessEngine
+
+# Centipawn loss from which a move gets each classification
+BLUNDER_CP = 300
+MISTAKE_CP = 100
+INACCURACY_CP = 50
+
+# Evaluations are clamped so mate scores don't dominate the centipawn loss
+EVAL_CLAMP_CP = 1000
+
+# Time for the best-move search of a position when the request sets no budget
+DEFAULT_PLY_MOVETIME_MS = 1000
+
+
+def game_plies(pgn: str) -> Tuple[chess.Board, List[chess.Move]]:
+    """Starting position and mainline moves of a PGN, raises ValueError if it can't be used"""
+    game = chess.pgn.read_game(io.StringIO(pgn))
+    if game is None:
+        raise ValueError("Could not parse PGN")
+    if game.errors:
+        raise ValueError(f"Invalid PGN: {game.errors[0]}")
+    moves = list(game.mainline_moves())
+    if not moves:
+        raise ValueError("PGN contains no moves")
+    return game.board(), moves
+
+
+def classify(loss_cp: int) -> Optional[str]:
+    if loss_cp >= BLUNDER_CP:
+        return "blunder"
+    if loss_cp >= MISTAKE_CP:
+        return "mistake"
+    if loss_cp >= INACCURACY_CP:
+        return "inaccuracy"
+    return None
+
+
+def _clamp(score: int) -> int:
+    return max(-EVAL_CLAMP_CP, min(EVAL_CLAMP_CP, score))
+
+
+def _search(engine: FastChessEngine, board: chess.Board, depth: int, options: Dict,
+            searchmoves: Optional[List[chess.Move]] = None) -> Dict:
+    result = engine.analyze_position(board.fen(), depth, multipv=1, book=False, searchmoves=searchmoves, **options)
+    if result.get("status") != "success":
+        raise RuntimeError(result.get("error", "Analysis failed"))
+    return result
+
+
+def _score(result: Dict) -> int:
+    """Clamped side to move relative centipawns of a search result"""
+    return _clamp(int(round(result["evaluation"]["value"] * 100)))
+
+
+def analyze_game(engine: FastChessEngine, pgn: str, depth: int = 8, **options) -> Iterator[Dict]:
+    """Analyze every position of a game, yielding a progress event per position
+
+    The last event ("type": "result") has the plies in game order with the
+    evaluation after the move (white relative, in pawns), the engine's best
+    move, the centipawn loss of the played move and its classification.
+    `options` are passed on to FastChessEngine.analyze_position; without a
+    budget every search gets DEFAULT_PLY_MOVETIME_MS.
+
+    The played move is scored by a second search of the same position
+    restricted to it (searchmoves), limited to the depth the first search
+    reached, so the loss compares two scores of one depth. The evaluation
+    swings between odd and even depths, and two independent searches of
+    the positions before and after the move would mix them. A ply whose
+    second search runs out of budget before that depth gets no loss or
+    classification. In a bitbase position both moves are scored from the
+    bitbase (win, draw or loss) instead.
+    """
+    start_board, moves = game_plies(pgn)
+    if options.get("movetime") is None and options.get("nodes") is None and options.get("deadline") is None:
+        options["movetime"] = DEFAULT_PLY_MOVETIME_MS
+
+    boards = [start_board.copy(stack=False)]
+    sans = []
+    for move in moves:
+        sans.append(boards[-1].san(move))
+        board = boards[-1].copy(stack=False)
+        board.push(move)
+        boards.append(board)
+
+    start_time = time.time()
+    total_nodes = 0
+    best_moves: List[Optional[Dict]] = [None] * len(moves)
+    best_scores = [0] * len(moves)  # Side to move relative, centipawns
+    played_scores = [0] * len(moves)
+    depths = [0] * len(moves)
+    comparable = [False] * len(moves)
+
+    for index in reversed(range(len(moves))):
+        if engine.stop_event is not None and engine.stop_event.is_set():
+            yield {"type": "cancelled", "status": "cancelled", "analyzed": len(moves) - index - 1}
+            return
+
+        board, move = boards[index], moves[index]
+        result = _search(engine, board, depth, options)
+        total_nodes += result["searchInfo"]["totalNodes"]
+        best_moves[index] = result["bestMoves"][0]
+        best_scores[index] = _score(result)
+        depths[index] = result["depth"]
+        root_wdl = engine.bitbases.probe(board) if engine.bitbases is not None else None
+        if root_wdl is not None:
+            # Exact results, a search of the played move could misjudge a drawn position
+            played_wdl = dict(engine._bitbase_move_results(board))[move]
+            best_scores[index] = root_wdl * EVAL_CLAMP_CP
+            played_scores[index] = played_wdl * EVAL_CLAMP_CP
+            comparable[index] = True
+        elif best_moves[index]["move"] == move.uci():
+            played_scores[index] = best_scores[index]
+            comparable[index] = True
+        else:
+            played = _search(engine, board, depths[index], options, [move])
+            total_nodes += played["searchInfo"]["totalNodes"]
+            played_scores[index] = _score(played)
+            comparable[index] = played["depth"] == depths[index]
+
+        after = played_scores[index] if board.turn else -played_scores[index]
+        yield {
+            "type": "progress",
+            "analyzed": len(moves) - index,
+            "total": len(moves),
+            "ply": index + 1,
+            "fen": board.fen(),
+            "evaluation": round(after / 100, 2),
+            "bestMove": best_moves[index]["move"],
+            "depth": depths[index],
+        }
+
+    plies = []
+    summary = {color: {"moves": 0, "totalLoss": 0, "blunder": 0, "mistake": 0, "inaccuracy": 0}
+               for color in ("white", "black")}
+    for index, move in enumerate(moves):
+        board = boards[index]
+        best = best_moves[index]
+        # Both scores from the point of view of the side that played the move
+        loss = max(0, best_scores[index] - played_scores[index]) if comparable[index] else None
+        classification = classify(loss) if loss is not None else None
+        color = "white" if board.turn else "black"
+        after = played_scores[index] if board.turn else -played_scores[index]
+
+        plies.append({
+            "ply": index + 1,
+            "moveNumber": board.fullmove_number,
+            "color": color,
+            "move": move.uci(),
+            "san": sans[index],
+            "evaluation": round(after / 100, 2),
+            "bestMove": best["move"],
+            "bestMoveSan": best["san"],
+            "centipawnLoss": loss,
+            "classification": classification,
+            "depth": depths[index],
+        })
+
+        stats = summary[color]
+        if loss is None:
+            continue
+        stats["moves"] += 1
+        stats["totalLoss"] += loss
+        if classification:
+            stats[classification] += 1
+
+    for stats in summary.values():
+        stats["averageCentipawnLoss"] = round(stats.pop("totalLoss") / max(stats["moves"], 1), 1)
+
+    elapsed = time.time() - start_time
+    yield {
+        "type": "result",
+        "status": "success",
+        "plies": plies,
+        "summary": summary,
+        "searchInfo": {
+            "totalTime": int(elapsed * 1000),
+            "totalNodes": total_nodes,
+            "positions": len(moves),
+            "requestedDepth": depth,
+            "depth": min(depths),
+            "maxDepth": max(depths),
+        },
+    }
@@ -0,0 +1,318 @@
+# chess_nnue.py - NNUE-style evaluation backend on NumPy arrays
+#
+# A small HalfKP network: the input features of a perspective are (own king
+# square, non-king piece, square), 64 * 10 * 64 of them, seen from that side
+# (squares rotated for black). The first layer's outputs for both
+# perspectives are the accumulators; a move only adds and subtracts the
+# weight rows of the few features it changes, and only a king move
+# recomputes its side's accumulator. Two small dense layers with clipped
+# ReLU turn the side to move's and the other side's accumulators into a
+# centipawn score. All weights are int16, the arithmetic is integer.
+#
+# Weights are read from a local file (NNUE_WEIGHTS or ./nnue/default.nnue)
+# through mmap, so every engine and worker process shares the same pages.
+# `python chess_nnue.py [path]` writes the bootstrap network: material and
+# piece-square tables of the classical evaluation, which a trained network
+# in the same format replaces. Without a file that network is built in memory.
+#
+# Needs NumPy, imported when the first network is built.
+import os
+import struct
+import sys
+import threading
+from typing import Dict, Optional
+
+import chess
+
+KING_BUCKETS = 64
+PIECE_CLASSES = 10  # Own pawn..queen, then the other side's pawn..queen
+FEATURES = KING_BUCKETS * PIECE_CLASSES * 64
+
+# Default layer sizes: accumulator per perspective, hidden layer
+HIDDEN = 32
+L1_SIZE = 16
+
+MAGIC = b"CCNNUE01"
+# Magic, then features, accumulator size, hidden size, clip value, layer shifts
+_HEADER = struct.Struct("<8s6I")
+
+DEFAULT_PATH = os.environ.get("NNUE_WEIGHTS", os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                            "nnue", "default.nnue"))
+
+# Accumulator slots allocated up front, one per search ply
+MAX_PLY = 128
+
+
+def feature_index(perspective: bool, king_square: int, piece_type: int, color: bool, square: int) -> int:
+    """Input feature of a non-king piece for `perspective`, whose king is on `king_square`"""
+    if not perspective:
+        king_square ^= 63
+        square ^= 63
+    piece_class = piece_type - 1 if color == perspective else piece_type + 4
+    return (king_square * PIECE_CLASSES + piece_class) * 64 + square
+
+
+def active_features(board: chess.BaseBoard, perspective: bool):
+    """Features of every non-king piece of `board` for `perspective`"""
+    king_square = board.king(perspective)
+    return [feature_index(perspective, king_square, piece_type, color, square)
+            for color in chess.COLORS
+            for piece_type in (chess.PAWN, chess.KNIGHT, chess.BISHOP, chess.ROOK, chess.QUEEN)
+            for square in board.pieces(piece_type, color)]
+
+
+class Network:
+    """Weights of a network and its forward pass
+
+    `ft_weights` (FEATURES x hidden) and `ft_bias` make the accumulators;
+    `l1_weights` (2 * hidden x l1), `l1_bias`, `l2_weights` (l1) and
+    `l2_bias` the dense layers. Activations are clipped to [0, qa] and each
+    dense layer's sum is shifted right by its shift.
+    """
+
+    def __init__(self, ft_weights, ft_bias, l1_weights, l1_bias, l2_weights, l2_bias,
+                 qa: int, l1_shift: int, l2_shift: int, path: Optional[str] = None):
+        import numpy as np
+
+        self.np = np
+        self.ft_weights = ft_weights
+        self.ft_bias = ft_bias
+        self.hidden = ft_weights.shape[1]
+        self.l1_size = l1_weights.shape[1]
+        # Dense layers are tiny, keep int32 copies so the products don't overflow
+        self.l1_weights = l1_weights.astype(np.int32)
+        self.l1_bias = l1_bias.astype(np.int32)
+        self.l2_weights = l2_weights.astype(np.int32)
+        self.l2_bias = int(l2_bias[0])
+        self.qa = qa
+        self.l1_shift = l1_shift
+        self.l2_shift = l2_shift
+        self.path = path
+
+    def refresh(self, board: chess.BaseBoard, perspective: bool, out):
+        """Write the accumulator of `perspective` for `board` into `out`"""
+        np = self.np
+        features = active_features(board, perspective)
+        out[:] = self.ft_bias + self.ft_weights[features].sum(axis=0, dtype=np.int16)
+
+    def evaluate(self, accumulators, turn: bool) -> int:
+        """Centipawns for the side to move from a (2, hidden) accumulator pair indexed by color"""
+        np = self.np
+        inputs = np.clip(accumulators[[int(turn), int(not turn)]].reshape(-1), 0, self.qa).astype(np.int32)
+        hidden = (inputs @ self.l1_weights + self.l1_bias) >> self.l1_shift
+        np.clip(hidden, 0, self.qa, out=hidden)
+        return int((hidden @ self.l2_weights + self.l2_bias) >> self.l2_shift)
+
+    def evaluate_board(self, board: chess.BaseBoard) -> int:
+        """evaluate() with both accumulators computed from scratch"""
+        accumulators = self.np.empty((2, self.hidden), self.np.int16)
+        for perspective in chess.COLORS:
+            self.refresh(board, perspective, accumulators[int(perspective)])
+        return self.evaluate(accumulators, board.turn)
+
+
+class AccumulatorStack:
+    """Accumulators of the positions along the current search line
+
+    reset() computes the root's; push() is called with the board before a
+    move and derives the next ply's by adding and removing feature rows.
+    A king move changes every feature of its side, so push() returns that
+    color and the caller refreshes it once the move is on the board.
+    pop() goes back a ply, the previous slot is still intact.
+    """
+
+    def __init__(self, network: Network):
+        np = network.np
+        self.network = network
+        self.np = np
+        self.slots = np.zeros((MAX_PLY + 1, 2, network.hidden), np.int16)
+        self.ply = 0
+        self.refreshes = 0
+        self.updates = 0
+
+    def reset(self, board: chess.BaseBoard):
+        self.ply = 0
+        for perspective in chess.COLORS:
+            self.network.refresh(board, perspective, self.slots[0, int(perspective)])
+
+    def current(self):
+        return self.slots[self.ply]
+
+    def evaluate(self, turn: bool) -> int:
+        return self.network.evaluate(self.slots[self.ply], turn)
+
+    def push(self, board: chess.Board, move: chess.Move) -> Optional[bool]:
+        """Accumulators after the (legal or null) `move`, the color to refresh after it if any"""
+        ply = self.ply
+        if ply + 1 == len(self.slots):
+            self.slots = self.np.concatenate((self.slots, self.np.zeros_like(self.slots)))
+        slots = self.slots
+        slots[ply + 1] = slots[ply]
+        self.ply = ply + 1
+        if not move:
+            return None
+
+        turn = board.turn
+        from_square, to_square = move.from_square, move.to_square
+        piece_type = board.piece_type_at(from_square)
+        added = []
+        removed = []
+        refresh = None
+
+        if piece_type == chess.KING:
+            refresh = turn
+            own = board.occupied_co[turn]
+            if chess.BB_SQUARES[to_square] & own or abs(to_square - from_square) == 2:
+                # Castling: only the rook is a feature of the other side
+                base = from_square & ~7
+                kingside = to_square > from_square
+                rook_from = to_square if chess.BB_SQUARES[to_square] & own else base + (7 if kingside else 0)
+                removed.append((chess.ROOK, turn, rook_from))
+                added.append((chess.ROOK, turn, base + (5 if kingside else 3)))
+        else:
+            removed.append((piece_type, turn, from_square))
+            added.append((move.promotion or piece_type, turn, to_square))
+            en_passant = to_square == board.ep_square and not board.occupied & chess.BB_SQUARES[to_square]
+            if piece_type == chess.PAWN and en_passant:
+                removed.append((chess.PAWN, not turn, to_square - 8 if turn else to_square + 8))
+
+        captured = board.piece_type_at(to_square)
+        if captured and board.color_at(to_square) != turn:
+            removed.append((captured, not turn, to_square))
+
+        weights = self.network.ft_weights
+        accumulators = slots[ply + 1]
+        for perspective in chess.COLORS:
+            if perspective == refresh:
+                continue
+            king_square = board.king(perspective)
+            accumulator = accumulators[int(perspective)]
+            for piece in added:
+                accumulator += weights[feature_index(perspective, king_square, *piece)]
+            for piece in removed:
+                accumulator -= weights[feature_index(perspective, king_square, *piece)]
+        self.updates += 1
+        return refresh
+
+    def refresh(self, board: chess.BaseBoard, perspective: bool):
+        """Recompute the current accumulator of `perspective` after a king move"""
+        self.network.refresh(board, perspective, self.slots[self.ply, int(perspective)])
+        self.refreshes += 1
+
+    def pop(self):
+        self.ply -= 1
+
+
+# ---------------------------------------------------------------------------
+# Weights files
+# ---------------------------------------------------------------------------
+
+def bootstrap_network(engine, hidden: int = HIDDEN, l1_size: int = L1_SIZE) -> Network:
+    """Network equal to the engine's material + piece-square tables (kings excluded)
+
+    Accumulator unit c of a perspective sums value + PST of its piece
+    class c, the hidden layer passes the side to move's units through and
+    the output adds its own classes and subtracts the other side's.
+    """
+    import numpy as np
+
+    # Own piece of either color on an oriented square scores like a white
+    # piece there, the other side's like a black piece (tables are rotated)
+    rows = np.zeros((PIECE_CLASSES, 64), np.int16)
+    for piece_type in (chess.PAWN, chess.KNIGHT, chess.BISHOP, chess.ROOK, chess.QUEEN):
+        rows[piece_type - 1] = engine._psq[chess.WHITE][piece_type]
+        rows[piece_type + 4] = [-value for value in engine._psq[chess.BLACK][piece_type]]
+
+    ft_weights = np.zeros((KING_BUCKETS, PIECE_CLASSES, 64, hidden), np.int16)
+    for piece_class in range(PIECE_CLASSES):
+        ft_weights[:, piece_class, :, piece_class] = rows[piece_class]
+
+    l1_shift = 6
+    l1_weights = np.zeros((2 * hidden, l1_size), np.int16)
+    l1_weights[np.arange(PIECE_CLASSES), np.arange(PIECE_CLASSES)] = 1 << l1_shift
+    l2_weights = np.zeros(l1_size, np.int16)
+    l2_weights[:5] = 1
+    l2_weights[5:PIECE_CLASSES] = -1
+
+    return Network(ft_weights.reshape(FEATURES, hidden), np.zeros(hidden, np.int16),
+                   l1_weights, np.zeros(l1_size, np.int32), l2_weights, np.zeros(1, np.int32),
+                   qa=8191, l1_shift=l1_shift, l2_shift=0)
+
+
+def _layout(hidden: int, l1_size: int):
+    """(name, dtype, shape) of the arrays following the header, in file order"""
+    return (("ft_weights", "<i2", (FEATURES, hidden)), ("ft_bias", "<i2", (hidden,)),
+            ("l1_weights", "<i2", (2 * hidden, l1_size)), ("l1_bias", "<i4", (l1_size,)),
+            ("l2_weights", "<i2", (l1_size,)), ("l2_bias", "<i4", (1,)))
+
+
+def save(network: Network, path: str = DEFAULT_PATH) -> str:
+    import numpy as np
+
+    arrays = {
+        "ft_weights": network.ft_weights, "ft_bias": network.ft_bias,
+        "l1_weights": network.l1_weights, "l1_bias": network.l1_bias,
+        "l2_weights": network.l2_weights, "l2_bias": np.array([network.l2_bias]),
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, FEATURES, network.hidden, network.l1_size,
+                             network.qa, network.l1_shift, network.l2_shift))
+        for name, dtype, shape in _layout(network.hidden, network.l1_size):
+            f.write(np.ascontiguousarray(arrays[name], dtype=dtype).tobytes())
+    return path
+
+
+def load(path: str = DEFAULT_PATH) -> Network:
+    """Network of a weights file, mapped into memory; raises ValueError for a malformed file"""
+    import numpy as np
+
+    data = np.memmap(path, dtype=np.uint8, mode="r")
+    if len(data) < _HEADER.size:
+        raise ValueError(f"{path} is not an NNUE weights file")
+    magic, features, hidden, l1_size, qa, l1_shift, l2_shift = _HEADER.unpack(bytes(data[:_HEADER.size]))
+    if magic != MAGIC or features != FEATURES:
+        raise ValueError(f"{path} is not an NNUE weights file")
+
+    arrays: Dict[str, object] = {}
+    offset = _HEADER.size
+    for name, dtype, shape in _layout(hidden, l1_size):
+        size = np.dtype(dtype).itemsize * int(np.prod(shape))
+        if offset + size > len(data):
+            raise ValueError(f"{path} is truncated")
+        arrays[name] = data[offset:offset + size].view(dtype).reshape(shape)
+        offset += size
+    if offset != len(data):
+        raise ValueError(f"{path}: {len(data)} bytes, expected {offset}")
+    return Network(qa=qa, l1_shift=l1_shift, l2_shift=l2_shift, path=path, **arrays)
+
+
+_default_network = None
+_default_lock = threading.Lock()
+
+
+def default_network(engine) -> Network:
+    """Network shared by all engines of the process, raises ImportError without NumPy
+
+    Loaded from NNUE_WEIGHTS or ./nnue/default.nnue, else the bootstrap
+    network of `engine`'s tables.
+    """
+    global _default_network
+    with _default_lock:
+        if _default_network is None:
+            network = None
+            if os.path.exists(DEFAULT_PATH):
+                try:
+                    network = load(DEFAULT_PATH)
+                except ValueError as e:
+                    print(f"Ignoring NNUE weights: {e}")
+            _default_network = network or bootstrap_network(engine)
+        return _default_network
+
+
+if __name__ == "__main__":
+    # Usage: python chess_nnue.py [path]
+    from chess_engine import FastChessEngine
+
+    path = save(bootstrap_network(FastChessEngine(tt_size_mb=1)), *sys.argv[1:2])
+    print(f"Bootstrap network written to {path} ({os.path.getsize(path):,} bytes)")
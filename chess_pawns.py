@@ -0,0 +1,127 @@
+# chess_pawns.py - Bitboard pawn structure evaluation and pawn hash table
+from typing import List, Optional
+
+import chess
+
+# Files on either side of each file
+ADJACENT_FILES = [
+    (chess.BB_FILES[file - 1] if file > 0 else 0) | (chess.BB_FILES[file + 1] if file < 7 else 0)
+    for file in range(8)
+]
+
+
+def _ranks_above(rank: int) -> int:
+    return sum(chess.BB_RANKS[r] for r in range(rank + 1, 8))
+
+
+def _ranks_below(rank: int) -> int:
+    return sum(chess.BB_RANKS[r] for r in range(rank))
+
+
+# PASSED_MASKS[color][square]: enemy pawns that can block or capture a pawn on its way
+PASSED_MASKS = [[0] * 64, [0] * 64]
+for _square in chess.SQUARES:
+    _file, _rank = chess.square_file(_square), chess.square_rank(_square)
+    _files = chess.BB_FILES[_file] | ADJACENT_FILES[_file]
+    PASSED_MASKS[chess.WHITE][_square] = _files & _ranks_above(_rank)
+    PASSED_MASKS[chess.BLACK][_square] = _files & _ranks_below(_rank)
+
+
+def _shield_masks(square: int, color: bool):
+    """Squares one and two ranks in front of a king, on its file and the adjacent ones"""
+    masks = []
+    for rank_offset in (1, 2):
+        rank = chess.square_rank(square) + (rank_offset if color else -rank_offset)
+        mask = 0
+        if 0 <= rank <= 7:
+            for file in range(chess.square_file(square) - 1, chess.square_file(square) + 2):
+                if 0 <= file <= 7:
+                    mask |= chess.BB_SQUARES[chess.square(file, rank)]
+        masks.append(mask)
+    return tuple(masks)
+
+
+# SHIELD_MASKS[color][king_square] = (first rank in front, second rank in front)
+SHIELD_MASKS = [[_shield_masks(square, color) for square in chess.SQUARES] for color in (chess.BLACK, chess.WHITE)]
+
+
+def pawn_structure_score(white_pawns: int, black_pawns: int) -> int:
+    """Doubled, isolated and passed pawn terms, white relative"""
+    score = 0
+
+    # Doubled pawns
+    for file_mask in chess.BB_FILES:
+        white_file_pawns = chess.popcount(white_pawns & file_mask)
+        black_file_pawns = chess.popcount(black_pawns & file_mask)
+        if white_file_pawns > 1:
+            score -= (white_file_pawns - 1) * 30
+        if black_file_pawns > 1:
+            score += (black_file_pawns - 1) * 30
+
+    # Isolated and passed pawns
+    for square in chess.scan_forward(white_pawns):
+        if not white_pawns & ADJACENT_FILES[chess.square_file(square)]:
+            score -= 25
+        if not black_pawns & PASSED_MASKS[chess.WHITE][square]:
+            score += 20 + (chess.square_rank(square) - 1) * 10  # More valuable as it advances
+
+    for square in chess.scan_forward(black_pawns):
+        if not black_pawns & ADJACENT_FILES[chess.square_file(square)]:
+            score += 25
+        if not white_pawns & PASSED_MASKS[chess.BLACK][square]:
+            score -= 20 + (6 - chess.square_rank(square)) * 10
+
+    return score
+
+
+def pawn_shield_score(own_pawns: int, king_square: int, color: bool) -> int:
+    """Pawn shield in front of the king: 10 per pawn one rank ahead, 5 per pawn two ranks ahead"""
+    near, far = SHIELD_MASKS[color][king_square]
+    return 10 * chess.popcount(own_pawns & near) + 5 * chess.popcount(own_pawns & far)
+
+
+class PawnHashTable:
+    """Fixed-size cache of pawn structure scores keyed by the pawn-only Zobrist key
+
+    Each entry is [key, structure score, {(color, king_square): shield score}];
+    the shield scores only depend on the pawns and the king square, so they
+    are filled in lazily for the king squares seen.
+    """
+
+    def __init__(self, size: int = 16384):
+        self.size = 1 << (max(1, size).bit_length() - 1)
+        self.mask = self.size - 1
+        self.entries: List[Optional[list]] = [None] * self.size
+        self.probes = 0
+        self.hits = 0
+
+    def reset_stats(self):
+        self.probes = 0
+        self.hits = 0
+
+    def hit_rate(self) -> float:
+        return self.hits / self.probes if self.probes else 0.0
+
+    def entry(self, key: int, board: chess.BaseBoard) -> list:
+        """Return the entry for `key`, computing the structure score on a miss"""
+        self.probes += 1
+        index = key & self.mask
+        entry = self.entries[index]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry
+
+        white_pawns = board.pawns & board.occupied_co[chess.WHITE]
+        black_pawns = board.pawns & board.occupied_co[chess.BLACK]
+        entry = [key, pawn_structure_score(white_pawns, black_pawns), {}]
+        self.entries[index] = entry
+        return entry
+
+    @staticmethod
+    def shield(entry: list, board: chess.BaseBoard, king_square: int, color: bool) -> int:
+        shields = entry[2]
+        shield = shields.get((color, king_square))
+        if shield is None:
+            shield = pawn_shield_score(board.pawns & board.occupied_co[color], king_square, color)
+            shields[(color, king_square)] = shield
+        return shield
@@ -0,0 +1,150 @@
+# chess_ponder.py - Background search of the positions expected after the last analysis
+#
+# In play mode the next request is usually the position after the engine's
+# move and the user's reply, both predicted by the principal variation. They
+# are searched on an idle pool engine while the user thinks, and any new
+# request stops that search at once.
+import os
+import queue
+import threading
+from typing import Dict, List, Optional
+
+import chess
+
+from chess_cache import cache_key
+from chess_engine import EnginePool, FastChessEngine, engine_pool
+
+
+class Ponderer:
+    """Searches predicted positions in one background thread
+
+    start() predicts the position after the first two PV moves, then the
+    one after the first PV move, and searches them in that order with at
+    most `movetime_ms` each, on an engine of the pool that is idle (none is
+    created or waited for, see EnginePool.try_checkout_idle). take() stops the search. When the requested
+    position was predicted, the pondered result is returned if it is deep
+    enough. Otherwise the request gets the same engine from the pool and
+    re-searches with the TT that pondering filled. Only the predictions of
+    the last start() are kept.
+    """
+
+    # Plies of the principal variation that predict the next positions
+    PLIES = 2
+
+    def __init__(self, pool: EnginePool, movetime_ms: Optional[int] = None):
+        self.pool = pool
+        self.movetime_ms = movetime_ms or int(os.environ.get("PONDER_MOVETIME", 15000))
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._predicted: Dict[str, Optional[Dict]] = {}  # position key -> pondered result
+
+        self.searches = 0
+        self.ponder_ms = 0
+        self.requests = 0
+        self.predicted = 0
+        self.hits = 0
+        self.saved_ms = 0
+
+    @classmethod
+    def predicted_positions(cls, fen: str, result: Dict) -> List[str]:
+        """FENs reached by the first PV moves of `result`, the longest prediction first"""
+        best_moves = result.get("bestMoves") if result.get("status") == "success" else None
+        if not best_moves:
+            return []
+        board = chess.Board(fen)
+        fens = []
+        for uci in best_moves[0].get("principalVariation", [])[:cls.PLIES]:
+            move = chess.Move.from_uci(uci)
+            if move not in board.legal_moves:
+                break
+            board.push(move)
+            if board.is_game_over():
+                break
+            fens.append(board.fen())
+        return fens[::-1]
+
+    def start(self, fen: str, result: Dict, depth: int, multipv: int = 3):
+        """Stop any pondering and ponder on the positions predicted by `result`"""
+        self.stop()
+        fens = self.predicted_positions(fen, result)
+        if not fens:
+            return
+        stop_event = threading.Event()
+        thread = threading.Thread(target=self._run, args=(fens, depth, multipv, stop_event), daemon=True)
+        with self._lock:
+            self._predicted = {cache_key(position): None for position in fens}
+            self._stop_event = stop_event
+            self._thread = thread
+        thread.start()
+
+    def _run(self, fens: List[str], depth: int, multipv: int, stop_event: threading.Event):
+        try:
+            with self.pool.try_checkout_idle(stop_event=stop_event) as engine:
+                for fen in fens:
+                    if stop_event.is_set():
+                        break
+                    result = engine.analyze_position(fen, depth, multipv=multipv, movetime=self.movetime_ms)
+                    with self._lock:
+                        self.searches += 1
+                        self.ponder_ms += result.get("searchInfo", {}).get("totalTime", 0)
+                        # Book answers have depth 0 and are as fast as a lookup anyway
+                        key = cache_key(fen)
+                        if result.get("depth", 0) > 0 and key in self._predicted:
+                            self._predicted[key] = result
+        except queue.Empty:
+            pass  # No engine is idle, skip pondering
+        except Exception as e:
+            print(f"Pondering failed: {e}")
+
+    def stop(self):
+        """Stop the background search and wait until its engine is back in the pool"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+            self._stop_event.set()
+        if thread is not None:
+            thread.join()
+
+    def take(self, fen: str, depth: int, multipv: int = 3) -> Optional[Dict]:
+        """Stop pondering; the pondered result of `fen` if it is at least `depth` deep, else None
+
+        The predictions are used up either way.
+        """
+        self.stop()
+        key = cache_key(fen)
+        with self._lock:
+            predicted, self._predicted = self._predicted, {}
+            if not predicted:
+                return None
+            self.requests += 1
+            if key not in predicted:
+                return None
+            self.predicted += 1
+            result = predicted[key]
+            if (result is None or result["depth"] < min(depth, FastChessEngine.MAX_DEPTH) or
+                    result["searchInfo"]["multiPV"] < multipv):
+                return None
+            self.hits += 1
+            self.saved_ms += result["searchInfo"]["totalTime"]
+
+        result["bestMoves"] = result["bestMoves"][:multipv]
+        result["searchInfo"].update(source="ponder", ponderHit=True, multiPV=multipv)
+        return result
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "running": self._thread is not None and self._thread.is_alive(),
+                "movetimeMs": self.movetime_ms,
+                "searches": self.searches,
+                "ponderMs": self.ponder_ms,
+                "requests": self.requests,
+                "predicted": self.predicted,
+                "hits": self.hits,
+                "hitRate": round(self.hits / self.requests, 3) if self.requests else 0.0,
+                "savedMs": self.saved_ms,
+            }
+
+
+# Global ponderer used by the server, searching on the shared engine pool
+ponderer = Ponderer(engine_pool)
@@ -0,0 +1,132 @@
+# chess_position.py - Board used inside the search, with a light make/unmake
+#
+# python-chess still parses and validates positions and generates the legal
+# moves; only the move application changes. Board.push() allocates a board
+# state object, normalizes the move for Chess960 and keeps a move stack that
+# the search never reads. make()/unmake() save the raw bitboards in a
+# preallocated undo stack instead and update them with a few XORs.
+import chess
+
+# Undo slots allocated up front, the stack grows past this only if needed
+MAX_PLY = 128
+
+
+class SearchBoard(chess.Board):
+    """chess.Board with make()/unmake() for the search (standard chess only)
+
+    Moves applied with make() are not on move_stack; plies_from_null counts
+    the plies made since the last null move (or since the search root) for
+    the repetition check. push()/pop() keep working, as long as they are
+    nested inside make()/unmake() pairs and not the other way around.
+    """
+
+    def __init__(self, fen=chess.STARTING_FEN, *, chess960: bool = False):
+        super().__init__(fen, chess960=chess960)
+        self.plies_from_null = 0
+        self._undo = [None] * MAX_PLY
+        self._ply = 0
+
+    def _toggle(self, piece_type: int, mask: int):
+        """XOR `mask` into the bitboard of `piece_type`"""
+        if piece_type == chess.PAWN:
+            self.pawns ^= mask
+        elif piece_type == chess.KNIGHT:
+            self.knights ^= mask
+        elif piece_type == chess.BISHOP:
+            self.bishops ^= mask
+        elif piece_type == chess.ROOK:
+            self.rooks ^= mask
+        elif piece_type == chess.QUEEN:
+            self.queens ^= mask
+        else:
+            self.kings ^= mask
+
+    def make(self, move: chess.Move):
+        """Play a legal (or null) move, undone by unmake()"""
+        occupied_co = self.occupied_co
+        state = (self.pawns, self.knights, self.bishops, self.rooks, self.queens, self.kings,
+                 occupied_co[chess.WHITE], occupied_co[chess.BLACK], self.promoted,
+                 self.castling_rights, self.ep_square, self.halfmove_clock, self.fullmove_number,
+                 self.plies_from_null)
+        ply = self._ply
+        if ply == len(self._undo):
+            self._undo.append(state)
+        else:
+            self._undo[ply] = state
+        self._ply = ply + 1
+
+        turn = self.turn
+        ep_square = self.ep_square
+        self.ep_square = None
+        self.halfmove_clock += 1
+        if not turn:
+            self.fullmove_number += 1
+        self.turn = not turn
+
+        if not move:
+            self.plies_from_null = 0
+            return
+        self.plies_from_null += 1
+
+        from_square, to_square = move.from_square, move.to_square
+        from_bb, to_bb = chess.BB_SQUARES[from_square], chess.BB_SQUARES[to_square]
+        piece_type = self.piece_type_at(from_square)
+        own = occupied_co[turn]
+        self.castling_rights &= ~(from_bb | to_bb)
+
+        if piece_type == chess.KING:
+            self.castling_rights &= ~(chess.BB_RANK_1 if turn else chess.BB_RANK_8)
+            if to_bb & own or abs(to_square - from_square) == 2:
+                # Castling, written as e1g1 or as king takes rook
+                base = from_square & ~7
+                kingside = to_square > from_square
+                rook_from = to_square if to_bb & own else base + (7 if kingside else 0)
+                king_to = base + (6 if kingside else 2)
+                rook_to = base + (5 if kingside else 3)
+                king_mask = from_bb ^ chess.BB_SQUARES[king_to]
+                rook_mask = chess.BB_SQUARES[rook_from] ^ chess.BB_SQUARES[rook_to]
+                self.kings ^= king_mask
+                self.rooks ^= rook_mask
+                occupied_co[turn] = own ^ king_mask ^ rook_mask
+                self.occupied = occupied_co[chess.WHITE] | occupied_co[chess.BLACK]
+                return
+
+        enemy = occupied_co[not turn]
+        if to_bb & enemy:
+            self._toggle(self.piece_type_at(to_square), to_bb)
+            occupied_co[not turn] = enemy ^ to_bb
+            self.promoted &= ~to_bb
+            self.halfmove_clock = 0
+
+        if piece_type == chess.PAWN:
+            self.halfmove_clock = 0
+            diff = to_square - from_square
+            if diff == 16 or diff == -16:
+                self.ep_square = from_square + diff // 2
+            elif to_square == ep_square and not to_bb & enemy:
+                captured_bb = chess.BB_SQUARES[to_square - 8 if turn else to_square + 8]
+                self.pawns ^= captured_bb
+                occupied_co[not turn] ^= captured_bb
+
+        if move.promotion:
+            self.pawns ^= from_bb
+            self._toggle(move.promotion, to_bb)
+            self.promoted |= to_bb
+        else:
+            self._toggle(piece_type, from_bb | to_bb)
+            if self.promoted & from_bb:
+                self.promoted ^= from_bb | to_bb
+
+        occupied_co[turn] = own ^ from_bb ^ to_bb
+        self.occupied = occupied_co[chess.WHITE] | occupied_co[chess.BLACK]
+
+    def unmake(self):
+        """Take back the last make()"""
+        self._ply -= 1
+        (self.pawns, self.knights, self.bishops, self.rooks, self.queens, self.kings,
+         white, black, self.promoted, self.castling_rights, self.ep_square,
+         self.halfmove_clock, self.fullmove_number, self.plies_from_null) = self._undo[self._ply]
+        self.occupied_co[chess.WHITE] = white
+        self.occupied_co[chess.BLACK] = black
+        self.occupied = white | black
+        self.turn = not self.turn
@@ -0,0 +1,133 @@
+# chess_see.py - Static Exchange Evaluation on bitboards
+#
+# Both functions work on a chess.Board without pushing any move: pieces are
+# removed from a local occupancy mask as the exchange goes on, which also
+# uncovers sliders behind them (x-rays). Pins are ignored, as usual for SEE.
+from typing import Dict
+
+import chess
+
+
+def attackers_to(board: chess.BaseBoard, square: int, occupied: int) -> int:
+    """Pieces of both colors attacking `square` with the given occupancy"""
+    diagonal = chess.BB_DIAG_ATTACKS[square][chess.BB_DIAG_MASKS[square] & occupied]
+    orthogonal = (chess.BB_RANK_ATTACKS[square][chess.BB_RANK_MASKS[square] & occupied] |
+                  chess.BB_FILE_ATTACKS[square][chess.BB_FILE_MASKS[square] & occupied])
+    return ((chess.BB_KNIGHT_ATTACKS[square] & board.knights) |
+            (chess.BB_KING_ATTACKS[square] & board.kings) |
+            (diagonal & (board.bishops | board.queens)) |
+            (orthogonal & (board.rooks | board.queens)) |
+            (chess.BB_PAWN_ATTACKS[chess.WHITE][square] & board.pawns & board.occupied_co[chess.BLACK]) |
+            (chess.BB_PAWN_ATTACKS[chess.BLACK][square] & board.pawns & board.occupied_co[chess.WHITE])) & occupied
+
+
+def _least_valuable(board: chess.BaseBoard, attackers: int):
+    """Return (piece_type, square) of the cheapest piece in `attackers`"""
+    for piece_type, mask in ((chess.PAWN, board.pawns), (chess.KNIGHT, board.knights),
+                             (chess.BISHOP, board.bishops), (chess.ROOK, board.rooks),
+                             (chess.QUEEN, board.queens), (chess.KING, board.kings)):
+        bb = attackers & mask
+        if bb:
+            return piece_type, chess.lsb(bb)
+    return None, None
+
+
+def _initial_exchange(board: chess.Board, move: chess.Move, values: Dict[int, int]):
+    """Material won by `move` itself, the piece left on the target square and the occupancy after it"""
+    occupied = board.occupied ^ chess.BB_SQUARES[move.from_square]
+    captured = board.piece_type_at(move.to_square)
+    gain = values[captured] if captured else 0
+
+    if captured is None and board.is_en_passant(move):
+        gain = values[chess.PAWN]
+        occupied ^= chess.BB_SQUARES[chess.square(chess.square_file(move.to_square),
+                                                  chess.square_rank(move.from_square))]
+
+    if move.promotion:
+        gain += values[move.promotion] - values[chess.PAWN]
+        on_square = move.promotion
+    else:
+        on_square = board.piece_type_at(move.from_square)
+
+    return gain, on_square, occupied | chess.BB_SQUARES[move.to_square]
+
+
+def see(board: chess.Board, move: chess.Move, values: Dict[int, int]) -> int:
+    """Material balance of the full capture sequence on the target square of `move`"""
+    if board.is_castling(move):
+        return 0
+
+    to_square = move.to_square
+    gain0, on_square, occupied = _initial_exchange(board, move, values)
+    gains = [gain0]
+    attackers = attackers_to(board, to_square, occupied)
+    side = not board.turn
+
+    while True:
+        own_attackers = attackers & board.occupied_co[side]
+        if not own_attackers:
+            break
+        piece_type, square = _least_valuable(board, own_attackers)
+
+        # A king may only capture when the square is no longer defended
+        if piece_type == chess.KING and attackers & board.occupied_co[not side]:
+            break
+
+        gains.append(values[on_square] - gains[-1])
+        on_square = piece_type
+
+        # Remove the capturer and add any slider x-raying through it
+        occupied ^= chess.BB_SQUARES[square]
+        attackers = attackers_to(board, to_square, occupied)
+        side = not side
+
+    # Either side may stop capturing when continuing would lose material
+    for depth in range(len(gains) - 1, 0, -1):
+        gains[depth - 1] = -max(-gains[depth - 1], gains[depth])
+    return gains[0]
+
+
+def see_ge(board: chess.Board, move: chess.Move, threshold: int, values: Dict[int, int]) -> bool:
+    """True if the exchange started by `move` wins at least `threshold`
+
+    Same result as see(...) >= threshold, but stops as soon as the outcome
+    relative to the threshold is known.
+    """
+    if board.is_castling(move):
+        return threshold <= 0
+
+    to_square = move.to_square
+    gain0, on_square, occupied = _initial_exchange(board, move, values)
+
+    # Even if the moved piece is lost, do we stay above the threshold?
+    swap = gain0 - threshold
+    if swap < 0:
+        return False
+    swap = values[on_square] - swap
+    if swap <= 0:
+        return True
+
+    attackers = attackers_to(board, to_square, occupied)
+    side = board.turn
+    result = True
+
+    while True:
+        side = not side
+        own_attackers = attackers & board.occupied_co[side]
+        if not own_attackers:
+            break
+        result = not result
+        piece_type, square = _least_valuable(board, own_attackers)
+
+        if piece_type == chess.KING:
+            # The king can only finish the exchange on an undefended square
+            return (not result) if attackers & board.occupied_co[not side] else result
+
+        swap = values[piece_type] - swap
+        if swap < int(result):
+            break
+
+        occupied ^= chess.BB_SQUARES[square]
+        attackers = attackers_to(board, to_square, occupied)
+
+    return result
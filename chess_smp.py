@@ -0,0 +1,218 @@
+# chess_smp.py - Lazy SMP: several processes search one position through a shared transposition table
+import atexit
+import itertools
+import os
+import threading
+import time
+from multiprocessing import shared_memory
+from multiprocessing.connection import wait
+from typing import Dict, Optional
+
+from chess_engine import FastChessEngine, worker_process_context
+from chess_tt import table_bytes
+
+# Helper workers skip some iterations so they spread over different depths:
+# worker i > 0 skips depth d when ((d + SKIP_PHASE[i - 1]) // SKIP_SIZE[i - 1]) is odd
+SKIP_SIZE = (1, 1, 2, 2, 2, 2, 3, 3, 3, 3, 3, 3, 4, 4, 4, 4, 4, 4, 4, 4)
+SKIP_PHASE = (0, 1, 0, 1, 2, 3, 0, 1, 2, 3, 4, 5, 0, 1, 2, 3, 4, 5, 6, 7)
+
+
+class _StopFlag:
+    """Stop signal shared with the workers, set and read without a lock
+
+    A worker killed while holding the lock of a multiprocessing.Event or
+    a shared Queue would leave it locked, and block every later search.
+    """
+
+    def __init__(self, context):
+        self._value = context.RawValue("b", 0)
+
+    def is_set(self) -> bool:
+        return bool(self._value.value)
+
+    def set(self):
+        self._value.value = 1
+
+    def clear(self):
+        self._value.value = 0
+
+
+def _worker_main(worker_id, shm_name, tt_size_mb, connection, stop_flag):
+    """Worker process: run every job on an engine backed by the shared TT until None arrives"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    engine = FastChessEngine(tt_size_mb, shm.buf)
+    engine.stop_event = stop_flag
+    if worker_id:
+        index = (worker_id - 1) % len(SKIP_SIZE)
+        engine.depth_skip = (SKIP_SIZE[index], SKIP_PHASE[index])
+
+    while True:
+        try:
+            job = connection.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+        job_id, fen, depth, options = job
+        try:
+            result = engine.analyze_position(fen, depth, **options)
+        except Exception as e:
+            result = {"status": "error", "error": str(e)}
+        connection.send((job_id, worker_id, result))
+
+    # The table views must be gone before the shared memory can be closed
+    del engine
+    shm.close()
+
+
+class LazySMP:
+    """Worker processes that search a single position together
+
+    Every worker runs its own iterative deepening on the same root and they
+    only cooperate through the transposition table in shared memory. The
+    first worker to finish stops the others and the deepest result wins.
+    Workers and the table are created on first use (or by start()) and
+    kept for later searches. They serve one SMP search at a time: analyze()
+    holds the lock for the whole search, so concurrent calls queue on it
+    and each one's budget only starts once it gets the workers.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, tt_size_mb: int = 64):
+        self.max_workers = max_workers or int(os.environ.get("SMP_MAX_THREADS", os.cpu_count() or 1))
+        self.tt_size_mb = tt_size_mb
+        self._context = worker_process_context()
+        self._lock = threading.Lock()
+        self._job_ids = itertools.count(1)
+        self._shm = None
+        self._stop = None
+        self._workers = []  # (process, pipe to the worker for jobs and results)
+        self._eval_backend = "classical"  # Evaluation of the scores in the shared table
+
+    def _start_workers(self, count: int):
+        """Make sure `count` workers are running, replacing any that died since the last search"""
+        if self._shm is None:
+            self._shm = shared_memory.SharedMemory(create=True, size=table_bytes(self.tt_size_mb))
+            self._stop = _StopFlag(self._context)
+        for worker_id, (process, connection) in enumerate(self._workers):
+            # A closed pipe is a worker seen dying, it may not have exited yet
+            if connection.closed or not process.is_alive():
+                process.join()
+                connection.close()
+                self._workers[worker_id] = self._start_worker(worker_id)
+        while len(self._workers) < count:
+            self._workers.append(self._start_worker(len(self._workers)))
+
+    def _start_worker(self, worker_id: int):
+        # One pipe per worker: a worker that dies only takes its own pipe with it
+        connection, worker_connection = self._context.Pipe()
+        process = self._context.Process(
+            target=_worker_main, daemon=True,
+            args=(worker_id, self._shm.name, self.tt_size_mb, worker_connection, self._stop))
+        process.start()
+        worker_connection.close()  # Reads see EOF once the worker is gone
+        return process, connection
+
+    def start(self):
+        """Start every worker now instead of on the first search"""
+        with self._lock:
+            self._start_workers(self.max_workers)
+
+    def analyze(self, fen: str, depth: int, threads: int, movetime: Optional[int] = None,
+                nodes: Optional[int] = None, deadline: Optional[float] = None,
+                stop_event: Optional[threading.Event] = None, **options) -> Dict:
+        """Search `fen` with `threads` workers, same arguments as FastChessEngine.analyze_position
+
+        Setting `stop_event` stops all workers, as when the first one finishes.
+        Blocks while another SMP search is running (see the class docstring).
+        """
+        threads = max(1, min(int(threads), self.max_workers))
+        with self._lock:
+            start_time = time.time()
+
+            # One absolute stop time for all workers, the node budget is split between them
+            if movetime is None and nodes is None and deadline is None:
+                movetime = FastChessEngine.DEFAULT_MOVETIME_MS
+            if movetime is not None:
+                deadline = min(deadline or float("inf"), start_time + movetime / 1000)
+            options.update(deadline=deadline, nodes=max(1, nodes // threads) if nodes else None)
+
+            self._start_workers(threads)
+            # Scores of the other evaluation must not mix into the search, the
+            # table is cleared here while no worker is using it
+            eval_backend = options.get("eval_backend", "classical")
+            if eval_backend != self._eval_backend:
+                self._shm.buf[:] = bytes(len(self._shm.buf))
+                self._eval_backend = eval_backend
+            self._stop.clear()
+            job_id = next(self._job_ids)
+            connections = [connection for _, connection in self._workers[:threads]]
+            for connection in connections:
+                connection.send((job_id, fen, depth, options))
+
+            results = {}
+            while len(results) < threads:
+                if stop_event is not None and stop_event.is_set():
+                    self._stop.set()
+                for connection in wait(connections, timeout=0.05):
+                    try:
+                        got_job, worker_id, result = connection.recv()
+                    except EOFError:
+                        connection.close()
+                        self._stop.set()  # The other workers must not go on with this search
+                        raise RuntimeError("SMP worker process died")
+                    # Results of an earlier search that failed are dropped
+                    if got_job == job_id:
+                        results[worker_id] = result
+                        self._stop.set()  # The first worker to finish stops the others
+
+        return self._combine(results, start_time, threads)
+
+    @staticmethod
+    def _combine(results: Dict[int, Dict], start_time: float, threads: int) -> Dict:
+        """Deepest worker result, with node counts summed over all workers"""
+        best_worker = max(results, key=lambda worker_id: (results[worker_id].get("depth", 0), -worker_id))
+        result = results[best_worker]
+        if "searchInfo" not in result:
+            return result
+
+        elapsed = time.time() - start_time
+        total_nodes = sum(r.get("searchInfo", {}).get("totalNodes", 0) for r in results.values())
+        result["searchInfo"].update({
+            "totalTime": int(elapsed * 1000),
+            "totalNodes": total_nodes,
+            "nodesPerSecond": int(total_nodes / (elapsed + 0.001)),
+            "threads": threads,
+            "workerDepths": [results[worker_id].get("depth", 0) for worker_id in sorted(results)],
+            "bestWorker": best_worker,
+        })
+        return result
+
+    def clear(self):
+        """Empty the shared transposition table"""
+        with self._lock:
+            if self._shm is not None:
+                self._shm.buf[:] = bytes(len(self._shm.buf))
+
+    def close(self):
+        """Stop the workers and free the shared table"""
+        with self._lock:
+            for _, connection in self._workers:
+                try:
+                    connection.send(None)
+                except OSError:
+                    pass  # The worker is gone already
+            for process, connection in self._workers:
+                process.join(timeout=2)
+                if process.is_alive():
+                    process.terminate()
+                connection.close()
+            self._workers = []
+            if self._shm is not None:
+                self._shm.close()
+                self._shm.unlink()
+                self._shm = None
+
+
+# Global SMP searcher used by the server for requests with threads > 1
+lazy_smp = LazySMP()
+atexit.register(lazy_smp.close)
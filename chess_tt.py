@@ -0,0 +1,169 @@
+# chess_tt.py - Fixed-size transposition table packed into a flat 64-bit array
+from array import array
+from typing import Optional, Tuple
+
+import chess
+
+# Bound flags
+EXACT = 0
+LOWER = 1  # Fail high: true score >= stored score
+UPPER = 2  # Fail low: true score <= stored score
+
+MATE_THRESHOLD = 9000
+
+# Bitbase wins score BITBASE_WIN_SCORE - ply. Like mate scores they count
+# plies from the root, so both are stored relative to the node
+BITBASE_WIN_SCORE = 4000
+BITBASE_THRESHOLD = BITBASE_WIN_SCORE - 256
+
+# Every entry is two 64-bit words: (key ^ data, data). Storing the key xor'ed
+# with the data lets a probe detect entries torn by a concurrent writer.
+WORDS_PER_ENTRY = 2
+BYTES_PER_ENTRY = WORDS_PER_ENTRY * 8
+ENTRIES_PER_BUCKET = 2  # Slot 0: depth-preferred, slot 1: always-replace
+BYTES_PER_BUCKET = BYTES_PER_ENTRY * ENTRIES_PER_BUCKET
+
+# Data word layout
+MOVE_BITS = 0xFFFF          # bits 0-15: from | to << 6 | promotion << 12
+SCORE_SHIFT = 16            # bits 16-31: score + 32768
+DEPTH_SHIFT = 32            # bits 32-39: depth
+BOUND_SHIFT = 40            # bits 40-41: bound flag
+AGE_SHIFT = 42              # bits 42-49: search generation
+SCORE_OFFSET = 32768
+
+
+def _distance_scored(score: int) -> bool:
+    return abs(score) > MATE_THRESHOLD or BITBASE_THRESHOLD < abs(score) <= BITBASE_WIN_SCORE
+
+
+def score_to_tt(score: int, ply: int) -> int:
+    """Mate and bitbase scores counted from the node at `ply` instead of the root"""
+    if _distance_scored(score):
+        return score + ply if score > 0 else score - ply
+    return score
+
+
+def score_from_tt(score: int, ply: int) -> int:
+    """Stored score back to root distance for a node at `ply`"""
+    if _distance_scored(score):
+        return score - ply if score > 0 else score + ply
+    return score
+
+
+def encode_move(move: Optional[chess.Move]) -> int:
+    if not move:
+        return 0
+    return move.from_square | (move.to_square << 6) | ((move.promotion or 0) << 12)
+
+
+def decode_move(packed: int) -> Optional[chess.Move]:
+    if not packed:
+        return None
+    return chess.Move(packed & 63, (packed >> 6) & 63, (packed >> 12) or None)
+
+
+def table_bytes(size_mb: int) -> int:
+    """Bytes used by a table of `size_mb`, the bucket count is rounded down to a power of two"""
+    buckets = max(1, (size_mb * 1024 * 1024) // BYTES_PER_BUCKET)
+    return (1 << (buckets.bit_length() - 1)) * BYTES_PER_BUCKET
+
+
+class TranspositionTable:
+    def __init__(self, size_mb: int = 16, buffer=None):
+        """`buffer` (e.g. multiprocessing.shared_memory.SharedMemory.buf) of at
+        least table_bytes(size_mb) bytes makes the table live in that memory,
+        so several processes can share it"""
+        # Round down to a power of two so the bucket index is a mask
+        self.num_buckets = table_bytes(size_mb) // BYTES_PER_BUCKET
+        self.mask = self.num_buckets - 1
+        self.size_mb = size_mb
+        if buffer is None:
+            self.words = array('Q', bytes(self.num_buckets * BYTES_PER_BUCKET))
+        else:
+            self.words = memoryview(buffer)[:self.num_buckets * BYTES_PER_BUCKET].cast('Q')
+
+        # Bumped once per search so entries from older searches are replaced first
+        self.age = 0
+
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+
+    @property
+    def capacity(self) -> int:
+        return self.num_buckets * ENTRIES_PER_BUCKET
+
+    def clear(self):
+        """Empty the table in place and reset statistics"""
+        self.words[:] = array('Q', bytes(len(self.words) * 8))
+        self.reset_stats()
+
+    def new_search(self):
+        """Start a new search generation, keeping the stored entries"""
+        self.age = (self.age + 1) & 0xFF
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+
+    def probe(self, key: int, ply: int = 0) -> Optional[Tuple[Optional[chess.Move], int, int, int]]:
+        """Return (best_move, score, depth, bound) for `key`, or None on a miss"""
+        self.probes += 1
+        words = self.words
+        index = (key & self.mask) * (ENTRIES_PER_BUCKET * WORDS_PER_ENTRY)
+
+        for slot in range(index, index + ENTRIES_PER_BUCKET * WORDS_PER_ENTRY, WORDS_PER_ENTRY):
+            data = words[slot + 1]
+            if data and words[slot] ^ data == key:
+                self.hits += 1
+                score = score_from_tt(((data >> SCORE_SHIFT) & 0xFFFF) - SCORE_OFFSET, ply)
+                return (decode_move(data & MOVE_BITS), score,
+                        (data >> DEPTH_SHIFT) & 0xFF, (data >> BOUND_SHIFT) & 3)
+        return None
+
+    def store(self, key: int, depth: int, score: float, bound: int,
+              move: Optional[chess.Move], ply: int = 0):
+        """Store a search result, preferring deeper or current-generation entries in slot 0"""
+        words = self.words
+        index = (key & self.mask) * (ENTRIES_PER_BUCKET * WORDS_PER_ENTRY)
+        slot0, slot1 = index, index + WORDS_PER_ENTRY
+
+        score = score_to_tt(int(round(score)), ply)
+        score = max(1 - SCORE_OFFSET, min(SCORE_OFFSET - 1, score))
+        depth = max(0, min(255, depth))
+
+        old0 = words[slot0 + 1]
+        old1 = words[slot1 + 1]
+        same0 = bool(old0) and words[slot0] ^ old0 == key
+        same1 = bool(old1) and words[slot1] ^ old1 == key
+
+        if (same0 or not old0 or (old0 >> AGE_SHIFT) & 0xFF != self.age or
+                depth >= (old0 >> DEPTH_SHIFT) & 0xFF):
+            slot, old = slot0, old0 if same0 else 0
+        else:
+            slot, old = slot1, old1 if same1 else 0
+
+        packed_move = encode_move(move)
+        if not packed_move and old:
+            packed_move = old & MOVE_BITS  # Keep the previous best move for ordering
+
+        data = (packed_move | ((score + SCORE_OFFSET) << SCORE_SHIFT) |
+                (depth << DEPTH_SHIFT) | (bound << BOUND_SHIFT) | (self.age << AGE_SHIFT))
+        words[slot] = key ^ data
+        words[slot + 1] = data
+        self.stores += 1
+
+    def hit_rate(self) -> float:
+        return self.hits / self.probes if self.probes else 0.0
+
+    def usage(self) -> float:
+        """Fraction of slots written by the current search, sampled from the first 1000 buckets"""
+        sample = min(self.num_buckets, 1000) * ENTRIES_PER_BUCKET
+        used = 0
+        for i in range(sample):
+            data = self.words[i * WORDS_PER_ENTRY + 1]
+            if data and (data >> AGE_SHIFT) & 0xFF == self.age:
+                used += 1
+        return used / sample
@@ -0,0 +1,131 @@
+# chess_zobrist.py - Incremental Zobrist keys for the search
+import chess
+import chess.polyglot
+
+# Polyglot random numbers, so our keys are identical to chess.polyglot.zobrist_hash
+RANDOM_ARRAY = chess.polyglot.POLYGLOT_RANDOM_ARRAY
+
+# PIECE_KEYS[color][piece_type][square]
+PIECE_KEYS = [
+    [None] + [
+        [RANDOM_ARRAY[64 * ((piece_type - 1) * 2 + int(color)) + square] for square in chess.SQUARES]
+        for piece_type in chess.PIECE_TYPES
+    ]
+    for color in (chess.BLACK, chess.WHITE)
+]
+
+CASTLING_KEYS = [
+    (chess.BB_H1, RANDOM_ARRAY[768]),
+    (chess.BB_A1, RANDOM_ARRAY[768 + 1]),
+    (chess.BB_H8, RANDOM_ARRAY[768 + 2]),
+    (chess.BB_A8, RANDOM_ARRAY[768 + 3]),
+]
+EP_KEYS = RANDOM_ARRAY[772:780]
+TURN_KEY = RANDOM_ARRAY[780]
+
+
+def full_key(board: chess.Board) -> int:
+    """Compute the 64-bit key of a position from scratch"""
+    return chess.polyglot.zobrist_hash(board)
+
+
+def state_key(board: chess.Board) -> int:
+    """Key contribution of castling rights, en passant file and side to move"""
+    key = TURN_KEY if board.turn else 0
+
+    castling = board.clean_castling_rights()
+    if castling:
+        for mask, castling_key in CASTLING_KEYS:
+            if castling & mask:
+                key ^= castling_key
+
+    # Polyglot only hashes the ep file when a pawn is ready to capture
+    if board.ep_square is not None:
+        ep_bb = chess.BB_SQUARES[board.ep_square]
+        ep_bb = chess.shift_down(ep_bb) if board.turn else chess.shift_up(ep_bb)
+        if (chess.shift_left(ep_bb) | chess.shift_right(ep_bb)) & board.pawns & board.occupied_co[board.turn]:
+            key ^= EP_KEYS[chess.square_file(board.ep_square)]
+
+    return key
+
+
+def castling_squares(board: chess.Board, move: chess.Move):
+    """Return (king_to, rook_from, rook_to) for a castling move"""
+    rank = chess.square_rank(move.from_square)
+    kingside = board.is_kingside_castling(move)
+    if board.piece_type_at(move.to_square) == chess.ROOK:
+        rook_from = move.to_square  # Chess960 style king-takes-rook
+    else:
+        rook_from = chess.square(7 if kingside else 0, rank)
+    return (chess.square(6 if kingside else 2, rank), rook_from,
+            chess.square(5 if kingside else 3, rank))
+
+
+def piece_delta(board: chess.Board, move: chess.Move) -> int:
+    """Key change caused by the pieces that `move` adds and removes (board before the move)"""
+    if not move:  # Null move only flips the side to move
+        return 0
+
+    color = board.turn
+    own = PIECE_KEYS[color]
+    piece_type = board.piece_type_at(move.from_square)
+
+    if piece_type == chess.KING and board.is_castling(move):
+        king_to, rook_from, rook_to = castling_squares(board, move)
+        return (own[chess.KING][move.from_square] ^ own[chess.KING][king_to] ^
+                own[chess.ROOK][rook_from] ^ own[chess.ROOK][rook_to])
+
+    delta = own[piece_type][move.from_square] ^ own[move.promotion or piece_type][move.to_square]
+
+    captured_type = board.piece_type_at(move.to_square)
+    if captured_type:
+        delta ^= PIECE_KEYS[not color][captured_type][move.to_square]
+    elif piece_type == chess.PAWN and move.to_square == board.ep_square:
+        captured_square = chess.square(chess.square_file(move.to_square), chess.square_rank(move.from_square))
+        delta ^= PIECE_KEYS[not color][chess.PAWN][captured_square]
+
+    return delta
+
+
+def pawn_key(board: chess.Board) -> int:
+    """Key of the pawn placement only, used by the pawn hash table"""
+    key = 0
+    for color in chess.COLORS:
+        for square in chess.scan_forward(board.pawns & board.occupied_co[color]):
+            key ^= PIECE_KEYS[color][chess.PAWN][square]
+    return key
+
+
+def pawn_delta(board: chess.Board, move: chess.Move) -> int:
+    """Pawn key change caused by `move` (board before the move)"""
+    if not move:
+        return 0
+
+    color = board.turn
+    delta = 0
+    if board.pawns & chess.BB_SQUARES[move.from_square]:
+        delta ^= PIECE_KEYS[color][chess.PAWN][move.from_square]
+        if not move.promotion:
+            delta ^= PIECE_KEYS[color][chess.PAWN][move.to_square]
+        if move.to_square == board.ep_square and not board.occupied & chess.BB_SQUARES[move.to_square]:
+            captured_square = chess.square(chess.square_file(move.to_square), chess.square_rank(move.from_square))
+            delta ^= PIECE_KEYS[not color][chess.PAWN][captured_square]
+
+    if board.pawns & chess.BB_SQUARES[move.to_square]:
+        delta ^= PIECE_KEYS[not color][chess.PAWN][move.to_square]
+
+    return delta
+
+
+def push(board: chess.Board, move: chess.Move, key: int) -> int:
+    """Push `move` on `board` and return the updated key"""
+    key ^= state_key(board) ^ piece_delta(board, move)
+    board.push(move)
+    return key ^ state_key(board)
+
+
+def make(board, move: chess.Move, key: int) -> int:
+    """Like push() for a chess_position.SearchBoard, played with board.make()"""
+    key ^= state_key(board) ^ piece_delta(board, move)
+    board.make(move)
+    return key ^ state_key(board)
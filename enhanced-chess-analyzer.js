@@ -33,7 +33,7 @@ class EnhancedChessAnalyzer {
     }
 
     async getTopMoves(fen, options = {}) {
-        const { depth = 8, useCache = true, timeout = 60000 } = options;
+        const { depth = 8, useCache = true, timeout = 60000, ponder = false } = options;
 
 
         if (!this.isInitialized) {
@@ -58,23 +58,19 @@ class EnhancedChessAnalyzer {
             return cachedResult;
         }
 
-        const currentId = this.generateAnalysisId();
-        const localAnalysisId = currentId;
-        const analysisId=currentId; // lock locally
-
-        console.log(`🔍 Starting analysis (ID: ${localAnalysisId})`);
-
-// no global assignment now
+        // This analysis replaces the previous one, which is stopped on the server
+        // (DELETE /analyze/<id>) instead of running on until its budget is spent
+        this.cancelCurrentAnalysis();
+        const analysisId = this.generateAnalysisId();
+        this.currentAnalysisId = analysisId;
 
         console.log(`🔍 Starting analysis (ID: ${analysisId}, FEN: ${fen}, Depth: ${depth})`);
 
         try {
-            console.log(`📡 getTopMoves() called with FEN=${fen}, depth=${depth}`);
-            const result = await this.engine.analyzePosition(fen, { depth, timeout });
+            const result = await this.engine.analyzePosition(fen, { depth, timeout, analysisId, ponder });
 
-        
-            if (localAnalysisId !== currentId) {
-                console.warn(`⚠️ Analysis (ID: ${localAnalysisId}) is stale.`);
+            if (this.currentAnalysisId !== analysisId || result.cancelled) {
+                console.warn(`⚠️ Analysis (ID: ${analysisId}) was cancelled or is stale.`);
                 return { cancelled: true };
             }
 
@@ -112,16 +108,28 @@ class EnhancedChessAnalyzer {
         return await this.getTopMoves(fen, { depth: 10, useCache: false, timeout: 90000 });
     }
 
-    async multiDepthAnalysis(fen, maxDepth = 10) {
+    async multiDepthAnalysis(fen, maxDepth = 10, onProgress = null) {
+        // A single streamed search reports every completed depth, instead of
+        // one request per depth that repeats all the shallower iterations.
+        // Without a movetime the server stops it after its default budget
+        // (5 s), long before maxDepth; it gets the request timeout instead,
+        // less a margin for the final result to arrive. Depths it does not
+        // reach in that time are missing from the results.
+        const timeout = 60000;
         const results = [];
-        for (let depth = 4; depth <= maxDepth; depth += 2) {
-            try {
-                const result = await this.getTopMoves(fen, { depth, useCache: false, timeout: 60000 });
-                results.push({ depth, result });
-            } catch (error) {
-                console.warn(`Analysis failed at depth ${depth}:`, error.message);
-                break; // Stop if one level fails
-            }
+        if (!this.isInitialized) {
+            await this.initialize();
+        }
+        try {
+            await this.engine.analyzePositionStream(fen, { depth: maxDepth, timeout, movetime: timeout - 5000 }, (result) => {
+                const depth = result.searchInfo.depth;
+                if (depth >= 4 && depth % 2 === 0) {
+                    results.push({ depth, result });
+                    if (onProgress) onProgress(depth, result);
+                }
+            });
+        } catch (error) {
+            console.warn(`Analysis failed after depth ${results.length ? results[results.length - 1].depth : 0}:`, error.message);
         }
         return results;
     }
@@ -129,6 +137,9 @@ class EnhancedChessAnalyzer {
     cancelCurrentAnalysis() {
         if (this.currentAnalysisId) {
             console.log(`🛑 Cancelling current analysis (ID: ${this.currentAnalysisId})`);
+            if (this.engine) {
+                this.engine.cancelAnalysis(this.currentAnalysisId);
+            }
             this.currentAnalysisId = null;
         }
     }
@@ -45,6 +45,19 @@ CREATE TABLE IF NOT EXISTS moves (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Create analysis_cache table for the deepest engine analysis of each position
+-- (fen_key is the FEN without move counters, rows of another engine_version are ignored
+-- and only replaced by a newer one)
+CREATE TABLE IF NOT EXISTS analysis_cache (
+    fen_key TEXT PRIMARY KEY,
+    engine_version INTEGER NOT NULL,
+    depth SMALLINT NOT NULL,
+    multipv SMALLINT NOT NULL,
+    result JSONB NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
 -- =====================================================
 -- INDEXES FOR PERFORMANCE
 -- =====================================================
@@ -217,6 +230,7 @@ ORDER BY g.created_at DESC;
 
 -- Uncomment these only if you need to reset the database
 /*
+-- DROP TABLE IF EXISTS analysis_cache CASCADE;
 -- DROP TABLE IF EXISTS moves CASCADE;
 -- DROP TABLE IF EXISTS games CASCADE;
 -- DROP FUNCTION IF EXISTS update_updated_at_column() CASCADE;
@@ -231,7 +245,7 @@ ORDER BY g.created_at DESC;
 DO $$
 BEGIN
     RAISE NOTICE 'Chess Coach database initialization completed successfully!';
-    RAISE NOTICE 'Tables created: games, moves';
+    RAISE NOTICE 'Tables created: games, moves, analysis_cache';
     RAISE NOTICE 'Indexes created: 6 performance indexes';
     RAISE NOTICE 'Extensions enabled: pg_trgm';
     RAISE NOTICE 'Triggers created: auto-update timestamps';
@@ -243,4 +257,5 @@ SELECT
     'Database initialization complete' as status,
     (SELECT COUNT(*) FROM games) as games_count,
     (SELECT COUNT(*) FROM moves) as moves_count,
+    (SELECT COUNT(*) FROM analysis_cache) as cached_analyses_count,
     CURRENT_TIMESTAMP as completed_at;
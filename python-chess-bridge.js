@@ -66,7 +66,7 @@ class PythonChessBridge {
     }
 
     async analyzePosition(fen, options = {}) {
-        const { depth = 8, timeout = this.requestTimeout } = options;
+        const { depth = 8, timeout = this.requestTimeout, movetime, nodes, deadline, threads, analysisId, ponder } = options;
 
         if (!this.isInitialized) {
             console.error('Engine not initialized. Call initialize() first.');
@@ -90,7 +90,17 @@ class PythonChessBridge {
                 },
                 body: JSON.stringify({
                     fen: fen,
-                    depth: depth
+                    depth: depth,
+                    // Optional search budget, enforced inside the engine search
+                    movetime: movetime,
+                    nodes: nodes,
+                    deadline: deadline,
+                    // Worker processes for a lazy SMP search (1 = single engine)
+                    threads: threads,
+                    // Lets cancelAnalysis() stop this search on the server
+                    analysisId: analysisId,
+                    // Play mode: the server searches the expected next positions meanwhile
+                    ponder: ponder
                 }),
                 signal: controller.signal
             });
@@ -118,6 +128,87 @@ class PythonChessBridge {
         }
     }
 
+    async cancelAnalysis(analysisId) {
+        // Stops a running /analyze search, which then returns its deepest completed result
+        try {
+            const response = await fetch(`${this.serverUrl}/analyze/${encodeURIComponent(analysisId)}`, {
+                method: 'DELETE'
+            });
+            return response.ok;
+        } catch (error) {
+            console.warn('Cancel request failed:', error.message);
+            return false;
+        }
+    }
+
+    async analyzePositionStream(fen, options = {}, onDepth = () => {}) {
+        // One search on /analyze/stream; onDepth gets the formatted result of every
+        // completed depth, the promise resolves with the final result
+        const { depth = 10, timeout = this.requestTimeout, movetime, nodes, deadline, multipv } = options;
+
+        const controller = new AbortController();
+        const timeoutId = setTimeout(() => controller.abort(), timeout);
+
+        try {
+            const response = await fetch(`${this.serverUrl}/analyze/stream`, {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                    'Accept': 'text/event-stream',
+                },
+                body: JSON.stringify({ fen, depth, movetime, nodes, deadline, multipv }),
+                signal: controller.signal
+            });
+
+            if (!response.ok) {
+                const errorText = await response.text();
+                throw new Error(`Server responded with status ${response.status}: ${errorText}`);
+            }
+
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) {
+                    throw new Error('Analysis stream ended without a result');
+                }
+                buffer += decoder.decode(value, { stream: true });
+
+                // Events are separated by a blank line
+                let boundary;
+                while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                    const rawEvent = buffer.slice(0, boundary);
+                    buffer = buffer.slice(boundary + 2);
+
+                    let eventType = 'message';
+                    let data = '';
+                    for (const line of rawEvent.split('\n')) {
+                        if (line.startsWith('event:')) eventType = line.slice(6).trim();
+                        else if (line.startsWith('data:')) data += line.slice(5).trim();
+                    }
+                    const payload = JSON.parse(data);
+
+                    if (eventType === 'depth') {
+                        onDepth(this.formatPythonResult(payload));
+                    } else if (eventType === 'done') {
+                        clearTimeout(timeoutId);
+                        return this.formatPythonResult(payload);
+                    } else if (eventType === 'error') {
+                        throw new Error(payload.error || 'Unknown engine error from server');
+                    }
+                }
+            }
+        } catch (error) {
+            clearTimeout(timeoutId);
+            if (error.name === 'AbortError') {
+                throw new Error(`Analysis timed out after ${timeout / 1000} seconds.`);
+            }
+            throw error;
+        }
+    }
+
     formatPythonResult(pythonResult) {
         // Convert Python engine result to our expected format
         if (pythonResult.status !== 'success') {
@@ -135,6 +226,8 @@ class PythonChessBridge {
                 depth: 0,
                 source: 'python_engine'
             },
+            analysisId: pythonResult.analysisId,
+            cancelled: Boolean(pythonResult.cancelled),
             timestamp: Date.now()
         };
     }
@@ -1,24 +1,49 @@
-from flask import Flask, request, jsonify
+from contextlib import contextmanager
+
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 import json
+import queue
+import select
+import socket
 import sys
+import threading
 import os
+import time
 import traceback
 
 # Import from the chess engine file
 from psycopg2.extras import RealDictCursor
 
-from chess_engine import analyze_chess_position
+from chess_engine import engine_pool, analysis_registry, FastChessEngine, PRUNING_OPTIONS, EVAL_BACKENDS
+from chess_cache import AnalysisCache
+from chess_eval_batch import default_evaluator
+from chess_ponder import ponderer
+from chess_smp import lazy_smp
+from chess_batch import batch_analyzer
+from chess_game import analyze_game, game_plies
 from coach_review import chess_coach
 from chess_db import chess_db
 
+# Largest number of positions accepted by /analyze/batch
+MAX_BATCH_POSITIONS = 5000
+
+# Largest number of positions accepted by /evaluate/batch, a static eval is cheap
+MAX_EVAL_POSITIONS = 100000
+
+# Deepest analysis per position, in memory and in the analysis_cache table
+analysis_cache = AnalysisCache(int(os.environ.get("ANALYSIS_CACHE_SIZE", 10000)), store=chess_db)
+
+# Seconds between two checks of the client connection during an analysis
+DISCONNECT_POLL_INTERVAL = 0.2
+
 app = Flask(__name__)
 # Allow all origins for simplicity in a local dev environment
 CORS(app, resources={r"/*": {"origins": "*"}})
 @app.route('/debug-moves')
 def debug_moves():
     try:
-        with chess_db.connection.cursor(cursor_factory=RealDictCursor) as cursor:
+        with chess_db.transaction() as connection, connection.cursor(cursor_factory=RealDictCursor) as cursor:
             # Get all moves with their exact data
             cursor.execute("SELECT id, move_notation, tags, position_assessment FROM moves;")
             all_moves = cursor.fetchall()
@@ -166,10 +191,16 @@ def index():
             "server_endpoints": {
                 "/": "GET - Server information and available endpoints",
                 "/health": "GET - Check server health status",
-                "/engine-info": "GET - Get chess engine information"
+                "/engine-info": "GET - Get chess engine information",
+                "/engine-stats": "GET - Engine pool status and warm vs cold search metrics"
             },
             "chess_analysis": {
                 "/analyze": "POST - Analyze chess position with engine",
+                "/analyze/<id>": "DELETE - Cancel a running analysis",
+                "/analyze/stream": "GET/POST - Server-Sent Events with the result of every completed depth",
+                "/analyze/batch": "POST - Analyze a list of positions on a process pool (optional NDJSON streaming)",
+                "/analyze/game": "POST - Classify every move of a PGN or saved game (optional NDJSON progress)",
+                "/evaluate/batch": "POST - Static evaluation of a list of positions or of every ply of a game",
                 "/coach-review": "POST - Get AI coach review for position"
             },
             "database_operations": {
@@ -184,7 +215,7 @@ def index():
             }
         },
         "usage_examples": {
-            "analyze_position": "POST /analyze with {fen: 'position', depth: 8}",
+            "analyze_position": "POST /analyze with {fen: 'position', depth: 8, movetime: 2000}",
             "get_coach_review": "POST /coach-review with {fen: 'position', turn: 'White', bestMoves: [...]}",
             "save_game": "POST /api/save-game with {pgn: 'game', final_fen: 'position', game_name: 'name'}",
             "bookmark_move": "POST /api/save-move with {fen: 'position', move_notation: 'Nf3', analysis_data: {...}}",
@@ -197,6 +228,116 @@ def health_check():
     """Health check endpoint"""
     return jsonify({"status": "ok", "engine": "python_chess", "database": "postgresql", "ai_coach": "huggingface"})
 
+@contextmanager
+def cancel_on_disconnect(stop_event):
+    """Set `stop_event` if the client closes its connection while the block runs"""
+    sock = request.environ.get('werkzeug.socket')
+    if sock is None:
+        yield
+        return
+
+    finished = threading.Event()
+
+    def watch():
+        while not finished.wait(DISCONNECT_POLL_INTERVAL):
+            try:
+                readable, _, _ = select.select([sock], [], [], 0)
+                # A readable socket with nothing to read has been closed by the client
+                if readable and not sock.recv(1, socket.MSG_PEEK):
+                    stop_event.set()
+                    return
+            except ValueError:
+                return  # e.g. TLS sockets can't be peeked, stop watching
+            except OSError:
+                stop_event.set()
+                return
+
+    threading.Thread(target=watch, daemon=True).start()
+    try:
+        yield
+    finally:
+        finished.set()
+
+def parse_int_option(value, default, low, high):
+    """Integer request option, `default` when missing, invalid or outside [low, high]"""
+    try:
+        value = int(value)
+    except (ValueError, TypeError):
+        return default
+    return value if low <= value <= high else default
+
+def parse_search_limits(data):
+    """Read the optional movetime (ms), nodes and deadline (Unix time in ms) limits,
+    the pruning switches and the evaluation backend
+
+    Returns (limits, error) where limits are keyword arguments for
+    FastChessEngine.analyze_position.
+    """
+    limits = {}
+    for key in ('movetime', 'nodes', 'deadline'):
+        value = data.get(key)
+        if value is None:
+            continue
+        try:
+            value = int(value)
+        except (ValueError, TypeError):
+            return None, f"{key} must be an integer"
+        if value <= 0:
+            return None, f"{key} must be positive"
+        limits[key] = value
+
+    if 'deadline' in limits:
+        limits['deadline'] = limits['deadline'] / 1000
+
+    pruning = data.get('pruning')
+    if pruning is not None:
+        if not isinstance(pruning, dict):
+            return None, "pruning must be an object"
+        for name, enabled in pruning.items():
+            if name not in PRUNING_OPTIONS:
+                return None, f"unknown pruning option {name}, expected one of {', '.join(PRUNING_OPTIONS)}"
+            if not isinstance(enabled, bool):
+                return None, f"pruning.{name} must be true or false"
+        limits['pruning'] = pruning
+
+    eval_backend = data.get('evalBackend')
+    if eval_backend is not None:
+        if eval_backend not in EVAL_BACKENDS:
+            return None, f"evalBackend must be one of {', '.join(EVAL_BACKENDS)}"
+        limits['eval_backend'] = eval_backend
+    return limits, None
+
+def release_on_close(response, analysis_id, stop_event):
+    """Stop and unregister a streamed analysis when its response is closed
+
+    The WSGI server closes a response even when the client disconnects
+    before the first chunk, while the body's own cleanup only runs once it
+    has started.
+    """
+    def release():
+        stop_event.set()
+        analysis_registry.finish(analysis_id, stop_event)
+    response.call_on_close(release)
+    return response
+
+def use_analysis_cache(data, limits):
+    """Cached results come from default searches, so requests changing the pruning or
+    the evaluation backend bypass the cache"""
+    return ('pruning' not in limits and limits.get('eval_backend', 'classical') == 'classical' and
+            data.get('cache', True) is not False)
+
+def cached_batch(fens, depth, multipv, limits, use_cache):
+    """Batch results in input order, searching only the positions missing from the cache"""
+    cached = [analysis_cache.get(fen, depth, multipv) if use_cache else None for fen in fens]
+    misses = [fen for fen, result in zip(fens, cached) if result is None]
+    searched = batch_analyzer.analyze(misses, depth, multipv=multipv, **limits) if misses else iter(())
+    for fen, result in zip(fens, cached):
+        if result is None:
+            result = next(searched)
+            if use_cache:
+                analysis_cache.put(fen, result)
+        yield result
+
 @app.route('/analyze', methods=['POST'])
 def analyze_position():
     """Main analysis endpoint"""
@@ -212,32 +353,344 @@ def analyze_position():
             
         fen = data.get('fen')
         depth = data.get('depth', 8)
+        multipv = data.get('multipv', 3)
+        threads = data.get('threads', 1)
 
         if not fen:
             return jsonify({"status": "error", "error": "FEN string is required"}), 400
 
-        # Validate depth parameter
+        # Validate depth and the number of best lines with exact scores
+        depth = parse_int_option(depth, 8, 1, 15)
+        multipv = parse_int_option(multipv, 3, 1, 10)
+
+        # Worker processes for a lazy SMP search
         try:
-            depth = int(depth)
-            if not (1 <= depth <= 15):
-                depth = 8
+            threads = max(1, int(threads))
         except (ValueError, TypeError):
-            depth = 8
+            threads = 1
+
+        limits, error = parse_search_limits(data)
+        if error:
+            return jsonify({"status": "error", "error": error}), 400
+
+        # Every request stops pondering. A pondered search of this position or
+        # a stored analysis at least as deep as requested answers without a search
+        use_cache = use_analysis_cache(data, limits)
+        if use_cache:
+            result = ponderer.take(fen, depth, multipv)
+            if result is not None:
+                # Kept like a search of this request, later requests find it in the cache
+                analysis_cache.put(fen, result)
+            else:
+                result = analysis_cache.get(fen, depth, multipv)
+        else:
+            ponderer.stop()
+            result = None
 
-        # Call your chess engine
-        result_json = analyze_chess_position(fen, depth)
-        result = json.loads(result_json)
+        if result is None:
+            # Registered so DELETE /analyze/<id> or a client disconnect can stop it
+            try:
+                analysis_id, stop_event = analysis_registry.start(data.get('analysisId'))
+            except KeyError:
+                return jsonify({"status": "error", "error": "analysisId is already in use"}), 409
 
+            try:
+                with cancel_on_disconnect(stop_event):
+                    if threads > 1:
+                        result = lazy_smp.analyze(fen, depth, threads, multipv=multipv, stop_event=stop_event, **limits)
+                    else:
+                        # Borrow a warm engine from the pool for this request
+                        with engine_pool.checkout(stop_event=stop_event) as engine:
+                            result = engine.analyze_position(fen, depth, multipv=multipv, **limits)
+            finally:
+                analysis_registry.finish(analysis_id, stop_event)
+
+            if use_cache:
+                analysis_cache.put(fen, result)
+            result["analysisId"] = analysis_id
+            result["cancelled"] = stop_event.is_set()
+            if result["cancelled"]:
+                return jsonify(result)
+
+        # Play mode: search the expected next positions until the next request.
+        # Pondering runs default searches, only those requests can use them
+        if data.get('ponder') and use_cache:
+            ponderer.start(fen, result, depth, multipv)
         return jsonify(result)
 
-    except json.JSONDecodeError as e:
-        print(f"Error decoding result from chess engine: {str(e)}")
+    except Exception as e:
+        print(f"Error in analyze_position: {str(e)}")
+        traceback.print_exc()
         return jsonify({
             "status": "error",
-            "error": "Internal server error: Failed to process engine output."
+            "error": "An unexpected error occurred on the server."
         }), 500
+
+@app.route('/analyze/stream', methods=['GET', 'POST'])
+def analyze_stream():
+    """Server-Sent Events for one search: "start" with the analysis ID, a "depth"
+    event after every completed iteration, then "done" with the full result (or "error")
+
+    Takes the /analyze parameters as JSON (POST) or query string (GET, for EventSource).
+    The search is cancelled when the client disconnects.
+    """
+    data = request.get_json(silent=True) if request.method == 'POST' else request.args.to_dict()
+    if not data or not data.get('fen'):
+        return jsonify({"status": "error", "error": "FEN string is required"}), 400
+
+    fen = data['fen']
+    depth = parse_int_option(data.get('depth', 10), 10, 1, 15)
+    multipv = parse_int_option(data.get('multipv', 3), 3, 1, 10)
+    limits, error = parse_search_limits(data)
+    if error:
+        return jsonify({"status": "error", "error": error}), 400
+
+    try:
+        analysis_id, stop_event = analysis_registry.start(data.get('analysisId'))
+    except KeyError:
+        return jsonify({"status": "error", "error": "analysisId is already in use"}), 409
+
+    ponderer.stop()
+    events = queue.Queue()
+
+    def search():
+        try:
+            with engine_pool.checkout(stop_event=stop_event) as engine:
+                result = engine.analyze_position(fen, depth, multipv=multipv,
+                                                 on_depth=lambda info: events.put(("depth", info)), **limits)
+            if use_analysis_cache(data, limits):
+                analysis_cache.put(fen, result)
+            result["analysisId"] = analysis_id
+            result["cancelled"] = stop_event.is_set()
+            events.put(("done" if result.get("status") == "success" else "error", result))
+        except Exception as e:
+            traceback.print_exc()
+            events.put(("error", {"status": "error", "error": str(e)}))
+        finally:
+            analysis_registry.finish(analysis_id, stop_event)
+
+    def generate():
+        threading.Thread(target=search, daemon=True).start()
+        try:
+            yield f"event: start\ndata: {json.dumps({'analysisId': analysis_id})}\n\n"
+            while True:
+                kind, payload = events.get()
+                yield f"event: {kind}\ndata: {json.dumps(payload)}\n\n"
+                if kind != "depth":
+                    break
+        finally:
+            # Runs when the client goes away before the end, too
+            stop_event.set()
+
+    response = Response(generate(), mimetype='text/event-stream',
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    return release_on_close(response, analysis_id, stop_event)
+
+@app.route('/analyze/<analysis_id>', methods=['DELETE'])
+def cancel_analysis(analysis_id):
+    """Stop a running analysis; its request returns the deepest completed result"""
+    if not analysis_registry.cancel(analysis_id):
+        return jsonify({"status": "error", "error": "No running analysis with this ID"}), 404
+    return jsonify({"status": "success", "analysisId": analysis_id, "cancelled": True})
+
+@app.route('/analyze/batch', methods=['POST'])
+def analyze_batch():
+    """Analyze a list of positions on the batch process pool
+
+    Results are returned in input order, either as one JSON document or,
+    with "stream": true, as NDJSON with one line per position.
+    """
+    try:
+        if not request.is_json:
+            return jsonify({"status": "error", "error": "Invalid content type, expected application/json"}), 415
+
+        data = request.get_json()
+        if not data:
+            return jsonify({"status": "error", "error": "No JSON data provided"}), 400
+
+        fens = data.get('fens')
+        if not isinstance(fens, list) or not fens or not all(isinstance(fen, str) for fen in fens):
+            return jsonify({"status": "error", "error": "fens must be a non-empty list of FEN strings"}), 400
+        if len(fens) > MAX_BATCH_POSITIONS:
+            return jsonify({"status": "error", "error": f"At most {MAX_BATCH_POSITIONS} positions per batch"}), 400
+
+        depth = parse_int_option(data.get('depth', 8), 8, 1, 15)
+        multipv = parse_int_option(data.get('multipv', 1), 1, 1, 10)
+        limits, error = parse_search_limits(data)
+        if error:
+            return jsonify({"status": "error", "error": error}), 400
+
+        ponderer.stop()
+        start_time = time.time()
+        results = cached_batch(fens, depth, multipv, limits, use_analysis_cache(data, limits))
+
+        if data.get('stream'):
+            def generate():
+                for index, (fen, result) in enumerate(zip(fens, results)):
+                    yield json.dumps({"index": index, "fen": fen, **result}) + "\n"
+            return Response(generate(), mimetype='application/x-ndjson')
+
+        items = [{"index": index, "fen": fen, **result} for index, (fen, result) in enumerate(zip(fens, results))]
+        elapsed = time.time() - start_time
+        return jsonify({
+            "status": "success",
+            "count": len(items),
+            "results": items,
+            "totalTime": int(elapsed * 1000),
+            "positionsPerSecond": round(len(items) / (elapsed + 0.001), 2),
+            "workers": batch_analyzer.workers
+        })
+
     except Exception as e:
-        print(f"Error in analyze_position: {str(e)}")
+        print(f"Error in analyze_batch: {str(e)}")
+        traceback.print_exc()
+        return jsonify({
+            "status": "error",
+            "error": "An unexpected error occurred on the server."
+        }), 500
+
+@app.route('/evaluate/batch', methods=['POST'])
+def evaluate_batch():
+    """Static evaluation (material, PST, pawn structure, bishop pair, rook files) of many positions
+
+    Takes "fens", or a "pgn"/"game_id" whose starting position and every
+    ply are evaluated, e.g. for an evaluation graph. No search is run.
+    """
+    try:
+        if not request.is_json:
+            return jsonify({"status": "error", "error": "Invalid content type, expected application/json"}), 415
+
+        data = request.get_json()
+        if not data:
+            return jsonify({"status": "error", "error": "No JSON data provided"}), 400
+
+        fens = data.get('fens')
+        pgn = data.get('pgn')
+        game_id = data.get('game_id')
+        if fens is None and not pgn and game_id is not None:
+            try:
+                game = chess_db.get_game_by_id(int(game_id))
+            except (ValueError, TypeError):
+                return jsonify({"status": "error", "error": "game_id must be an integer"}), 400
+            if not game:
+                return jsonify({"status": "error", "error": "Game not found"}), 404
+            pgn = game['pgn']
+
+        boards = None
+        if fens is None and pgn:
+            try:
+                board, moves = game_plies(pgn)
+            except ValueError as e:
+                return jsonify({"status": "error", "error": str(e)}), 400
+            boards = [board.copy(stack=False)]
+            for move in moves:
+                board.push(move)
+                boards.append(board.copy(stack=False))
+            fens = [board.fen() for board in boards]
+        elif not isinstance(fens, list) or not fens or not all(isinstance(fen, str) for fen in fens):
+            return jsonify({"status": "error", "error": "fens, pgn or game_id is required"}), 400
+        elif len(fens) > MAX_EVAL_POSITIONS:
+            return jsonify({"status": "error", "error": f"At most {MAX_EVAL_POSITIONS} positions per batch"}), 400
+
+        try:
+            evaluator = default_evaluator()
+        except ImportError:
+            return jsonify({"status": "error", "error": "Batch evaluation needs NumPy (pip install numpy)"}), 503
+
+        start_time = time.time()
+        try:
+            scores = (evaluator.evaluate(boards) if boards is not None else evaluator.evaluate_fens(fens)).tolist()
+        except ValueError as e:
+            return jsonify({"status": "error", "error": str(e)}), 400
+        elapsed = time.time() - start_time
+        return jsonify({
+            "status": "success",
+            "count": len(fens),
+            "results": [{"index": index, "fen": fen, "evaluationRaw": score,
+                         "evaluation": FastChessEngine._format_evaluation(score)}
+                        for index, (fen, score) in enumerate(zip(fens, scores))],
+            "totalTime": int(elapsed * 1000),
+            "positionsPerSecond": round(len(fens) / (elapsed + 0.001), 2)
+        })
+
+    except Exception as e:
+        print(f"Error in evaluate_batch: {str(e)}")
+        traceback.print_exc()
+        return jsonify({
+            "status": "error",
+            "error": "An unexpected error occurred on the server."
+        }), 500
+
+@app.route('/analyze/game', methods=['POST'])
+def analyze_game_endpoint():
+    """Analyze every ply of a game (PGN or saved game id) on one engine
+
+    Returns per-ply evaluation, best move and blunder/mistake/inaccuracy
+    classification. With "stream": true progress events are sent as NDJSON
+    while the game is processed, the last line holds the full result.
+    """
+    try:
+        if not request.is_json:
+            return jsonify({"status": "error", "error": "Invalid content type, expected application/json"}), 415
+
+        data = request.get_json()
+        if not data:
+            return jsonify({"status": "error", "error": "No JSON data provided"}), 400
+
+        pgn = data.get('pgn')
+        game_id = data.get('game_id')
+        if not pgn and game_id is not None:
+            try:
+                game = chess_db.get_game_by_id(int(game_id))
+            except (ValueError, TypeError):
+                return jsonify({"status": "error", "error": "game_id must be an integer"}), 400
+            if not game:
+                return jsonify({"status": "error", "error": "Game not found"}), 404
+            pgn = game['pgn']
+        if not pgn:
+            return jsonify({"status": "error", "error": "pgn or game_id is required"}), 400
+
+        try:
+            game_plies(pgn)
+        except ValueError as e:
+            return jsonify({"status": "error", "error": str(e)}), 400
+
+        depth = parse_int_option(data.get('depth', 8), 8, 1, 15)
+        limits, error = parse_search_limits(data)
+        if error:
+            return jsonify({"status": "error", "error": error}), 400
+
+        try:
+            analysis_id, stop_event = analysis_registry.start(data.get('analysisId'))
+        except KeyError:
+            return jsonify({"status": "error", "error": "analysisId is already in use"}), 409
+
+        ponderer.stop()
+
+        def events():
+            try:
+                # One engine for the whole game so the TT carries over between plies
+                with engine_pool.checkout(stop_event=stop_event) as engine:
+                    for event in analyze_game(engine, pgn, depth, **limits):
+                        event["analysisId"] = analysis_id
+                        yield event
+            finally:
+                # Also reached when a streaming client disconnects
+                stop_event.set()
+                analysis_registry.finish(analysis_id, stop_event)
+
+        if data.get('stream'):
+            response = Response((json.dumps(event) + "\n" for event in events()), mimetype='application/x-ndjson')
+            return release_on_close(response, analysis_id, stop_event)
+
+        result = None
+        with cancel_on_disconnect(stop_event):
+            for result in events():
+                pass
+        return jsonify(result)
+
+    except Exception as e:
+        print(f"Error in analyze_game: {str(e)}")
         traceback.print_exc()
         return jsonify({
             "status": "error",
@@ -266,6 +719,16 @@ def engine_info():
         "ai_backend": "HuggingFace"
     })
 
+@app.route('/engine-stats', methods=['GET'])
+def engine_stats():
+    """Engine pool status, warm vs cold search metrics, running analyses, cache and ponder stats"""
+    stats = engine_pool.stats()
+    stats["runningAnalyses"] = analysis_registry.running()
+    stats["cancelledAnalyses"] = analysis_registry.cancelled
+    stats["analysisCache"] = analysis_cache.stats()
+    stats["ponder"] = ponderer.stats()
+    return jsonify(stats)
+
 @app.errorhandler(404)
 def not_found(error):
     return jsonify({"status": "error", "error": "Endpoint not found"}), 404
@@ -285,6 +748,9 @@ if __name__ == '__main__':
     print("Make sure to install dependencies: pip install flask flask-cors python-chess psycopg2-binary")
     
     try:
+        # Fork the worker processes while this is the only thread (see worker_process_context)
+        lazy_smp.start()
+        batch_analyzer.start()
         # Use 0.0.0.0 to make server accessible on the network
         app.run(host='0.0.0.0', port=8000, debug=False, threaded=True)
     except Exception as e:
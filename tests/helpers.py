@@ -0,0 +1,34 @@
+# helpers.py - Position generators shared by the tests
+import random
+
+import chess
+
+
+def random_positions(count: int, seed: int = 1):
+    """Positions sampled from random playouts"""
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        board = chess.Board()
+        for _ in range(rng.randint(4, 120)):
+            moves = list(board.legal_moves)
+            if not moves:
+                break
+            board.push(rng.choice(moves))
+        if not board.is_game_over():
+            positions.append(chess.Board(board.fen()))
+    return positions
+
+
+def random_walk(engine, board, plies: int, rng: random.Random):
+    """Yield after each make/unmake of a random playout through engine._make_move"""
+    for _ in range(plies):
+        moves = list(board.legal_moves)
+        if not moves:
+            break
+        # Occasionally step back to exercise unmake
+        if engine._state_stack and rng.random() < 0.15:
+            engine._unmake_move(board)
+        else:
+            engine._make_move(board, rng.choice(moves))
+        yield
@@ -0,0 +1,30 @@
+# test_batch.py - BatchAnalyzer result order and per-position errors
+import chess
+import pytest
+
+from chess_batch import BatchAnalyzer
+from helpers import random_positions
+
+
+@pytest.fixture(scope="module")
+def batch():
+    analyzer = BatchAnalyzer(workers=2)
+    yield analyzer
+    analyzer.close()
+
+
+def test_results_come_back_in_input_order(batch):
+    boards = random_positions(10, seed=3)
+    results = list(batch.analyze([board.fen() for board in boards], 2, multipv=1, movetime=600000))
+    assert len(results) == len(boards)
+    for board, result in zip(boards, results):
+        assert result["status"] == "success"
+        # Random positions share few legal moves, a result out of order would not be legal here
+        assert chess.Move.from_uci(result["bestMoves"][0]["move"]) in board.legal_moves
+
+
+def test_bad_position_fails_only_itself(batch):
+    fens = [board.fen() for board in random_positions(3, seed=4)]
+    fens.insert(1, "not a fen")
+    results = list(batch.analyze(fens, 2, multipv=1, movetime=600000))
+    assert [result["status"] for result in results] == ["success", "error", "success", "success"]
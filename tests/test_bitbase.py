@@ -0,0 +1,94 @@
+# test_bitbase.py - Generated bitbases against python-chess move generation
+import random
+
+import chess
+import pytest
+
+import chess_bitbase
+from chess_tt import BITBASE_WIN_SCORE, EXACT, MATE_THRESHOLD, TranspositionTable
+
+pytest.importorskip("numpy")
+
+# KBNK takes the better part of a minute to generate, the benchmark covers it
+ENDGAMES = ("KQK", "KRK", "KPK")
+
+KNOWN_POSITIONS = [
+    ("k7/8/K7/P7/8/8/8/8 w - - 0 1", 0),     # Rook pawn, defending king in the corner
+    ("4k3/8/4K3/4P3/8/8/8/8 w - - 0 1", 1),  # King on the sixth in front of the pawn
+    ("4k3/8/4K3/4P3/8/8/8/8 b - - 0 1", -1),
+    ("8/8/8/8/8/4k3/4p3/4K3 w - - 0 1", 0),  # Mirrored: black has the pawn
+    ("8/8/8/8/8/2k5/8/K1q5 w - - 0 1", -1),
+]
+
+
+@pytest.fixture(scope="module")
+def bitbases(tmp_path_factory):
+    directory = str(tmp_path_factory.mktemp("bitbases"))
+    solved = {}
+    for name in ENDGAMES:
+        solved[name] = chess_bitbase.generate(name, solved)
+        chess_bitbase.save(name, *solved[name], directory)
+    return chess_bitbase.Bitbases(directory)
+
+
+def random_position(name, strong, rng):
+    """Random legal position of an endgame table, `strong` having the pieces"""
+    pieces = chess_bitbase.ENDGAMES[name][0]
+    while True:
+        board = chess.Board(None)
+        squares = rng.sample(chess.SQUARES, len(pieces) + 2)
+        board.set_piece_at(squares[0], chess.Piece(chess.KING, strong))
+        board.set_piece_at(squares[1], chess.Piece(chess.KING, not strong))
+        for piece_type, square in zip(pieces, squares[2:]):
+            board.set_piece_at(square, chess.Piece(piece_type, strong))
+        board.turn = rng.choice(chess.COLORS)
+        if board.is_valid():
+            return board
+
+
+def expected(bitbases, board):
+    """Win/draw/loss of `board` from its legal moves and the probes of the positions after them"""
+    best = None
+    for move in board.legal_moves:
+        board.push(move)
+        if board.is_checkmate():
+            value = 1
+        elif board.is_game_over():
+            value = 0
+        else:
+            value = -(bitbases.probe(board) or 0)
+        board.pop()
+        best = value if best is None else max(best, value)
+    if best is None:
+        return -1 if board.is_check() else 0
+    return best
+
+
+@pytest.mark.parametrize("name", ENDGAMES)
+def test_probes_follow_from_the_moves(bitbases, name):
+    # Checked with python-chess rather than the generator's move tables
+    rng = random.Random(name)
+    for _ in range(300):
+        board = random_position(name, rng.choice(chess.COLORS), rng)
+        assert bitbases.probe(board) == expected(bitbases, board), board.fen()
+
+
+@pytest.mark.parametrize("fen, value", KNOWN_POSITIONS)
+def test_known_positions(bitbases, fen, value):
+    assert bitbases.probe(chess.Board(fen)) == value
+
+
+def test_positions_without_a_table(bitbases):
+    assert bitbases.probe(chess.Board()) is None
+    assert bitbases.probe(chess.Board("4k3/8/8/8/8/8/8/1BN1K3 w - - 0 1")) is None  # KBNK not generated
+
+
+@pytest.mark.parametrize("score", [BITBASE_WIN_SCORE - 7, -(BITBASE_WIN_SCORE - 7),
+                                   MATE_THRESHOLD + 20, -(MATE_THRESHOLD + 20), 150])
+def test_distance_scores_are_stored_relative_to_the_node(score):
+    tt = TranspositionTable(size_mb=1)
+    tt.store(12345, 4, score, EXACT, None, ply=3)
+    # The same position reached 2 plies later is 2 plies further from its result
+    distance = 2 if abs(score) > 1000 else 0
+    _, stored, _, _ = tt.probe(12345, ply=5)
+    assert stored == (score - distance if score > 0 else score + distance)
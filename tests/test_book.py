@@ -0,0 +1,83 @@
+# test_book.py - Polyglot and built-in book lookups
+import random
+import struct
+
+import chess
+import chess.polyglot
+import pytest
+
+import chess_book
+from helpers import random_positions
+
+
+def polyglot_move(board, move):
+    """Raw Polyglot encoding of `move`, castling is written as king takes rook"""
+    to_square = move.to_square
+    if board.is_castling(move):
+        to_square = chess.square(7 if chess.square_file(move.to_square) > 4 else 0, chess.square_rank(move.to_square))
+    promotion = move.promotion - 1 if move.promotion else 0
+    return to_square | (move.from_square << 6) | (promotion << 12)
+
+
+def write_book(path, boards, rng):
+    """Polyglot file of a few weighted moves and every castling move for each board, returns key -> {move: weight}"""
+    expected = {}
+    entries = []
+    for board in boards:
+        key = chess.polyglot.zobrist_hash(board)
+        if key in expected:
+            continue
+        castling = [move for move in board.legal_moves if board.is_castling(move)]
+        others = [move for move in board.legal_moves if not board.is_castling(move)]
+        moves = castling + rng.sample(others, min(4, len(others)))
+        expected[key] = {move: rng.randint(1, 1000) for move in moves}
+        entries += [(key, polyglot_move(board, move), weight) for move, weight in expected[key].items()]
+    entries.sort()
+    with open(path, "wb") as f:
+        for key, raw_move, weight in entries:
+            f.write(struct.pack(">QHHI", key, raw_move, weight, 0))
+    return expected
+
+
+@pytest.fixture
+def book_path(tmp_path):
+    return str(tmp_path / "book.bin")
+
+
+def test_polyglot_lookups_ignore_move_counters(book_path):
+    rng = random.Random(6)
+    boards = random_positions(100, seed=6)
+    # Castling is stored as king takes rook and must come back as the normal king move
+    boards.append(chess.Board("r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1"))
+    expected = write_book(book_path, boards, rng)
+    book = chess_book.PolyglotBook(book_path)
+    try:
+        for board in boards:
+            moved = chess.Board(board.fen().rsplit(" ", 2)[0] + " 37 81")
+            found = book.entries(moved)
+            assert {entry.move: entry.weight for entry in found} == expected[chess.polyglot.zobrist_hash(board)]
+            assert [entry.weight for entry in found] == sorted((entry.weight for entry in found), reverse=True)
+    finally:
+        book.close()
+
+
+def test_builtin_book_finds_transpositions():
+    book = chess_book.BuiltinBook()
+    board = chess.Board()
+    for uci in ("g1f3", "b8c6", "e2e4", "e7e5"):
+        board.push_uci(uci)
+    assert [entry.move.uci() for entry in book.entries(board)] == ["f1b5"]
+    assert book.entries(chess.Board("8/8/8/8/8/8/8/K1k5 w - - 0 1")) == []
+
+
+@pytest.mark.parametrize("content", [b"", b"\0" * 20])
+def test_malformed_book_file_is_rejected(book_path, content):
+    with open(book_path, "wb") as f:
+        f.write(content)
+    with pytest.raises(ValueError):
+        chess_book.check_book_file(book_path)
+
+
+def test_missing_book_file_is_rejected(book_path):
+    with pytest.raises(ValueError, match="Cannot open"):
+        chess_book.check_book_file(book_path)
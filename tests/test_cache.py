@@ -0,0 +1,108 @@
+# test_cache.py - AnalysisCache coverage and replacement rules
+import json
+
+import chess
+import pytest
+
+from chess_cache import ANALYSIS_CACHE_VERSION, AnalysisCache, cache_key
+
+FEN = "r1bq1rk1/pp2bppp/2n1pn2/3p4/2PP4/2N2N2/PP2BPPP/R2QKB1R w KQ - 0 9"
+
+
+def result(depth, multipv):
+    return {
+        "status": "success",
+        "depth": depth,
+        "bestMoves": [{"move": move} for move in ("c4c5", "c1g5", "a2a3")[:multipv]],
+        "searchInfo": {"source": "engine_search"},
+    }
+
+
+class DictStore:
+    """analysis_cache table in a dict"""
+
+    def __init__(self):
+        self.rows = {}
+
+    def get_cached_analysis(self, key, version):
+        row = self.rows.get((key, version))
+        return row and dict(row)
+
+    def save_cached_analysis(self, key, version, depth, multipv, result_json):
+        self.rows[(key, version)] = {"depth": depth, "multipv": multipv, "result": json.loads(result_json)}
+
+
+class FailingStore:
+    def get_cached_analysis(self, key, version):
+        raise OSError("database is down")
+
+    def save_cached_analysis(self, key, version, depth, multipv, result_json):
+        raise OSError("database is down")
+
+
+def test_key_ignores_move_counters():
+    assert cache_key(FEN) == cache_key(FEN.replace(" 0 9", " 12 40"))
+    assert cache_key("not a fen") is None
+
+
+def test_answers_requests_the_result_covers():
+    cache = AnalysisCache()
+    cache.put(FEN, result(8, 3))
+    hit = cache.get(FEN, 6, 2)
+    assert hit["depth"] == 8
+    assert len(hit["bestMoves"]) == 2
+    assert hit["searchInfo"]["source"] == "analysis_cache"
+    assert cache.get(FEN, 9, 1) is None
+    assert cache.get(FEN, 8, 4) is None
+
+
+def test_only_a_covering_result_replaces_the_entry():
+    cache = AnalysisCache()
+    cache.put(FEN, result(8, 3))
+    cache.put(FEN, result(12, 1))  # Deeper but fewer lines: multipv 3 requests would miss
+    assert cache.get(FEN, 8, 3) is not None
+    assert cache.get(FEN, 12, 1) is None
+    cache.put(FEN, result(12, 3))
+    assert cache.get(FEN, 12, 3) is not None
+    assert cache.writes == 2
+
+
+@pytest.mark.parametrize("bad", [
+    {"status": "error", "error": "Invalid position"},
+    {"status": "success", "depth": 0, "bestMoves": [{"move": "e2e4"}], "searchInfo": {}},
+])
+def test_errors_and_unsearched_results_are_not_stored(bad):
+    cache = AnalysisCache()
+    cache.put(FEN, bad)
+    assert cache.writes == 0
+    assert cache.get(FEN, 1, 1) is None
+
+
+def test_store_shares_results_between_caches():
+    store = DictStore()
+    AnalysisCache(store=store).put(FEN, result(10, 3))
+    assert (cache_key(FEN), ANALYSIS_CACHE_VERSION) in store.rows
+
+    other = AnalysisCache(store=store)
+    assert other.get(FEN, 10, 3)["depth"] == 10
+    assert other.get(FEN, 10, 3) is not None
+    assert (other.store_hits, other.memory_hits) == (1, 1)
+
+
+def test_store_errors_count_as_misses():
+    cache = AnalysisCache(store=FailingStore())
+    cache.put(FEN, result(8, 3))
+    assert cache.get(FEN, 10, 1) is None
+    assert cache.get(FEN, 8, 1) is not None
+    assert cache.store_errors == 2
+    assert cache.misses == 1
+
+
+def test_capacity_evicts_least_recently_used():
+    cache = AnalysisCache(capacity=2)
+    boards = [chess.Board(), chess.Board(), chess.Board()]
+    for board, move in zip(boards, ("e2e4", "d2d4", "c2c4")):
+        board.push_uci(move)
+        cache.put(board.fen(), result(8, 1))
+    assert cache.get(boards[0].fen(), 8, 1) is None
+    assert cache.get(boards[2].fen(), 8, 1) is not None
@@ -0,0 +1,24 @@
+# test_eval.py - Incremental search state against the same values computed from scratch
+import random
+
+import pytest
+
+import chess_zobrist
+from chess_engine import FastChessEngine
+from chess_position import SearchBoard
+from helpers import random_walk
+
+
+@pytest.mark.parametrize("game", range(20))
+def test_incremental_state_matches_full(game):
+    rng = random.Random(game)
+    engine = FastChessEngine()
+    board = SearchBoard()
+    engine._set_search_root(board)
+    for _ in random_walk(engine, board, 200, rng):
+        material, piece_count, score, king_mg, king_eg = engine._eval
+        is_endgame = material < 1800 or piece_count < 12
+        assert (score + (king_eg if is_endgame else king_mg), is_endgame) == \
+            engine._evaluate_material_pst_full(board), board.fen()
+        assert engine._key == chess_zobrist.full_key(board), board.fen()
+        assert engine._pawn_key == chess_zobrist.pawn_key(board), board.fen()
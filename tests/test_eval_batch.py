@@ -0,0 +1,30 @@
+# test_eval_batch.py - NumPy batch static evaluation against the one-board terms
+import chess
+import pytest
+
+import chess_eval_batch
+from helpers import random_positions
+
+pytest.importorskip("numpy")
+
+
+@pytest.fixture(scope="module")
+def evaluator():
+    return chess_eval_batch.BatchEvaluator()
+
+
+def test_batch_scores_match_scalar(evaluator):
+    boards = random_positions(200, seed=5) + [chess.Board()]
+    scalar = [evaluator.static_eval(board) for board in boards]
+    assert evaluator.evaluate(boards).tolist() == scalar
+    assert evaluator.evaluate_fens([board.fen() for board in boards]).tolist() == scalar
+
+
+@pytest.mark.parametrize("fen", [
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP w KQkq - 0 1",       # Seven ranks
+    "rnbqkbnr/pppppppp/9/8/8/8/PPPPPPPP/RNBQKBNR w - - 0 1",  # Nine squares on a rank
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNX w - - 0 1",  # Unknown piece
+])
+def test_invalid_fen_reports_its_index(evaluator, fen):
+    with pytest.raises(ValueError, match="index 1"):
+        evaluator.evaluate_fens([chess.STARTING_FEN, fen])
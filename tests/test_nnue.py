@@ -0,0 +1,68 @@
+# test_nnue.py - NNUE accumulators against a refresh, bootstrap network against material + PST
+import random
+
+import chess
+import pytest
+
+import chess_nnue
+from chess_engine import FastChessEngine
+from chess_position import SearchBoard
+from helpers import random_positions, random_walk
+
+np = pytest.importorskip("numpy")
+
+
+def bootstrap_engine():
+    """Engine evaluating with the bootstrap network, whatever NNUE_WEIGHTS holds"""
+    engine = FastChessEngine()
+    engine._set_eval_backend("nnue")
+    engine._accumulators = engine._nnue = chess_nnue.AccumulatorStack(chess_nnue.bootstrap_network(engine))
+    return engine
+
+
+@pytest.mark.parametrize("game", range(5))
+def test_accumulators_match_refresh(game):
+    rng = random.Random(game)
+    engine = bootstrap_engine()
+    network = engine._nnue.network
+    reference = np.empty_like(engine._nnue.current())
+    board = SearchBoard()
+    engine._set_search_root(board)
+    for _ in random_walk(engine, board, 200, rng):
+        for perspective in chess.COLORS:
+            network.refresh(board, perspective, reference[int(perspective)])
+        assert (reference == engine._nnue.current()).all(), board.fen()
+
+
+@pytest.mark.parametrize("game", range(5))
+def test_bootstrap_network_reproduces_material_pst(game):
+    rng = random.Random(game)
+    engine = bootstrap_engine()
+    board = SearchBoard()
+    engine._set_search_root(board)
+    for _ in random_walk(engine, board, 200, rng):
+        material_pst = engine._eval[2] if board.turn else -engine._eval[2]
+        assert engine._nnue.evaluate(board.turn) == material_pst, board.fen()
+
+
+def test_saved_network_loads_unchanged(tmp_path):
+    network = chess_nnue.bootstrap_network(FastChessEngine())
+    path = chess_nnue.save(network, str(tmp_path / "bootstrap.nnue"))
+    loaded = chess_nnue.load(path)
+    assert loaded.path == path
+    for board in random_positions(20):
+        assert loaded.evaluate_board(board) == network.evaluate_board(board), board.fen()
+
+
+def test_malformed_weights_are_rejected(tmp_path):
+    path = chess_nnue.save(chess_nnue.bootstrap_network(FastChessEngine()), str(tmp_path / "bootstrap.nnue"))
+    with open(path, "rb") as f:
+        data = f.read()
+    truncated = tmp_path / "truncated.nnue"
+    truncated.write_bytes(data[:-2])
+    with pytest.raises(ValueError):
+        chess_nnue.load(str(truncated))
+    other_format = tmp_path / "other.nnue"
+    other_format.write_bytes(b"NOTNNUE!" + data[8:])
+    with pytest.raises(ValueError):
+        chess_nnue.load(str(other_format))
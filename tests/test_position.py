@@ -0,0 +1,72 @@
+# test_position.py - SearchBoard make/unmake against python-chess push/pop
+import random
+
+import chess
+import pytest
+
+from chess_engine import FastChessEngine
+from chess_position import SearchBoard
+
+# (FEN, depth, node count) from the standard perft suite, at depths that run in seconds
+PERFT_POSITIONS = [
+    (chess.STARTING_FEN, 3, 8902),
+    ("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1", 2, 2039),
+    ("8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", 4, 43238),
+    ("r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1", 3, 9467),
+    ("rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8", 2, 1486),
+]
+
+
+def perft(board, depth):
+    """Leaf count of the move tree, the last ply counted without playing it"""
+    if depth == 1:
+        return board.legal_moves.count()
+    nodes = 0
+    for move in board.legal_moves:
+        board.make(move)
+        nodes += perft(board, depth - 1)
+        board.unmake()
+    return nodes
+
+
+def board_fields(board):
+    return (board.pawns, board.knights, board.bishops, board.rooks, board.queens, board.kings,
+            tuple(board.occupied_co), board.occupied, board.promoted, board.castling_rights,
+            board.ep_square, board.turn, board.halfmove_clock, board.fullmove_number)
+
+
+@pytest.mark.parametrize("fen, depth, expected", PERFT_POSITIONS)
+def test_perft(fen, depth, expected):
+    board = SearchBoard(fen)
+    assert perft(board, depth) == expected
+    assert board.fen() == fen
+
+
+@pytest.mark.parametrize("game", range(40))
+def test_make_unmake_matches_push_pop(game):
+    rng = random.Random(game)
+    fen = PERFT_POSITIONS[game % len(PERFT_POSITIONS)][0]
+    reference, board = chess.Board(fen), SearchBoard(fen)
+    for _ in range(rng.randint(1, 150)):
+        moves = list(reference.legal_moves)
+        if not moves:
+            break
+        if len(reference.move_stack) > 1 and rng.random() < 0.15:
+            reference.pop()
+            board.unmake()
+        else:
+            move = rng.choice(moves) if rng.random() > 0.05 or reference.is_check() else chess.Move.null()
+            reference.push(move)
+            board.make(move)
+        assert board_fields(board) == board_fields(reference), reference.fen()
+
+
+@pytest.mark.parametrize("fen", [
+    "8/8/8/8/8/8/8/K7 w - - 0 1",                # No black king
+    "k7/8/8/8/8/8/1q6/K6R b - - 0 1",            # The side not to move is in check
+    "k7/8/8/8/8/8/8/K6P w - - 0 1",              # Pawn on the back rank
+])
+def test_illegal_position_is_an_error(fen):
+    result = FastChessEngine().analyze_position(fen, 2)
+    assert result["status"] == "error"
+    assert result["error"].startswith("Invalid position")
@@ -0,0 +1,102 @@
+# test_registry.py - Analysis IDs are released however a request ends
+import importlib.util
+import os
+import sys
+import time
+import types
+
+import pytest
+
+from chess_engine import AnalysisRegistry, analysis_registry
+
+FEN = "r1bq1rk1/pp2bppp/2n1pn2/3p4/2PP4/2N2N2/PP2BPPP/R2QKB1R w KQ - 0 9"
+
+
+def test_ids_are_unique_while_running():
+    registry = AnalysisRegistry()
+    analysis_id, _ = registry.start("a")
+    with pytest.raises(KeyError):
+        registry.start("a")
+    registry.finish(analysis_id)
+    assert registry.start("a")[0] == "a"
+
+
+def test_cancel_sets_the_stop_event_once():
+    registry = AnalysisRegistry()
+    analysis_id, stop_event = registry.start()
+    assert registry.cancel(analysis_id)
+    assert registry.cancel(analysis_id)
+    assert stop_event.is_set()
+    assert registry.cancelled == 1
+    assert not registry.cancel("unknown")
+
+
+def test_late_finish_keeps_a_newer_run_of_the_id():
+    registry = AnalysisRegistry()
+    _, old_event = registry.start("a")
+    registry.finish("a", old_event)
+    _, new_event = registry.start("a")
+    registry.finish("a", old_event)
+    assert registry.running() == ["a"]
+    registry.finish("a", new_event)
+    assert registry.running() == []
+
+
+@pytest.fixture(scope="module")
+def server():
+    """python-server.py with the database module replaced, no Postgres is needed"""
+    pytest.importorskip("flask_cors")
+    fake_db = types.ModuleType("chess_db")
+    fake_db.chess_db = types.SimpleNamespace()
+    saved = sys.modules.get("chess_db")
+    sys.modules["chess_db"] = fake_db
+    try:
+        path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "python-server.py")
+        spec = importlib.util.spec_from_file_location("python_server", path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    finally:
+        if saved is None:
+            del sys.modules["chess_db"]
+        else:
+            sys.modules["chess_db"] = saved
+    return module
+
+
+def wait_until_released(analysis_id, timeout=10.0):
+    end = time.time() + timeout
+    while analysis_id in analysis_registry.running() and time.time() < end:
+        time.sleep(0.05)
+    return analysis_id not in analysis_registry.running()
+
+
+def test_stream_closed_before_the_first_chunk_releases_its_id(server):
+    from werkzeug.test import EnvironBuilder
+
+    # Called as the WSGI server does, so the body is never started
+    environ = EnvironBuilder(method="POST", path="/analyze/stream", json={
+        "fen": FEN, "depth": 15, "movetime": 60000, "analysisId": "stream-test"}).get_environ()
+    body = server.app.wsgi_app(environ, lambda status, headers, exc_info=None: None)
+    assert "stream-test" in analysis_registry.running()
+    body.close()  # The client went away
+    assert wait_until_released("stream-test")
+
+
+def test_stream_read_to_the_end_releases_its_id(server):
+    client = server.app.test_client()
+    response = client.post("/analyze/stream", json={"fen": FEN, "depth": 2, "analysisId": "stream-done"})
+    body = response.get_data(as_text=True)
+    response.close()
+    assert "event: done" in body
+    assert wait_until_released("stream-done")
+
+
+def test_cancel_endpoint_stops_a_running_analysis(server):
+    client = server.app.test_client()
+    _, stop_event = analysis_registry.start("to-cancel")
+    try:
+        assert client.delete("/analyze/to-cancel").status_code == 200
+        assert stop_event.is_set()
+        assert client.delete("/analyze/unknown-id").status_code == 404
+    finally:
+        analysis_registry.finish("to-cancel", stop_event)
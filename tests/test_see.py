@@ -0,0 +1,42 @@
+# test_see.py - Static exchange evaluation on known exchanges and random captures
+import chess
+import pytest
+
+from chess_engine import FastChessEngine
+from helpers import random_positions
+
+# (FEN, move, expected SEE with the engine piece values)
+SEE_POSITIONS = [
+    ("1k1r4/1pp4p/p7/4p3/8/P5P1/1PP4P/2K1R3 w - - 0 1", "e1e5", 100),            # Undefended pawn
+    ("1k1r3q/1ppn3p/p4b2/4p3/8/P2N2P1/1PP1R1BP/2K1Q3 w - - 0 1", "d3e5", -220),   # N for P
+    ("4k3/8/3p4/4p3/8/8/8/4QK2 w - - 0 1", "e1e5", -800),                         # Q for P
+    ("4r1k1/8/8/4p3/8/8/4R3/4R1K1 w - - 0 1", "e2e5", 100),                       # X-ray rook behind
+    ("4r1k1/8/8/4p3/8/8/4R3/6K1 w - - 0 1", "e2e5", -400),                        # Same without it
+    ("3qk3/3r4/3r4/8/8/3Q4/3R4/3R2K1 w - - 0 1", "d3d6", 100),                    # Batteries on both sides
+    ("1n2k3/P7/8/8/8/8/8/4K3 w - - 0 1", "a7b8q", 1120),                          # Capture promotion
+    ("4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 1", "e5d6", 100),                           # En passant
+    ("4k3/8/2p5/3n4/8/5B2/8/4K3 w - - 0 1", "f3d5", -10),                         # B for N
+    ("4k3/8/8/8/8/8/3q4/3RK3 b - - 0 1", "d2d1", -400),                           # King recaptures
+    ("4k3/8/8/8/8/8/2bq4/3RK3 b - - 0 1", "d2d1", 500),                           # Defended, king can't
+    ("4k3/8/8/8/8/8/8/R3K2R w KQ - 0 1", "e1g1", 0),                              # Castling
+]
+
+
+@pytest.fixture(scope="module")
+def engine():
+    return FastChessEngine()
+
+
+@pytest.mark.parametrize("fen, uci, expected", SEE_POSITIONS)
+def test_see_known_positions(engine, fen, uci, expected):
+    assert engine.see(chess.Board(fen), chess.Move.from_uci(uci)) == expected
+
+
+def test_see_ge_agrees_with_see(engine):
+    captures = [(board, move) for board in random_positions(200)
+                for move in board.legal_moves if board.is_capture(move)]
+    assert captures
+    for board, move in captures:
+        value = engine.see(board, move)
+        for threshold in (-500, -50, 0, 1, 100, 300):
+            assert engine.see_ge(board, move, threshold) == (value >= threshold), (board.fen(), move, threshold)
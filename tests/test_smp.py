@@ -0,0 +1,57 @@
+# test_smp.py - Lazy SMP workers: combined results, replacement of dead workers, backend switches
+import threading
+import time
+
+import pytest
+
+from chess_smp import LazySMP
+
+FEN = "r1bq1rk1/pp2bppp/2n1pn2/3p4/2PP4/2N2N2/PP2BPPP/R2QKB1R w KQ - 0 9"
+
+
+@pytest.fixture(scope="module")
+def smp():
+    smp = LazySMP(max_workers=2, tt_size_mb=4)
+    yield smp
+    smp.close()
+
+
+def test_workers_search_one_position_together(smp):
+    result = smp.analyze(FEN, 3, 2, movetime=60000)
+    assert result["status"] == "success"
+    assert result["depth"] == 3
+    assert len(result["searchInfo"]["workerDepths"]) == 2
+    assert result["searchInfo"]["threads"] == 2
+
+
+def test_dead_worker_is_replaced_before_the_next_search(smp):
+    smp.analyze(FEN, 2, 2, movetime=60000)
+    process, _ = smp._workers[1]
+    process.kill()
+    process.join()
+    result = smp.analyze(FEN, 3, 2, movetime=60000)
+    assert result["status"] == "success"
+    assert len(result["searchInfo"]["workerDepths"]) == 2
+    assert all(process.is_alive() for process, _ in smp._workers)
+
+
+def test_backend_switch_clears_the_shared_table(smp):
+    pytest.importorskip("numpy")
+    smp.analyze(FEN, 3, 2, movetime=60000)
+    assert any(smp._shm.buf)
+    result = smp.analyze(FEN, 3, 2, movetime=60000, eval_backend="nnue")
+    assert result["status"] == "success"
+    assert result["searchInfo"]["evalBackend"] == "nnue"
+    assert smp._eval_backend == "nnue"
+
+
+def test_worker_dying_mid_search_fails_only_that_search(smp):
+    killer = threading.Timer(1.0, lambda: smp._workers[1][0].kill())
+    killer.start()
+    start = time.time()
+    with pytest.raises(RuntimeError):
+        smp.analyze(FEN, 12, 2, movetime=30000)
+    killer.join()
+    result = smp.analyze(FEN, 2, 2, movetime=60000)
+    assert result["status"] == "success"
+    assert time.time() - start < 20